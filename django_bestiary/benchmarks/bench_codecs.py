@@ -0,0 +1,146 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Parse and format speed of the data source codecs
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Usage (from the django_bestiary directory):
+#   PYTHONPATH=. benchmarks/bench_codecs.py --lines 1000000
+#
+
+import argparse
+import json
+
+from time import time
+
+from projects.datasource_codecs import format_lines, get_codec, parse_lines
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bench_codecs.py [options]",
+                                     description="Time parsing and formatting repository lines")
+    parser.add_argument('--lines', type=int, default=1000000, help='Repository lines to parse and format')
+    parser.add_argument('-f', '--file', default='projects/projects-release.json',
+                        help='Projects file whose lines are repeated')
+
+    return parser.parse_args()
+
+
+def legacy_find_repo_name(repository_view_str, data_source):
+    """ find_repo_name as it was before the codecs, to compare with """
+
+    repo = None
+    if data_source in ['askbot', 'functest', 'hyperkitty', 'jenkins', 'mediawiki',
+                       'mozillaclub', 'phabricator', 'pipermail',
+                       'redmine', 'remo', 'rss']:
+        repo = repository_view_str
+    elif data_source in ['bugzilla', 'bugzillarest']:
+        tokens = repository_view_str.split("?", 1)
+        repo = tokens[0].replace('/bugs/buglist.cgi', '')
+    elif data_source in ['confluence', 'discourse', 'git', 'github', 'jira',
+                         'supybot', 'nntp']:
+        repo = repository_view_str.split(" ")[0]
+    elif data_source in ['crates', 'dockerhub', 'google_hits',
+                         'meetup', 'puppetforge', 'slack', 'telegram',
+                         'twitter']:
+        repo = ''
+    elif data_source in ['gerrit']:
+        tokens = repository_view_str.split("_")
+        repo = tokens[0]
+    elif data_source in ['mbox']:
+        tokens = repository_view_str.split(" ")
+        repo = tokens[0] + " " + tokens[1]
+    elif data_source in ['stackexchange']:
+        repo = repository_view_str.split("questions")[0]
+
+    return repo
+
+
+def legacy_find_params(repository_view_str, data_source):
+    """ find_params as it was before the codecs, to compare with """
+
+    params = ''
+
+    if data_source in ['askbot', 'crates', 'functest',
+                       'hyperkitty', 'jenkins', 'mediawiki', 'mozillaclub',
+                       'phabricator', 'pipermail', 'puppetforge', 'redmine',
+                       'remo', 'rss']:
+        params = ''
+    elif data_source in ['bugzilla', 'bugzillarest']:
+        tokens = repository_view_str.split("?", 1)
+        if len(tokens) > 1:
+            params = tokens[1]
+    elif data_source in ['confluence', 'discourse', 'git', 'github', 'jira',
+                         'supybot', 'nntp']:
+        tokens = repository_view_str.split(" ", 1)
+        if len(tokens) > 1:
+            params = tokens[1]
+    elif data_source in ['dockerhub', 'google_hits', 'meetup', 'slack',
+                         'telegram', 'twitter']:
+        params = repository_view_str
+    elif data_source in ['gerrit']:
+        tokens = repository_view_str.split("_", 1)
+        if len(tokens) > 1:
+            params = tokens[1]
+    elif data_source in ['mbox']:
+        tokens = repository_view_str.split(" ", 2)
+        if len(tokens) > 2:
+            params = tokens[2]
+    elif data_source in ['stackexchange']:
+        params = repository_view_str.split("tagged/")[1]
+
+    return params
+
+
+def timed(label, nlines, func):
+    task_init = time()
+    func()
+    elapsed = time() - task_init
+    print("%-34s %8.2f s %12.0f lines/s" % (label, elapsed, nlines / elapsed))
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    with open(args.file) as pfile:
+        projects = json.load(pfile)
+
+    # data source -> lines, repeated up to the number of lines requested
+    sample = {}
+    for project in projects.values():
+        for (data_source, lines) in project.items():
+            if data_source != 'meta':
+                sample.setdefault(data_source, []).extend(lines)
+    nsample = sum(len(lines) for lines in sample.values())
+    lines = {data_source: ds_lines * (args.lines // nsample + 1) for (data_source, ds_lines) in sample.items()}
+    nlines = sum(len(ds_lines) for ds_lines in lines.values())
+    views = {data_source: parse_lines(data_source, ds_lines) for (data_source, ds_lines) in lines.items()}
+
+    print("Lines: %i from %i data sources" % (nlines, len(lines)))
+
+    timed("parse: legacy if/elif chains", nlines, lambda: [
+        (legacy_find_repo_name(line, ds), legacy_find_params(line, ds)) for ds in lines for line in lines[ds]])
+    timed("parse: codec lookup per line", nlines, lambda: [
+        get_codec(ds).parse(line) for ds in lines for line in lines[ds]])
+    timed("parse: parse_many per data source", nlines, lambda: [
+        parse_lines(ds, lines[ds]) for ds in lines])
+    timed("format: codec lookup per line", nlines, lambda: [
+        get_codec(ds).format(repo, params) for ds in views for (repo, params) in views[ds]])
+    timed("format: format_many per data source", nlines, lambda: [
+        format_lines(ds, views[ds]) for ds in views])
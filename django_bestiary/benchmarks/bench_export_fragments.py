@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Time of the export of an ecosystem with one project changed, compared
+# with the export of the whole ecosystem
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Usage (from the django_bestiary directory):
+#   PYTHONPATH=. benchmarks/bench_export_fragments.py --lines 100000
+#
+# The projects are loaded in a test database, created and destroyed by
+# the benchmark.
+#
+
+import argparse
+import tempfile
+
+from time import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import setup_test_environment
+
+from projects.bestiary_export import iter_projects_json
+from projects.bestiary_import import load_projects
+from projects.models import Ecosystem, Project
+
+from bench_import_workers import write_projects_file
+
+ECOSYSTEM = 'bench'
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bench_export_fragments.py [options]",
+                                     description="Time the export with one project changed against a cold export")
+    parser.add_argument('--lines', type=int, default=100000, help='Repository lines in the ecosystem')
+    parser.add_argument('--lines-per-project', type=int, default=50, help='Repository lines per project')
+    parser.add_argument('--rounds', type=int, default=5, help='Exports timed of each kind')
+
+    return parser.parse_args()
+
+
+def time_export(eco_orm, with_cache):
+    start = time()
+    text = ''.join(iter_projects_json(eco_orm, cache=cache if with_cache else None))
+    return (time() - start, text)
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+
+    try:
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as pfile:
+            write_projects_file(pfile, args.lines, args.lines_per_project)
+            pfile.flush()
+            load_projects(pfile.name, ECOSYSTEM)
+
+        cache.clear()
+        eco_orm = Ecosystem.objects.get(name=ECOSYSTEM)
+        # Fill the cache with the fragments of all the projects
+        time_export(eco_orm, True)
+
+        (cold, warm) = ([], [])
+        for round_number in range(args.rounds):
+            project = Project.objects.get(name="project-0")
+            project.meta_title = "Project 0, round %i" % round_number
+            project.save()
+            eco_orm.refresh_from_db()
+
+            (seconds, cold_text) = time_export(eco_orm, False)
+            cold.append(seconds)
+            (seconds, warm_text) = time_export(eco_orm, True)
+            warm.append(seconds)
+            assert warm_text == cold_text
+
+        print("Ecosystem with %i projects and %i repository views" %
+              (eco_orm.projects.count(), args.lines))
+        print("%-22s %10s %10s" % ('Export', 'Best (s)', 'Mean (s)'))
+        for (name, seconds) in (('cold', cold), ('one project changed', warm)):
+            print("%-22s %10.3f %10.3f" % (name, min(seconds), sum(seconds) / len(seconds)))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Time needed by the parse stage of the import with different workers
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Usage (from the django_bestiary directory):
+#   PYTHONPATH=. benchmarks/bench_import_workers.py --lines 1000000 --workers 1 4
+#
+
+import argparse
+import json
+import os
+import tempfile
+
+from time import time
+
+from projects.bestiary_import import iter_parsed_projects
+
+# Data sources used in the synthetic projects file, with a line generator
+LINES = {
+    "git": lambda p, n: "https://github.com/bestiary/repo-%i-%i --filters-raw-prefix data.files.file:src" % (p, n),
+    "gerrit": lambda p, n: "review.bestiary.org_project-%i-%i" % (p, n),
+    "bugzilla": lambda p, n: "https://bugs.bestiary.org/bugs/buglist.cgi?product=p%i&component=c%i" % (p, n),
+    "mbox": lambda p, n: "list-%i-%i ~/.perceval/mbox/%i" % (p, n, n),
+    "stackexchange": lambda p, n: "https://stackoverflow.com/questions/tagged/tag-%i-%i" % (p, n)
+}
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bench_import_workers.py [options]",
+                                     description="Time the parse stage of the import with several workers")
+    parser.add_argument('--lines', type=int, default=1000000, help='Repository lines in the projects file')
+    parser.add_argument('--lines-per-project', type=int, default=50, help='Repository lines per project')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, os.cpu_count()],
+                        help='Number of workers to compare')
+
+    return parser.parse_args()
+
+
+def write_projects_file(pfile, nlines, nlines_project):
+    """ Write a synthetic projects file without building it in memory """
+
+    data_sources = sorted(LINES)
+    nprojects = (nlines + nlines_project - 1) // nlines_project
+
+    pfile.write('{\n')
+    for project in range(nprojects):
+        project_json = {"meta": {"title": "Project %i" % project}}
+        for line in range(min(nlines_project, nlines - project * nlines_project)):
+            data_source = data_sources[line % len(data_sources)]
+            project_json.setdefault(data_source, []).append(LINES[data_source](project, line))
+        separator = ',\n' if project < nprojects - 1 else '\n'
+        pfile.write(' "project-%i": %s%s' % (project, json.dumps(project_json, indent=True), separator))
+    pfile.write('}\n')
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json') as pfile:
+        write_projects_file(pfile, args.lines, args.lines_per_project)
+        pfile.flush()
+        print("Projects file with %i lines: %.1f MB" % (args.lines, os.path.getsize(pfile.name) / (1024 * 1024)))
+
+        print("%8s %10s %12s" % ("workers", "time (s)", "lines/s"))
+        for workers in args.workers:
+            task_init = time()
+            nrows = 0
+            with open(pfile.name) as projects:
+                for (rows, errors) in iter_parsed_projects(projects, workers=workers):
+                    nrows += len(rows)
+            elapsed = time() - task_init
+            print("%8i %10.2f %12.0f" % (workers, elapsed, nrows / elapsed))
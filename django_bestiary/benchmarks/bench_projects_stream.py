@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Peak memory needed to read projects files of different sizes
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Usage (from the django_bestiary directory):
+#   PYTHONPATH=. benchmarks/bench_projects_stream.py --projects 1000 10000 100000
+#
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from time import time
+
+from projects.projects_stream import iter_project_lines
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bench_projects_stream.py [options]",
+                                     description="Compare the peak RSS of json.load and the projects stream reader")
+    parser.add_argument('--projects', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='Number of projects of each synthetic projects file')
+    parser.add_argument('--lines', type=int, default=20, help='Repositories lines per project')
+    parser.add_argument('--measure', nargs=2, metavar=('METHOD', 'FILE'), help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+
+
+def write_projects_file(pfile, nprojects, nlines):
+    """ Write a synthetic projects file without building it in memory """
+
+    pfile.write('{\n')
+    for project in range(nprojects):
+        lines = ['https://github.com/bestiary/repo-%i-%i' % (project, line) for line in range(nlines)]
+        project_json = {"meta": {"title": "Project %i" % project}, "git": lines}
+        separator = ',\n' if project < nprojects - 1 else '\n'
+        pfile.write(' "project-%i": %s%s' % (project, json.dumps(project_json, indent=True), separator))
+    pfile.write('}\n')
+
+
+def measure(method, projects_file):
+    """ Read the file with method and print the lines read and peak RSS in KB """
+
+    nlines = 0
+
+    with open(projects_file) as pfile:
+        if method == 'json':
+            projects = json.load(pfile)
+            for project in projects.values():
+                nlines += len(project['git'])
+        else:
+            for _ in iter_project_lines(pfile):
+                nlines += 1
+
+    print(nlines, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    if args.measure:
+        measure(*args.measure)
+        sys.exit(0)
+
+    print("%10s %12s %10s %14s %10s %14s" % ("projects", "size (MB)", "json (s)", "json RSS (MB)",
+                                             "stream (s)", "stream RSS (MB)"))
+
+    for nprojects in args.projects:
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as pfile:
+            write_projects_file(pfile, nprojects, args.lines)
+            pfile.flush()
+
+            results = []
+            for method in ('json', 'stream'):
+                task_init = time()
+                output = subprocess.check_output([sys.executable, __file__, '--measure', method, pfile.name])
+                elapsed = time() - task_init
+                max_rss = int(output.split()[1])
+                results += [elapsed, max_rss / 1024]
+
+            size = os.path.getsize(pfile.name) / (1024 * 1024)
+            print("%10i %12.1f %10.2f %14.1f %10.2f %14.1f" % tuple([nprojects, size] + results))
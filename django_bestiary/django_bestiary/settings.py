@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.middleware.IdentityMapMiddleware',
 ]
 
 ROOT_URLCONF = 'django_bestiary.urls'
@@ -78,9 +79,52 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Seconds to wait for the imports running at the same time
+        'OPTIONS': {'timeout': 60},
+        # A file, like in production: the connections to an in memory database
+        # lock whole tables, so the imports could not run at the same time
+        'TEST': {'NAME': os.path.join(BASE_DIR, 'db_test.sqlite3')},
     }
 }
 
+# The tests use a data cache of their own, not the one of the server
+TEST_RUNNER = 'projects.testing.BestiaryTestRunner'
+
+# Cache of the exported projects files and of the text of each project
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # One entry for each project exported, and one for each ecosystem
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Lists fetched by the editor, shared by all the processes
+    'data': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '.data_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Cache of the lists fetched by the editor. It is invalidated by the process
+# that changes the data, so it must be shared by all the processes (gunicorn
+# workers, import workers), like a FileBasedCache or a Memcached
+# BESTIARY_DATA_CACHE = 'data'
+# BESTIARY_DATA_CACHE_TIMEOUT = 300
+# Fill the data cache when the application is loaded, before gunicorn
+# forks the workers with preload_app
+BESTIARY_DATA_CACHE_WARM_UP = False
+
+# Keep a copy of the projects files imported from the web in .imported/
+BESTIARY_ARCHIVE_IMPORTS = True
+
+# Seconds after which an import not updated is taken as dead and queued again
+# BESTIARY_IMPORT_JOB_TIMEOUT = 1800
+
+# Directory for the lock files used when the database has no locks (SQLite)
+# BESTIARY_LOCKS_DIR = os.path.join(BASE_DIR, 'locks')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
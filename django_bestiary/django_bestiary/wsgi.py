@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_bestiary.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'BESTIARY_DATA_CACHE_WARM_UP', False):
+    from django.db import connections  # noqa: E402
+    from projects.data_cache import warm_up  # noqa: E402
+
+    warm_up()
+    # With preload_app the workers are forked after this, they must not share the connection
+    connections.close_all()
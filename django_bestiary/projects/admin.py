@@ -14,3 +14,5 @@ admin.site.register(models.Project)
 admin.site.register(models.Repository, RepositoryAdmin)
 admin.site.register(models.RepositoryView)
 admin.site.register(models.DataSource)
+admin.site.register(models.ImportRun)
+admin.site.register(models.ImportJob)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ProjectsConfig(AppConfig):
     name = 'projects'
+
+    def ready(self):
+        # Connect the signals that keep the export versions and the data cache
+        from . import signals  # noqa: F401
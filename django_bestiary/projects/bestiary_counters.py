@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Repair the counters of the ecosystems, projects and data sources of Bestiary
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import argparse
+import logging
+import os
+
+from time import time
+
+import django
+os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
+django.setup()
+
+from django.db import transaction
+
+from projects.counters import COUNTERS, repair_counters
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bestiary_counters.py [options]",
+                                     description="Recompute the counters of projects, repository views and "
+                                                 "repositories that are wrong in beastiary")
+    parser.add_argument('-g', '--debug', action='store_true')
+
+    return parser.parse_args()
+
+
+def repair_all():
+    """ Repair the counters of all the models in one transaction
+
+    :return: dict with the number of objects repaired of each model
+    """
+
+    with transaction.atomic():
+        return {model.__name__: repair_counters(model) for model in COUNTERS}
+
+
+if __name__ == '__main__':
+
+    task_init = time()
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    repaired = repair_all()
+
+    logging.debug("Total repairing time ... %.2f sec", time() - task_init)
+    for (model, nrepaired) in sorted(repaired.items()):
+        print("%s: %i counters repaired" % (model, nrepaired))
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Show the differences between two projects files, or a file and an ecosystem
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from time import time
+
+import django
+os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
+django.setup()
+
+from projects.bestiary_export import iter_exported_projects
+from projects.models import Ecosystem
+from projects.projects_diff import ProjectsDiff, iter_file_projects
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bestiary_diff.py [options] old_file [new_file]",
+                                     description="Show the projects added, removed and changed between "
+                                                 "two projects files, or a file and an ecosystem")
+    parser.add_argument("old_file", help="JSON projects file, could be compressed with gzip, bzip2 or xz")
+    parser.add_argument("new_file", nargs='?', help="JSON projects file compared with the old one")
+    parser.add_argument('-o', '--ecosystem', help='Ecosystem compared with the old file, instead of a new file')
+    parser.add_argument('-g', '--debug', action='store_true')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only show the number of differences')
+
+    args = parser.parse_args()
+    if bool(args.new_file) == bool(args.ecosystem):
+        parser.error("a new file or an ecosystem is needed, but not both")
+
+    return args
+
+
+if __name__ == '__main__':
+
+    task_init = time()
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    if args.ecosystem:
+        try:
+            eco_orm = Ecosystem.objects.get(name=args.ecosystem)
+        except Ecosystem.DoesNotExist:
+            logging.error("Can not find ecosystem %s", args.ecosystem)
+            sys.exit(1)
+        diff = ProjectsDiff(lambda: iter_file_projects(args.old_file), lambda: iter_exported_projects(eco_orm))
+    else:
+        diff = ProjectsDiff(lambda: iter_file_projects(args.old_file), lambda: iter_file_projects(args.new_file))
+
+    # One JSON object for each project added, removed or changed
+    ndifferences = 0
+    for difference in diff.differences():
+        ndifferences += 1
+        if not args.quiet:
+            print(json.dumps(difference, sort_keys=True))
+
+    logging.debug("Total comparing time ... %.2f sec", time() - task_init)
+    logging.info("%i differences: %s", ndifferences, json.dumps(diff.stats, sort_keys=True))
+
+    sys.exit(1 if ndifferences else 0)
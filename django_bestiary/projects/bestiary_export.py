@@ -36,7 +36,27 @@ import django
 os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
 django.setup()
 
-from projects.models import Ecosystem
+from projects.datasource_codecs import format_lines
+from projects.hierarchy import ecosystem_projects
+from projects.models import Ecosystem, Project
+
+
+# Projects whose texts are looked up at once in the cache when streaming
+EXPORT_BATCH_SIZE = 500
+# Minimum characters in each chunk of a streamed projects file
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Formats of the exported projects files:
+#   json: one JSON document with all the projects, the one imported
+#   ndjson: a JSON object with one project in each line
+#   ndjson-views: a JSON object with one repository view in each line
+#   tsv: a tab separated line with one repository view in each line
+EXPORT_FORMATS = ['json', 'ndjson', 'ndjson-views', 'tsv']
+# Fields of each repository view in the line oriented formats
+VIEW_FIELDS = ['ecosystem', 'project', 'data_source', 'repo', 'params']
+# Columns of the links between projects and repository views read for each view
+VIEW_COLUMNS = ['repositoryview__repository__data_source__name', 'repositoryview__repository__name',
+                'repositoryview__params']
 
 
 def get_params():
@@ -46,131 +66,323 @@ def get_params():
     parser.add_argument('-g', '--debug', action='store_true')
     parser.add_argument('-o', '--ecosystem', required=True,
                         help='Ecosystem to be exported. ')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='json',
+                        help='Format of the projects file (json by default)')
+    parser.add_argument('--descendants', action='store_true',
+                        help='Export also the projects of the sub-ecosystems and all the subprojects')
 
     return parser.parse_args()
 
 
-def find_project_repo_line(repository_view):
-    """ Given a RepositoryView build the complete repository
-    string tp be included in the JSON project file to collect the data"""
-
-    repo_line = None
-
-    params = repository_view.params
-    repo = repository_view.repository.name
-    data_source = str(repository_view.repository.data_source)
-
-    # First complete the repository for filtering
-    if data_source in ['askbot', 'functest', 'hyperkitty', 'jenkins', 'mediawiki',
-                       'mozillaclub', 'phabricator', 'pipermail',
-                       'redmine', 'remo', 'rss']:
-        repo = repo
-    elif data_source in ['bugzilla', 'bugzillarest']:
-        if params:
-            repo += '/bugs/buglist.cgi?'
-    elif data_source in ['confluence', 'discourse', 'git', 'github', 'jira',
-                         'supybot', 'nntp']:
-        repo = repo
-    elif data_source in ['crates', 'dockerhub', 'google_hits',
-                         'meetup', 'puppetforge', 'slack', 'telegram',
-                         'twitter']:
-        repo = ''  # not needed because it is always the same
-    elif data_source in ['gerrit']:
-        repo = repo
-    elif data_source in ['mbox']:
-        repo = repo
-    elif data_source in ['stackexchange']:
-        repo += "questions"
-
-    repo_line = repo
-
-    return repo_line
-
-
-def find_project_params_line(repository_view):
-
-    repo_line_params = None
-    data_source = str(repository_view.repository.data_source)
-    params = repository_view.params
-
-    # And now add the params to the repository url for JSON file
-    if data_source in ['askbot', 'crates', 'functest',
-                       'hyperkitty', 'jenkins', 'mediawiki', 'mozillaclub',
-                       'phabricator', 'pipermail', 'puppetforge', 'redmine',
-                       'remo', 'rss']:
-        pass
-    elif data_source in ['bugzilla', 'bugzillarest']:
-        repo_line_params = params
-    elif data_source in ['confluence', 'discourse', 'git', 'github', 'jira',
-                         'supybot', 'nntp']:
-        repo_line_params = " " + params
-    elif data_source in ['dockerhub', 'google_hits', 'meetup', 'slack',
-                         'telegram', 'twitter']:
-        repo_line_params = params
-    elif data_source in ['gerrit']:
-        repo_line_params = "_" + params
-    elif data_source in ['mbox']:
-        repo_line_params = " " + params
-    elif data_source in ['stackexchange']:
-        repo_line_params = "/tagged/" + params
-
-    return repo_line_params
-
-
-def build_project_repository_view(repository_view):
-    """ Given a RepositoryView build the complete repository
-    string tp be included in the JSON project file to collect the data"""
-
-    repo_line = None
-
-    params = repository_view.params
-    repo_line = find_project_repo_line(repository_view)
-
-    if params:
-        repo_line += find_project_params_line(repository_view)
-
-    return repo_line
+def build_project_json(meta_title, views):
+    """ Build the JSON of a project
+
+    :param meta_title: title of the project
+    :param views: list of (data_source, repo, params) of its repository views
+    """
+
+    project_json = {}
+    if meta_title:
+        project_json["meta"] = {"title": meta_title}
+
+    for (data_source, repo, params) in views:
+        project_json.setdefault(data_source, []).append((repo, params))
+
+    for data_source in project_json:
+        if data_source != "meta":
+            project_json[data_source] = format_lines(data_source, project_json[data_source])
+
+    return project_json
+
+
+def fetch_projects_json(projects):
+    """ Build the JSON of some projects, reading all their repository views at once
+
+    :param projects: list of (project id, name, meta_title)
+    :return: dict with the JSON of each project id
+    """
+
+    project_views = {project_id: [] for (project_id, _, _) in projects}
+
+    views = Project.repository_views.through.objects.filter(project_id__in=list(project_views))
+    views = views.order_by('project_id', 'id').values_list('project_id', *VIEW_COLUMNS)
+    for (project_id, data_source, repo, params) in views.iterator():
+        project_views[project_id].append((data_source, repo, params))
+
+    return {project_id: build_project_json(meta_title, project_views[project_id])
+            for (project_id, _, meta_title) in projects}
+
+
+def format_project_fragment(name, project_json):
+    """ Text of a project in a projects file, as written by `json.dump(indent=True, sort_keys=True)` """
+
+    # Nested values are indented one level more than in their own document
+    return json.dumps(name) + ': ' + json.dumps(project_json, indent=True, sort_keys=True).replace('\n', '\n ')
+
+
+def fragment_cache_key(project_id, version):
+    return 'bestiary:project:%i:%i' % (project_id, version)
+
+
+def exported_projects(eco_orm, descendants=False):
+    """ Queryset with the projects of an ecosystem to be exported
+
+    With descendants, the projects of its sub-ecosystems and all their
+    subprojects are exported too.
+    """
+
+    if descendants:
+        return ecosystem_projects(Ecosystem.objects.filter(id=eco_orm.id))
+    return Project.objects.filter(ecosystem=eco_orm.id)
+
+
+def exported_views(eco_orm, descendants=False):
+    """ Queryset with the links to their repository views of the projects of an ecosystem to be exported
+
+    They are joined with the projects of the ecosystem, or found with the
+    closure tables with descendants, in the same query.
+    """
+
+    views = Project.repository_views.through.objects
+    if descendants:
+        return views.filter(project__in=exported_projects(eco_orm, descendants))
+    return views.filter(project__ecosystem=eco_orm.id)
+
+
+def iter_project_views(eco_orm, descendants=False):
+    """ Generator of the (project id, name, meta_title, views) of an ecosystem, sorted by name
+
+    The views are the (data_source, repo, params) of the repository views
+    of the project, in the order in which they were added to it. The
+    projects and all their views are read with two queries, whatever the
+    size of the ecosystem, both sorted by the name of the projects, so
+    they are read at the same time and only the views of a project are
+    kept in memory. The names are sorted by the database, as Python does
+    with the collation of SQLite or the C collation of PostgreSQL.
+    """
+
+    projects = exported_projects(eco_orm, descendants).order_by('name')
+    views = exported_views(eco_orm, descendants).order_by('project__name', 'id')
+    views = views.values_list('project_id', *VIEW_COLUMNS).iterator()
+
+    view = next(views, None)
+    for (project_id, name, meta_title) in projects.values_list('id', 'name', 'meta_title').iterator():
+        project_views = []
+        while view is not None and view[0] == project_id:
+            project_views.append(view[1:])
+            view = next(views, None)
+        yield (project_id, name, meta_title, project_views)
+
+
+def iter_project_fragments(eco_orm, batch_size=EXPORT_BATCH_SIZE, cache=None, descendants=False):
+    """ Generator of the text of each project of an ecosystem, sorted by name
+
+    With a cache, the text of each project is kept in it, keyed by the
+    project id and its export version. Only the projects not found in
+    the cache, because they changed since they were exported, have their
+    repository views read, for each batch with changes, and formatted
+    again. The fragments are shared by all the ecosystems of a project.
+    Without a cache, the projects are read with `iter_project_views`.
+
+    :param eco_orm: ecosystem to export
+    :param batch_size: projects whose fragments are looked up at once
+    :param cache: Django cache in which to keep the fragments
+    :param descendants: export the projects below the ecosystem too
+    """
+
+    if not cache:
+        for (_, name, meta_title, views) in iter_project_views(eco_orm, descendants):
+            yield format_project_fragment(name, build_project_json(meta_title, views))
+        return
+
+    projects = exported_projects(eco_orm, descendants).order_by('name')
+    projects = list(projects.values_list('name', 'id', 'meta_title', 'export_version'))
+
+    for i in range(0, len(projects), batch_size):
+        batch = projects[i:i + batch_size]
+        keys = {project_id: fragment_cache_key(project_id, version) for (_, project_id, _, version) in batch}
+        fragments = cache.get_many(list(keys.values()))
+
+        dirty = [(project_id, name, meta_title) for (name, project_id, meta_title, _) in batch
+                 if keys[project_id] not in fragments]
+        if dirty:
+            projects_json = fetch_projects_json(dirty)
+            new_fragments = {keys[project_id]: format_project_fragment(name, projects_json[project_id])
+                             for (project_id, name, _) in dirty}
+            cache.set_many(new_fragments)
+            fragments.update(new_fragments)
+
+        for (_, project_id, _, _) in batch:
+            yield fragments[keys[project_id]]
+
+
+def iter_view_rows(eco_orm, descendants=False):
+    """ Generator of the (project, data_source, repo, params) of an ecosystem
+
+    The projects are sorted by name, and the repository views of each
+    one are generated in the order in which they were added to it. They
+    are read with one query. Projects without repository views generate
+    no rows.
+    """
+
+    views = exported_views(eco_orm, descendants).order_by('project__name', 'id')
+    yield from views.values_list('project__name', *VIEW_COLUMNS).iterator()
+
+
+def join_chunks(texts, chunk_size):
+    """ Join texts in chunks of at least chunk_size characters, but the last one """
+
+    chunk = []
+    chunk_len = 0
+
+    for text in texts:
+        chunk.append(text)
+        chunk_len += len(text)
+        if chunk_len >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            chunk_len = 0
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def iter_exported_projects(eco_orm, descendants=False):
+    """ Generator of the (project name, project JSON) of an ecosystem, sorted by name
+
+    The projects are the ones written in the JSON projects file, built
+    one at a time, see `iter_project_views`.
+    """
+
+    for (_, name, meta_title, views) in iter_project_views(eco_orm, descendants):
+        yield (name, build_project_json(meta_title, views))
 
 
 def fetch_projects(ecosystem):
+    """ Dict with the JSON of the projects of an ecosystem, as in its projects file
+
+    All the projects are kept in memory; the exports generate them with
+    `iter_exported_projects` instead.
+
+    :param ecosystem: name of the ecosystem
+    """
+
     try:
         eco_orm = Ecosystem.objects.get(name=ecosystem)
     except Ecosystem.DoesNotExist:
         logging.error("Can not find ecosystem %s", ecosystem)
         raise Ecosystem.DoesNotExist
 
-    projects_orm = eco_orm.projects.all()
+    return dict(iter_exported_projects(eco_orm))
+
+
+def iter_projects_ndjson(eco_orm, descendants=False):
+    """ Generator of the lines of the NDJSON projects file of an ecosystem
+
+    Each line is a JSON object with a project, {name: project}, as it is
+    in the JSON projects file, so the objects of all the lines merged are
+    the JSON projects file. The projects are sorted by name.
+    """
+
+    for (name, project_json) in iter_exported_projects(eco_orm, descendants):
+        yield json.dumps({name: project_json}, sort_keys=True) + '\n'
+
+
+def iter_views_ndjson(eco_orm, descendants=False):
+    """ Generator of the lines of the NDJSON repository views file of an ecosystem
+
+    Each line is a JSON object with the VIEW_FIELDS of a repository view.
+    """
+
+    for row in iter_view_rows(eco_orm, descendants):
+        yield json.dumps(dict(zip(VIEW_FIELDS, (eco_orm.name,) + row))) + '\n'
+
 
-    beasts = {}
+def tsv_field(value):
+    """ Escape the tabs and new lines of a value of a TSV line """
 
-    for project in projects_orm:
-        beasts[project.name] = {}
-        if project.meta_title:
-            beasts[project.name]["meta"] = {"title": project.meta_title}
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
 
-        for repository_view_orm in project.repository_views.all():
-            data_source = repository_view_orm.repository.data_source.name
-            if data_source not in beasts[project.name]:
-                beasts[project.name][data_source] = []
-            repo_proj_line = build_project_repository_view(repository_view_orm)
-            beasts[project.name][data_source].append(repo_proj_line)
 
-    return beasts
+def iter_views_tsv(eco_orm, descendants=False):
+    """ Generator of the lines of the TSV repository views file of an ecosystem
 
+    The first line is the header with the VIEW_FIELDS, and each other line
+    has the fields of a repository view. Backslashes, tabs and new lines in
+    the values are escaped with a backslash.
+    """
 
-def export_projects(projects_file, ecosystem):
+    yield '\t'.join(VIEW_FIELDS) + '\n'
+    for row in iter_view_rows(eco_orm, descendants):
+        yield '\t'.join(tsv_field(value) for value in (eco_orm.name,) + row) + '\n'
 
-    nrepository_views = 0
-    projects = fetch_projects(ecosystem)
-    nprojects = len(list(projects.keys()))
 
-    for project in projects:
-        for ds in projects[project]:
-            if ds != 'meta':
-                nrepository_views += len(projects[project][ds])
+def iter_export(eco_orm, export_format='json', chunk_size=EXPORT_CHUNK_SIZE, cache=None, descendants=False):
+    """ Generator of the projects file of an ecosystem in one of the EXPORT_FORMATS, in chunks of text
+
+    The cache is used only by the json format, see `iter_projects_json`.
+    With descendants, the projects below the ecosystem are exported too.
+    """
+
+    if export_format == 'json':
+        return iter_projects_json(eco_orm, chunk_size, cache, descendants)
+
+    lines = {
+        'ndjson': iter_projects_ndjson,
+        'ndjson-views': iter_views_ndjson,
+        'tsv': iter_views_tsv
+    }[export_format](eco_orm, descendants=descendants)
+
+    return join_chunks(lines, chunk_size)
+
+
+def iter_projects_json(eco_orm, chunk_size=EXPORT_CHUNK_SIZE, cache=None, descendants=False):
+    """ Generator of the JSON projects file of an ecosystem in chunks of text
+
+    The text is the same generated with `json.dump(projects, indent=True,
+    sort_keys=True)`, if the database sorts the names as Python (see
+    `iter_project_views`), but it is built one project at a time, so neither
+    the projects nor the text of the whole file are kept in memory. Each
+    chunk has at least chunk_size characters, but the last one.
+
+    With a cache, the text of the projects not changed is read from it,
+    see `iter_project_fragments`.
+    """
+
+    chunk = []
+    chunk_len = 0
+    separator = '{\n '
+
+    for fragment in iter_project_fragments(eco_orm, cache=cache, descendants=descendants):
+        chunk.append(separator + fragment)
+        chunk_len += len(chunk[-1])
+        separator = ',\n '
+
+        if chunk_len >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            chunk_len = 0
+
+    chunk.append('{}' if separator == '{\n ' else '\n}')
+    yield ''.join(chunk)
+
+
+def export_projects(projects_file, ecosystem, export_format='json', descendants=False):
+
+    try:
+        eco_orm = Ecosystem.objects.get(name=ecosystem)
+    except Ecosystem.DoesNotExist:
+        logging.error("Can not find ecosystem %s", ecosystem)
+        raise Ecosystem.DoesNotExist
+
+    # The rows are counted, the counters could be wrong until they are repaired
+    projects = exported_projects(eco_orm, descendants)
+    nprojects = projects.count()
+    nrepository_views = exported_views(eco_orm, descendants).count()
 
     with open(projects_file, "w") as pfile:
-        json.dump(projects, pfile, indent=True, sort_keys=True)
+        for chunk in iter_export(eco_orm, export_format, descendants=descendants):
+            pfile.write(chunk)
 
     return (nprojects, nrepository_views)
 
@@ -189,7 +401,7 @@ if __name__ == '__main__':
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("requests").setLevel(logging.WARNING)
 
-    (nprojects, nrepos) = export_projects(args.file, args.ecosystem)
+    (nprojects, nrepos) = export_projects(args.file, args.ecosystem, args.format, args.descendants)
 
     logging.debug("Total exporting time ... %.2f sec", time() - task_init)
     print("Projects exported", nprojects)
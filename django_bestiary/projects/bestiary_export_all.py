@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Export several ecosystems of Bestiary at the same time
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tarfile
+import tempfile
+import zipfile
+
+from datetime import datetime
+from time import time
+
+import django
+os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
+django.setup()
+
+from django.db import connections
+
+from projects.bestiary_export import export_projects
+from projects.models import Ecosystem
+
+MANIFEST_FILE = 'manifest.json'
+ARCHIVE_FORMATS = ['tar', 'zip']
+# Bytes read in each read of an archive
+ARCHIVE_READ_SIZE = 64 * 1024
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bestiary_export_all.py [options]",
+                                     description="Export several ecosystems of beastiary to JSON files")
+    parser.add_argument("-f", "--file", required=True,
+                        help="Archive (.tar, .tar.gz, .tgz or .zip) or directory for the projects files")
+    parser.add_argument('-o', '--ecosystem', action='append',
+                        help='Ecosystem to be exported. Could be repeated. All are exported by default')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Ecosystems exported at the same time')
+    parser.add_argument('-g', '--debug', action='store_true')
+
+    return parser.parse_args()
+
+
+def projects_file_name(ecosystem):
+    """ Name of the projects file of an ecosystem, safe to be used in a path """
+
+    return "projects_%s.json" % re.sub(r'[^\w.-]', '_', ecosystem)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as pfile:
+        for block in iter(lambda: pfile.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_ecosystem(ecosystem, directory, file_name):
+    """ Export the projects file of an ecosystem to a directory
+
+    :return: the entry of the projects file in the manifest
+    """
+
+    path = os.path.join(directory, file_name)
+    (nprojects, nrepository_views) = export_projects(path, ecosystem)
+
+    return {
+        "ecosystem": ecosystem,
+        "file": file_name,
+        "projects": nprojects,
+        "repository_views": nrepository_views,
+        "bytes": os.path.getsize(path),
+        "sha256": hash_file(path)
+    }
+
+
+def export_ecosystem_worker(ecosystem, directory, file_name):
+    try:
+        return export_ecosystem(ecosystem, directory, file_name)
+    finally:
+        # Each worker has its own connection, close it before the worker is reused
+        connections.close_all()
+
+
+def export_ecosystems(directory, ecosystems=None, jobs=1, executor_class=concurrent.futures.ProcessPoolExecutor):
+    """ Export the projects files of several ecosystems to a directory
+
+    The ecosystems are exported in parallel, each one by a worker of the
+    executor. The directory gets a manifest with the number of projects
+    and repository views, the size and the sha256 of each file.
+
+    :param directory: directory in which to write the projects files
+    :param ecosystems: names of the ecosystems to export, all by default
+    :param jobs: number of ecosystems exported at the same time
+    :param executor_class: class of the pool of workers
+    :return: the manifest
+    """
+
+    if ecosystems is None:
+        ecosystems = list(Ecosystem.objects.order_by('name').values_list('name', flat=True))
+    else:
+        found = set(Ecosystem.objects.filter(name__in=ecosystems).values_list('name', flat=True))
+        for ecosystem in ecosystems:
+            if ecosystem not in found:
+                logging.error("Can not find ecosystem %s", ecosystem)
+                raise Ecosystem.DoesNotExist
+
+    # Different names could end in the same file name
+    file_names = {}
+    for ecosystem in ecosystems:
+        file_name = projects_file_name(ecosystem)
+        if file_name in file_names.values():
+            file_name = projects_file_name("%s_%i" % (ecosystem, len(file_names)))
+        file_names[ecosystem] = file_name
+
+    entries = []
+    if jobs <= 1:
+        for ecosystem in ecosystems:
+            entries.append(export_ecosystem(ecosystem, directory, file_names[ecosystem]))
+    else:
+        if issubclass(executor_class, concurrent.futures.ProcessPoolExecutor):
+            # The connection must not be shared with the forked processes
+            connections.close_all()
+        with executor_class(max_workers=jobs) as executor:
+            futures = [executor.submit(export_ecosystem_worker, ecosystem, directory, file_names[ecosystem])
+                       for ecosystem in ecosystems]
+            entries = [future.result() for future in futures]
+
+    manifest = {
+        "created_at": datetime.utcnow().isoformat() + 'Z',
+        "ecosystems": entries
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as mfile:
+        json.dump(manifest, mfile, indent=True, sort_keys=True)
+
+    return manifest
+
+
+def archive_directory(directory, archive, archive_format):
+    """ Add the files of a directory to a tar.gz or zip archive
+
+    :param directory: directory with the files
+    :param archive: path or file object of the archive
+    :param archive_format: 'tar' or 'zip'
+    """
+
+    names = sorted(os.listdir(directory))
+
+    if archive_format == 'zip':
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zfile:
+            for name in names:
+                zfile.write(os.path.join(directory, name), name)
+    else:
+        if isinstance(archive, str):
+            tfile = tarfile.open(archive, 'w:gz' if archive.endswith('gz') else 'w')
+        else:
+            tfile = tarfile.open(fileobj=archive, mode='w:gz')
+        with tfile:
+            for name in names:
+                tfile.add(os.path.join(directory, name), name)
+
+
+def iter_archive(ecosystems, archive_format, jobs=1, executor_class=concurrent.futures.ProcessPoolExecutor):
+    """ Generator of the bytes of an archive with the projects files of several ecosystems
+
+    The archive is built in a temporary file, which is read once it is
+    complete. See `export_ecosystems` for the params.
+    """
+
+    with tempfile.TemporaryFile() as archive:
+        directory = tempfile.mkdtemp()
+        try:
+            export_ecosystems(directory, ecosystems, jobs, executor_class)
+            archive_directory(directory, archive, archive_format)
+        finally:
+            shutil.rmtree(directory)
+
+        archive.seek(0)
+        yield from iter(lambda: archive.read(ARCHIVE_READ_SIZE), b'')
+
+
+def archive_format(path):
+    """ Format of the archive for a path, None if it is a directory """
+
+    if path.endswith('.zip'):
+        return 'zip'
+    if path.endswith(('.tar', '.tar.gz', '.tgz')):
+        return 'tar'
+    return None
+
+
+if __name__ == '__main__':
+
+    task_init = time()
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    fmt = archive_format(args.file)
+    if fmt:
+        directory = tempfile.mkdtemp()
+    else:
+        directory = args.file
+        os.makedirs(directory, exist_ok=True)
+
+    try:
+        manifest = export_ecosystems(directory, args.ecosystem, args.jobs)
+        if fmt:
+            archive_directory(directory, args.file, fmt)
+    except Ecosystem.DoesNotExist:
+        sys.exit(1)
+    finally:
+        if fmt:
+            shutil.rmtree(directory)
+
+    logging.debug("Total exporting time ... %.2f sec", time() - task_init)
+    for entry in manifest['ecosystems']:
+        print("%s: %i projects, %i repository views exported to %s" %
+              (entry['ecosystem'], entry['projects'], entry['repository_views'], entry['file']))
@@ -24,34 +24,58 @@
 #
 
 import argparse
+import hashlib
 import json
 import logging
 import os
-import tempfile
+import sys
 
 from time import time
 
 
-from django.test import TestCase
+from django.db import connection, transaction
+
+from django.utils import timezone
 
 import django
 # settings.configure()
 os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
 django.setup()
 
-from projects.models import Ecosystem, Project, Repository, RepositoryView, DataSource
-from projects.bestiary_export import export_projects
+from projects.models import (Ecosystem, ImportedProject, ImportRun, Project,
+                             Repository, RepositoryView, RepositoryViewParam, DataSource)
+from projects.bestiary_export import iter_exported_projects
+from projects.bestiary_validate import format_error, validate_projects
+from projects.datasource_codecs import parse_lines
+from projects.counters import update_counters
+from projects.locks import ecosystem_lock, write_lock
+from projects.data_cache import invalidate_all
+from projects.signals import bump_export_version, bump_projects_export_version
+from projects.view_params import param_rows, parsed_params
+from projects.projects_diff import ProjectsDiff, iter_file_projects
+from projects.projects_stream import NOT_DS_FIELDS, decompress, iter_projects, open_projects_file
 
 
 def get_params():
     parser = argparse.ArgumentParser(usage="usage: beasts_feeder.py [options]",
                                      description="Feed beastiary with projects")
-    parser.add_argument("-f", "--file", required=True, help="JSON projects file")
+    parser.add_argument("-f", "--file", required=True,
+                        help="JSON projects file, could be compressed with gzip, bzip2 or xz")
     parser.add_argument('-g', '--debug', action='store_true')
     parser.add_argument('-o', '--ecosystem', required='True',
                         help='Ecosystem for the projects')
     parser.add_argument('-c', '--check', action='store_true',
-                        help='Export the data and compare it with the imported')
+                        help='Compare the projects loaded with the ones in the file')
+    parser.add_argument('--no-bulk', action='store_true',
+                        help='Add the objects one by one instead of in bulk (slower)')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Only load the projects changed since the last incremental import')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Show the changes of an incremental import without loading them')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help='Continue the last interrupted import of the projects file')
+    parser.add_argument('--validate', action='store_true',
+                        help='Validate the projects file and do not load it if it has errors')
 
     return parser.parse_args()
 
@@ -59,68 +83,13 @@ def get_params():
 def find_repo_name(repository_view_str, data_source):
     """ Given a data_source and its type extract the repository """
 
-    repo = None
-    if data_source in ['askbot', 'functest', 'hyperkitty', 'jenkins', 'mediawiki',
-                       'mozillaclub', 'phabricator', 'pipermail',
-                       'redmine', 'remo', 'rss']:
-        repo = repository_view_str
-    elif data_source in ['bugzilla', 'bugzillarest']:
-        tokens = repository_view_str.split("?", 1)
-        repo = tokens[0].replace('/bugs/buglist.cgi', '')
-    elif data_source in ['confluence', 'discourse', 'git', 'github', 'jira',
-                         'supybot', 'nntp']:
-        repo = repository_view_str.split(" ")[0]
-    elif data_source in ['crates', 'dockerhub', 'google_hits',
-                         'meetup', 'puppetforge', 'slack', 'telegram',
-                         'twitter']:
-        repo = ''  # not needed because it is always the same
-    elif data_source in ['gerrit']:
-        tokens = repository_view_str.split("_")
-        repo = tokens[0]
-    elif data_source in ['mbox']:
-        tokens = repository_view_str.split(" ")
-        repo = tokens[0] + " " + tokens[1]
-    elif data_source in ['stackexchange']:
-        repo = repository_view_str.split("questions")[0]
-
-    return repo
+    return parse_lines(data_source, [repository_view_str])[0][0]
 
 
 def find_params(repository_view_str, data_source):
     """ Given a data_source and its type extract the params for the repository """
 
-    params = ''
-
-    if data_source in ['askbot', 'crates', 'functest',
-                       'hyperkitty', 'jenkins', 'mediawiki', 'mozillaclub',
-                       'phabricator', 'pipermail', 'puppetforge', 'redmine',
-                       'remo', 'rss']:
-        # THese data sources does not support filtering
-        params = ''
-    elif data_source in ['bugzilla', 'bugzillarest']:
-        tokens = repository_view_str.split("?", 1)
-        if len(tokens) > 1:
-            params = tokens[1]
-    elif data_source in ['confluence', 'discourse', 'git', 'github', 'jira',
-                         'supybot', 'nntp']:
-        tokens = repository_view_str.split(" ", 1)
-        if len(tokens) > 1:
-            params = tokens[1]
-    elif data_source in ['dockerhub', 'google_hits', 'meetup', 'slack',
-                         'telegram', 'twitter']:
-        params = repository_view_str
-    elif data_source in ['gerrit']:
-        tokens = repository_view_str.split("_", 1)
-        if len(tokens) > 1:
-            params = tokens[1]
-    elif data_source in ['mbox']:
-        tokens = repository_view_str.split(" ", 2)
-        if len(tokens) > 2:
-            params = tokens[2]
-    elif data_source in ['stackexchange']:
-        params = repository_view_str.split("tagged/")[1]
-
-    return params
+    return parse_lines(data_source, [repository_view_str])[0][1]
 
 
 def add(cls_orm, **params):
@@ -144,55 +113,617 @@ def add(cls_orm, **params):
 
 
 def list_not_ds_fields():
-    return ['meta']
+    return NOT_DS_FIELDS
+
+
+def find_meta_title(meta):
+    """ Given the meta of a project extract its title """
+
+    meta_title = None
+
+    if meta is not None:
+        if isinstance(meta, str):
+            # In Mozilla the meta is the title directly
+            meta_title = meta
+        else:
+            meta_title = meta['title']
+
+    return meta_title
+
+
+def unique(items):
+    """ Remove the duplicated items keeping the order in which they were found """
+
+    seen = set()
+    found = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            found.append(item)
+    return found
+
+
+def chunks(items, size):
+    """ Split a list of items in lists of size items """
+
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def insert_ignore(cls_orm, fields, rows, batch_size=500, sort_fields=None):
+    """ Insert rows skipping the ones that already exist
+
+    Unlike bulk_create, rows that violate a unique constraint are ignored
+    instead of failing, so several processes could add the same rows at
+    the same time. The created_at and updated_at fields of the beasts, and
+    the fields with a default value, are filled automatically.
+
+    The rows are inserted sorted, so the processes adding the same rows
+    take the locks of their unique indexes in the same order, instead of
+    waiting for each other in a deadlock. The fields of the unique
+    constraints must be the first ones.
+
+    :param cls_orm: model of the rows
+    :param fields: names of the fields in each row
+    :param rows: list of tuples with the values of the fields
+    :param sort_fields: number of the first fields by which the rows are
+                        sorted, all by default. The rows with the same
+                        values in them keep their order, and so their ids
+    :return: the number of rows inserted
+    """
+
+    if not rows:
+        return 0
+
+    # None is sorted before any value
+    rows = sorted(rows, key=lambda row: [(value is not None, value) for value in row[:sort_fields]])
+    fields = [cls_orm._meta.get_field(field) for field in fields]
+    now = timezone.now()
+    # The automatic values are the same for all the rows, so they are prepared once
+    auto_fields = []
+    auto_values = []
+    for field in cls_orm._meta.concrete_fields:
+        if field in fields or field.primary_key:
+            continue
+        if field.name in ('created_at', 'updated_at'):
+            value = now
+        elif field.has_default():
+            value = field.get_default()
+        else:
+            continue
+        auto_fields.append(field)
+        auto_values.append(field.get_db_prep_value(value, connection))
+
+    if connection.vendor == 'sqlite':
+        (insert, on_conflict) = ('INSERT OR IGNORE INTO', '')
+    elif connection.vendor == 'mysql':
+        (insert, on_conflict) = ('INSERT IGNORE INTO', '')
+    else:
+        (insert, on_conflict) = ('INSERT INTO', ' ON CONFLICT DO NOTHING')
+
+    quote = connection.ops.quote_name
+    row_sql = '(' + ', '.join(['%s'] * (len(fields) + len(auto_fields))) + ')'
+    sql = '%s %s (%s) VALUES ' % (insert, quote(cls_orm._meta.db_table),
+                                  ', '.join(quote(field.column) for field in fields + auto_fields))
+    batch_size = min(batch_size, connection.ops.bulk_batch_size(fields + auto_fields, rows))
+
+    inserted = 0
+    with connection.cursor() as cursor:
+        for rows_chunk in chunks(rows, batch_size):
+            values = []
+            for row in rows_chunk:
+                values += [field.get_db_prep_value(value, connection) for (field, value) in zip(fields, row)]
+                values += auto_values
+            cursor.execute(sql + ', '.join([row_sql] * len(rows_chunk)) + on_conflict, values)
+            inserted += cursor.rowcount
+
+    return inserted
+
+
+# Projects parsed at once
+PARSE_CHUNK_SIZE = 100
+
+
+def parse_projects(projects):
+    """ Parse a chunk of projects into the rows to be loaded
+
+    For each repository line a (project, meta_title, data_source,
+    repository name, params) row is generated. Data sources without
+    lines, and lines whose repository can not be found, generate a row
+    with repository name and params set to None. Projects without data
+    sources generate a row with data_source set to None too.
+
+    :param projects: list of (project, project JSON) to be parsed
+    :return: a tuple with the rows and the (data_source, line) errors
+    """
+
+    rows = []
+    errors = []
+
+    for (project, project_json) in projects:
+        meta_title = find_meta_title(project_json.get('meta'))
+        nrows = len(rows)
+
+        for data_source in project_json:
+            if data_source in NOT_DS_FIELDS:
+                continue
+
+            ndata_source_rows = len(rows)
+            lines = project_json[data_source]
+            for (repository_view_str, (repo_name, repo_params)) in zip(lines, parse_lines(data_source, lines)):
+                if repo_name is None:
+                    errors.append((data_source, repository_view_str))
+                    continue
+
+                rows.append((project, meta_title, data_source, repo_name, repo_params))
+
+            if len(rows) == ndata_source_rows:
+                rows.append((project, meta_title, data_source, None, None))
+
+        if len(rows) == nrows:
+            rows.append((project, meta_title, None, None, None))
+
+    return (rows, errors)
+
+
+def iter_parsed_projects(pfile, chunk_size=PARSE_CHUNK_SIZE):
+    """ Parse stage of the import: parse the projects of a projects file
+
+    The projects are read incrementally and parsed in chunks of
+    chunk_size projects, in the order of the file.
+
+    The projects are decoded while the file is read, which takes longer
+    than parsing their lines, and finding where each one ends costs as
+    much as decoding it. So they are parsed in this process: sending them
+    to other processes to parse would only add the cost of copying them.
+
+    :return: a generator of `parse_projects` results, one per chunk
+    """
+
+    chunk = []
+    for project in iter_projects(pfile):
+        chunk.append(project)
+        if len(chunk) >= chunk_size:
+            yield parse_projects(chunk)
+            chunk = []
+    if chunk:
+        yield parse_projects(chunk)
+
+
+class BulkLoader():
+    """ Load projects in an ecosystem using batched queries
+
+    The natural keys of the data sources, repositories and repository
+    views already stored are read once and kept in dictionaries, so
+    the objects not found in them can be inserted in batches. The same
+    is done for the rows of the projects and ecosystems through tables.
+
+    Objects are inserted in the order in which they are found in the
+    projects file, so they are exported back in the same order.
+
+    Without preload, only the natural keys of each batch are looked up,
+    which is better when just a few projects are going to be loaded.
+    """
+
+    # Keep it under the 999 variables limit of SQLite in the lookups
+    BATCH_SIZE = 500
+    # Projects whose lines are kept in memory before adding them
+    PROJECTS_BATCH_SIZE = 1000
+
+    def __init__(self, ecosystem, batch_size=BATCH_SIZE, projects_batch_size=PROJECTS_BATCH_SIZE,
+                 preload=True):
+        self.ecosystem = ecosystem
+        self.batch_size = batch_size
+        self.projects_batch_size = projects_batch_size
+        self.preload = preload
+
+        # name -> id
+        self.data_sources = {}
+        # (name, data_source_id) -> id
+        self.repositories = {}
+        # (repository_id, params) -> id
+        self.repository_views = {}
+        # name -> (id, meta_title)
+        self.projects = {}
+
+    def __load_maps(self):
+        self.data_sources = dict(DataSource.objects.values_list('name', 'id'))
+        self.repositories = {(name, ds_id): repo_id for (repo_id, name, ds_id)
+                             in Repository.objects.values_list('id', 'name', 'data_source_id')}
+        self.repository_views = {(repo_id, params): view_id for (view_id, repo_id, params)
+                                 in RepositoryView.objects.values_list('id', 'repository_id', 'params')}
+        self.projects = {name: (project_id, meta_title) for (project_id, name, meta_title)
+                         in Project.objects.values_list('id', 'name', 'meta_title')}
+
+    def __find_maps(self, rows, meta_titles):
+        """ Look up the natural keys of a batch not found yet in the maps """
+
+        if not self.data_sources:
+            self.data_sources = dict(DataSource.objects.values_list('name', 'id'))
+
+        names = unique([repo for (_, _, _, repo, _) in rows if repo is not None])
+        for names_chunk in chunks(names, self.batch_size):
+            repositories = Repository.objects.filter(name__in=names_chunk).values_list('id', 'name', 'data_source_id')
+            for (repo_id, name, ds_id) in repositories:
+                self.repositories[(name, ds_id)] = repo_id
+
+        repo_ids = unique([self.repositories[(repo, self.data_sources[ds])] for (_, _, ds, repo, _) in rows
+                           if repo is not None and (repo, self.data_sources.get(ds)) in self.repositories])
+        for ids_chunk in chunks(repo_ids, self.batch_size):
+            views = RepositoryView.objects.filter(repository_id__in=ids_chunk).values_list('id', 'repository_id', 'params')
+            for (view_id, repo_id, params) in views:
+                self.repository_views[(repo_id, params)] = view_id
+
+        for names_chunk in chunks(list(meta_titles), self.batch_size):
+            projects = Project.objects.filter(name__in=names_chunk).values_list('id', 'name', 'meta_title')
+            for (project_id, name, meta_title) in projects:
+                self.projects[name] = (project_id, meta_title)
+
+    def __add_data_sources(self, names):
+        missing = unique([name for name in names if name not in self.data_sources])
+        if not missing:
+            return
+
+        # Other imports could be adding the same rows, so the ids are read back
+        insert_ignore(DataSource, ['name'], [(name,) for name in missing], self.batch_size)
+        for names_chunk in chunks(missing, self.batch_size):
+            self.data_sources.update(DataSource.objects.filter(name__in=names_chunk).values_list('name', 'id'))
+        logging.debug('Added %i %s', len(missing), DataSource.__name__)
+
+    def __add_repositories(self, keys):
+        """ Add the (name, data source id) repositories not found, returning them """
+
+        missing = unique([key for key in keys if key not in self.repositories])
+        if not missing:
+            return missing
+
+        insert_ignore(Repository, ['name', 'data_source'], missing, self.batch_size)
+        for keys_chunk in chunks(missing, self.batch_size):
+            names = [name for (name, _) in keys_chunk]
+            for (repo_id, name, ds_id) in Repository.objects.filter(name__in=names).values_list('id', 'name', 'data_source_id'):
+                self.repositories[(name, ds_id)] = repo_id
+        logging.debug('Added %i %s', len(missing), Repository.__name__)
+
+        return missing
+
+    def __add_repository_views(self, keys, data_sources):
+        """ Add the (repository id, params) views not found, with their params parsed
+
+        :param data_sources: dict with the data source name of each view
+        """
+
+        missing = unique([key for key in keys if key not in self.repository_views])
+        if not missing:
+            return
+
+        rows = [(repo_id, params, parsed_params(data_sources[(repo_id, params)], params))
+                for (repo_id, params) in missing]
+        insert_ignore(RepositoryView, ['repository', 'params', 'parsed_params'], rows, self.batch_size)
+        for keys_chunk in chunks(missing, self.batch_size):
+            repo_ids = unique([repo_id for (repo_id, _) in keys_chunk])
+            views = RepositoryView.objects.filter(repository_id__in=repo_ids).values_list('id', 'repository_id', 'params')
+            for (view_id, repo_id, params) in views:
+                self.repository_views[(repo_id, params)] = view_id
+
+        # Other imports could have added the same views, with the same params
+        params_rows = []
+        for (repo_id, params) in missing:
+            params_rows += param_rows(self.repository_views[(repo_id, params)], data_sources[(repo_id, params)],
+                                      params)
+        insert_ignore(RepositoryViewParam, ['repository_view', 'key', 'value'], params_rows, self.batch_size)
+        logging.debug('Added %i %s', len(missing), RepositoryView.__name__)
+
+    def __add_projects(self, meta_titles):
+        """ Add the projects not found, returning the ids of the ones whose meta title changed """
+
+        missing = [name for name in meta_titles if name not in self.projects]
+        changed = []
+
+        for name in meta_titles:
+            if name in self.projects and meta_titles[name] is not None:
+                (project_id, meta_title) = self.projects[name]
+                if meta_title != meta_titles[name]:
+                    Project.objects.filter(id=project_id).update(meta_title=meta_titles[name])
+                    self.projects[name] = (project_id, meta_titles[name])
+                    changed.append(project_id)
+
+        if not missing:
+            return changed
+
+        new_projects = [(name, meta_titles[name] if meta_titles[name] is not None else '') for name in missing]
+        insert_ignore(Project, ['name', 'meta_title'], new_projects, self.batch_size)
+
+        for names_chunk in chunks(missing, self.batch_size):
+            projects = Project.objects.filter(name__in=names_chunk).values_list('id', 'name', 'meta_title')
+            for (project_id, name, meta_title) in projects:
+                self.projects[name] = (project_id, meta_title)
+        logging.debug('Added %i %s', len(missing), Project.__name__)
+
+        return changed
+
+    def __add_relations(self, through, source_field, target_field, pairs):
+        """ Add the (source id, target id) pairs not already in a through table """
+
+        pairs = unique(pairs)
+        source_ids = unique([source_id for (source_id, _) in pairs])
+
+        existing = set()
+        for ids_chunk in chunks(source_ids, self.batch_size):
+            filters = {source_field + '__in': ids_chunk}
+            existing.update(through.objects.filter(**filters).values_list(source_field, target_field))
+
+        missing = [pair for pair in pairs if pair not in existing]
+        # The targets of each source keep their order, it is the one of the exported views
+        insert_ignore(through, [source_field, target_field], missing, self.batch_size, sort_fields=1)
+        logging.debug('Added %i %s', len(missing), through.__name__)
+
+        return missing
+
+    def load_batch(self, eco_orm, rows, meta_titles):
+        """ Add the repository views of a batch of projects
+
+        :param eco_orm: ecosystem in which to add the projects
+        :param rows: rows of the projects as generated by `parse_projects`
+        :param meta_titles: dict with the meta title of each project
+        :return: the (project id, repository view id) of the rows
+        """
+
+        if not self.preload:
+            self.__find_maps(rows, meta_titles)
+
+        data_sources = [ds for (_, _, ds, _, _) in rows if ds is not None]
+        rows = [row for row in rows if row[3] is not None]
+
+        self.__add_data_sources(data_sources)
+        added_repositories = self.__add_repositories([(repo, self.data_sources[ds]) for (_, _, ds, repo, _) in rows])
+        view_keys = [((self.repositories[(repo, self.data_sources[ds])], params), ds)
+                     for (_, _, ds, repo, params) in rows]
+        self.__add_repository_views([key for (key, _) in view_keys], dict(view_keys))
+        changed = self.__add_projects(meta_titles)
+
+        project_views = []
+        for (project, _, ds, repo, params) in rows:
+            repo_id = self.repositories[(repo, self.data_sources[ds])]
+            project_views.append((self.projects[project][0], self.repository_views[(repo_id, params)]))
+        added_views = self.__add_relations(Project.repository_views.through,
+                                           'project_id', 'repositoryview_id', project_views)
+
+        eco_projects = [(eco_orm.id, self.projects[project][0]) for project in meta_titles]
+        added_projects = self.__add_relations(Ecosystem.projects.through,
+                                              'ecosystem_id', 'project_id', eco_projects)
+
+        # The signals are skipped, so mark the changes for the exports. The
+        # projects could be in other ecosystems too, whose exports change.
+        changed = unique(changed + [project_id for (project_id, _) in added_views])
+        for ids_chunk in chunks(changed, self.batch_size):
+            bump_projects_export_version(ids_chunk)
+        if added_projects:
+            bump_export_version(Ecosystem.objects.filter(id=eco_orm.id))
+        invalidate_all()
+
+        update_counters(DataSource, [ds_id for (_, ds_id) in added_repositories])
+        update_counters(Project, [project_id for (project_id, _) in added_views])
+        if added_projects:
+            update_counters(Ecosystem, [eco_orm.id])
+
+        return project_views
+
+    def __load_checkpoint(self, eco_orm, batch, meta_titles, run, last_project):
+        """ Load a batch in its own transaction, recording its last project in the import run """
+
+        with write_lock(), transaction.atomic():
+            self.load_batch(eco_orm, batch, meta_titles)
+            if last_project is not None:
+                run.last_project = last_project
+                run.save()
+
+    def __load(self, parsed, run, progress):
+        nprojects = 0
+        nrepos = 0
+
+        batch = []
+        meta_titles = {}
+        # The order of the keys of a dict is not kept in Python 3.5
+        last_project = None
+
+        # When resuming, skip the projects up to the last one loaded
+        resume_after = run.last_project if run else None
+        skipping = bool(resume_after)
+        checkpoint_found = False
+        project = None
+
+        eco_orm = add(Ecosystem, **{"name": self.ecosystem})
+        if self.preload:
+            self.__load_maps()
+
+        for (rows, errors) in parsed:
+            for (data_source, repository_view_str) in errors:
+                logging.error('Can not find repository for %s %s', data_source, repository_view_str)
+
+            for row in rows:
+                if row[0] != project:
+                    project = row[0]
+                    nprojects += 1
+                    if checkpoint_found:
+                        skipping = False
+                    checkpoint_found = project == resume_after
+                if row[3] is not None:
+                    nrepos += 1
+                if skipping:
+                    continue
 
+                if project not in meta_titles:
+                    if len(meta_titles) >= self.projects_batch_size:
+                        if run:
+                            self.__load_checkpoint(eco_orm, batch, meta_titles, run, last_project)
+                            if progress:
+                                progress(nprojects, nrepos)
+                        else:
+                            self.load_batch(eco_orm, batch, meta_titles)
+                        batch = []
+                        meta_titles = {}
+                        last_project = None
+                    meta_titles[project] = row[1]
+                    last_project = project
+                batch.append(row)
+
+        if run:
+            self.__load_checkpoint(eco_orm, batch, meta_titles, run, last_project)
+            run.finished = True
+            run.save()
+            if progress:
+                progress(nprojects, nrepos)
+        else:
+            self.load_batch(eco_orm, batch, meta_titles)
+
+        return (nprojects, nrepos)
+
+    def load(self, parsed, run=None, progress=None):
+        """ Write stage of the import: load the parsed projects
+
+        The projects are added in batches of projects_batch_size projects,
+        so only the rows of a batch are kept in memory.
+
+        Without an import run, all the batches are loaded in a single
+        transaction. With it, each batch is committed in its own
+        transaction, which records the last project loaded in the run.
+        If the run already has a last project, the projects up to it are
+        skipped, resuming the import where it was interrupted.
+
+        :param parsed: iterable of (rows, errors) as generated by
+                       `iter_parsed_projects`
+        :param run: ImportRun in which to record the progress
+        :param progress: function called with the number of projects and
+                         repositories read after each batch is committed
+        :return: a tuple with the number of projects and repositories in
+                 the projects file
+        """
+
+        if run:
+            return self.__load(parsed, run, progress)
+
+        with write_lock(), transaction.atomic():
+            return self.__load(parsed, None, None)
+
+
+def load_projects(projects_file, ecosystem, bulk=True, resume=False, progress=None, checkpoint=False):
+    """ Load the projects from a projects file in an ecosystem
+
+    Loading in bulk with checkpoints, the projects are committed in
+    batches and the progress is recorded in an ImportRun, so an
+    interrupted import of the same file can be resumed. Otherwise they
+    are loaded in a single transaction.
+
+    :param projects_file: path to the JSON projects file
+    :param ecosystem: name of the ecosystem in which to load the projects
+    :param bulk: load the projects using batched queries. Otherwise each
+                 object is added one by one
+    :param resume: continue the last interrupted import of the file
+    :param progress: function called after each batch loaded in bulk with
+                     the number of projects and repositories read and
+                     the bytes of the file read, with checkpoints
+    :param checkpoint: commit each batch loaded in bulk and record it, so
+                       the import could be resumed if it is interrupted
+    :return: a tuple with the number of projects and repositories loaded
+    """
+
+    if not bulk:
+        with open_projects_file(projects_file) as pfile:
+            return load_projects_stream(pfile, ecosystem, bulk)
+
+    # Imports of other ecosystems could run at the same time
+    with ecosystem_lock(ecosystem):
+        run = None
+        # The progress is reported once each batch is committed
+        checkpoint = checkpoint or resume or progress is not None
+        if checkpoint:
+            file_hash = hash_file(projects_file)
+
+        if resume:
+            runs = ImportRun.objects.filter(ecosystem__name=ecosystem, file_hash=file_hash,
+                                            incremental=False, finished=False)
+            run = runs.order_by('-id').first()
+            if run:
+                logging.info('Resuming the import of %s after project %s', projects_file, run.last_project)
+            else:
+                logging.info('No interrupted import of %s found in %s', projects_file, ecosystem)
+
+        if not run and checkpoint:
+            eco_orm = add(Ecosystem, **{"name": ecosystem})
+            run = ImportRun.objects.create(ecosystem=eco_orm, file_hash=file_hash)
+
+        with open(projects_file, 'rb') as raw:
+            with decompress(raw) as pfile:
+                parsed = iter_parsed_projects(pfile)
+
+                def batch_progress(nprojects, nrepos):
+                    # With compressed files, the progress is in compressed bytes
+                    progress(nprojects, nrepos, raw.tell())
+
+                return BulkLoader(ecosystem).load(parsed, run, batch_progress if progress else None)
+
+
+def load_projects_stream(pfile, ecosystem, bulk=True):
+    """ Load the projects from an open projects file in an ecosystem
+
+    The file is read incrementally, so it is never fully kept in memory.
+    It could be a file opened in text or binary mode, or any other object
+    with a `read(size)` method, like an uploaded file. Seekable files in
+    binary mode could be compressed with gzip, bzip2 or xz.
+    """
+
+    if isinstance(pfile.read(0), bytes) and pfile.seekable():
+        pfile = decompress(pfile)
+
+    parsed = iter_parsed_projects(pfile)
 
-def load_projects(projects_file, ecosystem):
+    with ecosystem_lock(ecosystem):
+        if bulk:
+            return BulkLoader(ecosystem).load(parsed)
 
-    # fields in project that are not a data source
-    no_ds = list_not_ds_fields()
+        return load_projects_one_by_one(parsed, ecosystem)
+
+
+def load_projects_one_by_one(parsed, ecosystem):
 
     eco_orm = add(Ecosystem, **{"name": ecosystem})
 
-    projects = None
     nprojects = 0
     nrepos = 0
+    project_orm = None
 
-    with open(projects_file) as pfile:
-        projects = json.load(pfile)
+    for (rows, errors) in parsed:
+        for (data_source, repository_view_str) in errors:
+            logging.error('Can not find repository for %s %s', data_source, repository_view_str)
 
-    for project in projects.keys():
-        pparams = {"name": project}
-        if 'meta' in projects[project].keys():
-            if isinstance(projects[project]['meta'], str):
-                # In Mozilla the meta is the title directly
-                pparams.update({"meta_title": projects[project]['meta']})
-            else:
-                pparams.update({"meta_title": projects[project]['meta']['title']})
-        project_orm = add(Project, **pparams)
-        eco_orm.projects.add(project_orm)
+        for (project, meta_title, data_source, repo_name, repo_params) in rows:
+            if not project_orm or project_orm.name != project:
+                if project_orm:
+                    # Register all the repo views added
+                    project_orm.save()
 
-        nprojects += 1
+                pparams = {"name": project}
+                if meta_title is not None:
+                    pparams.update({"meta_title": meta_title})
+                project_orm = add(Project, **pparams)
+                eco_orm.projects.add(project_orm)
 
-        for data_source in projects[project]:
-            if data_source in no_ds:
+                nprojects += 1
+
+            if data_source is None:
                 continue
 
             ds_type_obj = add(DataSource, **{"name": data_source})
 
-            for repository_view_str in projects[project][data_source]:
-                repo_name = find_repo_name(repository_view_str, data_source)
-                if repo_name is None:
-                    logging.error('Can not find repository for %s %s', data_source, repository_view_str)
-                    continue
+            if repo_name is None:
+                continue
 
-                repo_obj = add(Repository, **{"name": repo_name, "data_source": ds_type_obj})
-                nrepos += 1
-                repo_params = find_params(repository_view_str, data_source)
-                data_source_orm = add(RepositoryView, **{"params": repo_params, "repository": repo_obj})
-                project_orm.repository_views.add(data_source_orm)
+            repo_obj = add(Repository, **{"name": repo_name, "data_source": ds_type_obj})
+            nrepos += 1
+            data_source_orm = add(RepositoryView, **{"params": repo_params, "repository": repo_obj})
+            project_orm.repository_views.add(data_source_orm)
 
-        # Register all the repo views added
+    if project_orm:
         project_orm.save()
 
     # Register all the projects added
@@ -201,14 +732,230 @@ def load_projects(projects_file, ecosystem):
     return (nprojects, nrepos)
 
 
-def compare_projects_files(orig_file, new_file):
-    with open(orig_file) as orig:
-        orig_json = json.load(orig)
-        with open(new_file) as exported:
-            exported_json = json.load(exported)
-            test = TestCase()
-            test.maxDiff = None
-            test.assertDictEqual(orig_json, exported_json)
+def hash_file(projects_file):
+    """ sha256 of the contents of a file """
+
+    file_hash = hashlib.sha256()
+
+    with open(projects_file, 'rb') as pfile:
+        for block in iter(lambda: pfile.read(1024 * 1024), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def hash_project(project_json):
+    """ sha256 of the contents of a project, independent of its keys order """
+
+    project_str = json.dumps(project_json, sort_keys=True, ensure_ascii=False)
+
+    return hashlib.sha256(project_str.encode('utf-8')).hexdigest()
+
+
+class IncrementalLoader():
+    """ Load in an ecosystem only the changes of a projects file
+
+    The hash of the file and of the contents of each project are
+    stored in each import. If the file is the same as in the last
+    import it is skipped. Otherwise, only the projects whose hash has
+    changed are parsed, and the repository views added and removed
+    in them are found comparing the lines in the file with the views
+    linked to the project. The projects not found in the file anymore
+    are removed from the ecosystem.
+
+    The work done in the database is proportional to the number of
+    changed projects, not to the size of the file.
+
+    Changes done to a project out of the projects file, for example
+    with the editor, are not detected if the project has not changed
+    in the file too.
+    """
+
+    PROJECTS_BATCH_SIZE = BulkLoader.PROJECTS_BATCH_SIZE
+
+    def __init__(self, ecosystem, dry_run=False, projects_batch_size=PROJECTS_BATCH_SIZE):
+        self.ecosystem = ecosystem
+        self.dry_run = dry_run
+        self.projects_batch_size = projects_batch_size
+        self.loader = BulkLoader(ecosystem, preload=False)
+        self.delta = {}
+
+    def __find_current_views(self, projects):
+        """ Find the repository views linked to a list of projects
+
+        :return: dict with a dict of (data_source, repository, params) ->
+                 (through id, repository view id) for each project
+        """
+
+        current = {project: {} for project in projects}
+        through = Project.repository_views.through
+
+        for projects_chunk in chunks(projects, self.loader.batch_size):
+            views = through.objects.filter(project__name__in=projects_chunk)
+            views = views.values_list('project__name', 'id', 'repositoryview_id',
+                                      'repositoryview__repository__data_source__name',
+                                      'repositoryview__repository__name',
+                                      'repositoryview__params')
+            for (project, through_id, view_id, ds, repo, params) in views:
+                current[project][(ds, repo, params)] = (through_id, view_id)
+
+        return current
+
+    def __load_changed(self, eco_orm, changed, digests):
+        """ Load a batch of (project, project JSON, content hash) changed projects """
+
+        projects = [project for (project, _, _) in changed]
+        (rows, errors) = parse_projects([(project, project_json) for (project, project_json, _) in changed])
+
+        for (data_source, repository_view_str) in errors:
+            logging.error('Can not find repository for %s %s', data_source, repository_view_str)
+
+        current = self.__find_current_views(projects)
+        desired = {project: set() for project in projects}
+        meta_titles = {}
+        for (project, meta_title, ds, repo, params) in rows:
+            meta_titles[project] = meta_title
+            if repo is not None:
+                desired[project].add((ds, repo, params))
+
+        unlinked = []
+        for project in projects:
+            self.delta['views_added'] += len(desired[project] - set(current[project]))
+            unlinked += [current[project][key][0] for key in current[project] if key not in desired[project]]
+            if project in digests:
+                self.delta['projects_changed'] += 1
+            else:
+                self.delta['projects_added'] += 1
+        self.delta['views_unlinked'] += len(unlinked)
+
+        if self.dry_run:
+            return
+
+        self.loader.load_batch(eco_orm, rows, meta_titles)
+        for ids_chunk in chunks(unlinked, self.loader.batch_size):
+            Project.repository_views.through.objects.filter(id__in=ids_chunk).delete()
+        if unlinked:
+            unlinked_projects = [project for project in projects
+                                 if any(key not in desired[project] for key in current[project])]
+            project_ids = Project.objects.filter(name__in=unlinked_projects).values_list('id', flat=True)
+            bump_projects_export_version(list(project_ids))
+            invalidate_all()
+            update_counters(Project, project_ids)
+
+        project_ids = dict(Project.objects.filter(name__in=projects).values_list('name', 'id'))
+        new_digests = []
+        for (project, _, content_hash) in changed:
+            if project in digests:
+                ImportedProject.objects.filter(id=digests[project][0]).update(content_hash=content_hash)
+            else:
+                new_digests.append(ImportedProject(ecosystem=eco_orm, project_id=project_ids[project],
+                                                   content_hash=content_hash))
+        ImportedProject.objects.bulk_create(new_digests, batch_size=self.loader.batch_size)
+
+    def __remove_projects(self, eco_orm, removed, digests):
+        self.delta['projects_removed'] = len(removed)
+
+        if self.dry_run:
+            return
+
+        for projects_chunk in chunks(removed, self.loader.batch_size):
+            project_ids = [digests[project][1] for project in projects_chunk]
+            Ecosystem.projects.through.objects.filter(ecosystem=eco_orm, project_id__in=project_ids).delete()
+            ImportedProject.objects.filter(id__in=[digests[project][0] for project in projects_chunk]).delete()
+        if removed:
+            bump_export_version(Ecosystem.objects.filter(id=eco_orm.id))
+            invalidate_all()
+            update_counters(Ecosystem, [eco_orm.id])
+
+    def load(self, projects_file):
+        """ Load the changes of a projects file since the last import
+
+        :param projects_file: path to the JSON projects file
+        :return: dict with the number of projects and repository views changed
+        """
+
+        self.delta = {
+            'skipped': False,
+            'projects_unchanged': 0,
+            'projects_added': 0,
+            'projects_changed': 0,
+            'projects_removed': 0,
+            'views_added': 0,
+            'views_unlinked': 0
+        }
+
+        file_hash = hash_file(projects_file)
+        runs = ImportRun.objects.filter(ecosystem__name=self.ecosystem, incremental=True, finished=True)
+        last_run = runs.order_by('-id').first()
+        if last_run and last_run.file_hash == file_hash:
+            logging.info('%s has not changed since its last import in %s', projects_file, self.ecosystem)
+            self.delta['skipped'] = True
+            return self.delta
+
+        with write_lock(), transaction.atomic():
+            if self.dry_run:
+                eco_orm = Ecosystem.objects.filter(name=self.ecosystem).first()
+            else:
+                eco_orm = add(Ecosystem, **{"name": self.ecosystem})
+
+            # project name -> (ImportedProject id, project id, content hash)
+            digests = {}
+            if eco_orm and eco_orm.id:
+                imported = ImportedProject.objects.filter(ecosystem=eco_orm)
+                imported = imported.values_list('id', 'project_id', 'project__name', 'content_hash')
+                for (digest_id, project_id, project, content_hash) in imported:
+                    digests[project] = (digest_id, project_id, content_hash)
+
+            seen = set()
+            changed = []
+            with open_projects_file(projects_file) as pfile:
+                for (project, project_json) in iter_projects(pfile):
+                    seen.add(project)
+                    content_hash = hash_project(project_json)
+                    if project in digests and digests[project][2] == content_hash:
+                        self.delta['projects_unchanged'] += 1
+                        continue
+                    changed.append((project, project_json, content_hash))
+                    if len(changed) >= self.projects_batch_size:
+                        self.__load_changed(eco_orm, changed, digests)
+                        changed = []
+
+            if changed:
+                self.__load_changed(eco_orm, changed, digests)
+
+            self.__remove_projects(eco_orm, [project for project in digests if project not in seen], digests)
+
+            if not self.dry_run:
+                ImportRun.objects.create(ecosystem=eco_orm, file_hash=file_hash, incremental=True, finished=True)
+
+        return self.delta
+
+
+def load_projects_incremental(projects_file, ecosystem, dry_run=False):
+    """ Load in an ecosystem the changes of a projects file since its last import
+
+    :param projects_file: path to the JSON projects file
+    :param ecosystem: name of the ecosystem in which to load the projects
+    :param dry_run: find the changes without loading them
+    :return: dict with the number of projects and repository views changed
+    """
+
+    with ecosystem_lock(ecosystem):
+        return IncrementalLoader(ecosystem, dry_run=dry_run).load(projects_file)
+
+
+def check_projects(projects_file, ecosystem):
+    """ Compare the projects of a file with the ones loaded in an ecosystem
+
+    :return: a tuple with the list of differences, as generated by
+             `ProjectsDiff.differences`, and the stats of the comparison
+    """
+
+    eco_orm = Ecosystem.objects.get(name=ecosystem)
+    diff = ProjectsDiff(lambda: iter_file_projects(projects_file), lambda: iter_exported_projects(eco_orm))
+    differences = list(diff.differences())
+
+    return (differences, diff.stats)
 
 
 if __name__ == '__main__':
@@ -225,14 +972,36 @@ if __name__ == '__main__':
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("requests").setLevel(logging.WARNING)
 
-    (nprojects, nrepos) = load_projects(args.file, args.ecosystem)
+    if args.validate:
+        errors = validate_projects(args.file)
+        if errors:
+            for error in errors:
+                logging.error(format_error(error))
+            logging.error("%i errors found in %s, it is not loaded", len(errors), args.file)
+            sys.exit(1)
+
+    if args.incremental or args.dry_run:
+        delta = load_projects_incremental(args.file, args.ecosystem, dry_run=args.dry_run)
+
+        logging.debug("Total loading time ... %.2f sec", time() - task_init)
+        if delta['skipped']:
+            print("Projects file not changed since the last import")
+        for field in ['projects_unchanged', 'projects_added', 'projects_changed',
+                      'projects_removed', 'views_added', 'views_unlinked']:
+            print(field.capitalize().replace('_', ' '), delta[field])
+    else:
+        (nprojects, nrepos) = load_projects(args.file, args.ecosystem, bulk=not args.no_bulk,
+                                            resume=args.resume, checkpoint=True)
 
-    logging.debug("Total loading time ... %.2f sec", time() - task_init)
-    print("Projects loaded", nprojects)
-    print("Repositories loaded", nrepos)
+        logging.debug("Total loading time ... %.2f sec", time() - task_init)
+        print("Projects loaded", nprojects)
+        print("Repositories loaded", nrepos)
 
     if args.check:
         logging.info('Checking data ...')
-        with tempfile.NamedTemporaryFile() as temp:
-            export_projects(temp.name, args.ecosystem)
-            compare_projects_files(args.file, temp.name)
+        (differences, stats) = check_projects(args.file, args.ecosystem)
+        if differences:
+            for difference in differences:
+                print(json.dumps(difference, sort_keys=True))
+            logging.error("The projects loaded are not the ones in %s: %s", args.file, json.dumps(stats))
+            sys.exit(1)
@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Feed Bestiary with the projects of several ecosystems at the same time
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import argparse
+import concurrent.futures
+import logging
+import os
+import sys
+
+from time import time
+
+import django
+os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
+django.setup()
+
+from django.db import connections
+
+from projects.bestiary_import import load_projects
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bestiary_import_many.py [options]",
+                                     description="Feed beastiary with the projects of several ecosystems")
+    parser.add_argument('-e', '--ecosystem', nargs=2, action='append', required=True,
+                        metavar=('ECOSYSTEM', 'FILE'),
+                        help='Ecosystem and the JSON projects file to load in it. Could be repeated')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Ecosystems imported at the same time')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help='Continue the last interrupted import of the projects files')
+    parser.add_argument('-g', '--debug', action='store_true')
+
+    return parser.parse_args()
+
+
+def import_ecosystem(ecosystem, projects_file, resume=False):
+    """ Import the projects file of an ecosystem, timing it
+
+    :return: a tuple with the number of projects and repositories loaded
+             and the seconds it took
+    """
+
+    start = time()
+    try:
+        (nprojects, nrepos) = load_projects(projects_file, ecosystem, resume=resume, checkpoint=True)
+    finally:
+        # Each process has its own connection, close it before the process is reused
+        connections.close_all()
+    seconds = time() - start
+
+    return (nprojects, nrepos, seconds)
+
+
+def import_ecosystems(ecosystems, jobs=1, resume=False, executor_class=concurrent.futures.ProcessPoolExecutor):
+    """ Import several ecosystems in parallel
+
+    Each ecosystem is loaded in a different process. The loads only
+    wait for others loading the same ecosystem, and the rows shared
+    between ecosystems (data sources, repositories ...) are added
+    ignoring the ones already added by other processes.
+
+    :param ecosystems: list of (ecosystem, projects file)
+    :param jobs: number of ecosystems loaded at the same time
+    :param resume: continue the last interrupted import of the files
+    :param executor_class: class of the pool of workers
+    :return: dict with the (projects, repositories, seconds) of each
+             ecosystem loaded, and dict with the errors of the others
+    """
+
+    stats = {}
+    errors = {}
+
+    if issubclass(executor_class, concurrent.futures.ProcessPoolExecutor):
+        # The connection must not be shared with the forked processes
+        connections.close_all()
+
+    with executor_class(max_workers=jobs) as executor:
+        futures = {executor.submit(import_ecosystem, ecosystem, projects_file, resume): ecosystem
+                   for (ecosystem, projects_file) in ecosystems}
+        for future in concurrent.futures.as_completed(futures):
+            ecosystem = futures[future]
+            try:
+                stats[ecosystem] = future.result()
+                logging.info('%s loaded in %.2f sec', ecosystem, stats[ecosystem][2])
+            except Exception as ex:
+                logging.error("Can't load %s: %s", ecosystem, ex)
+                errors[ecosystem] = ex
+
+    return (stats, errors)
+
+
+def format_report(stats, total_seconds):
+    """ Throughput of the import of each ecosystem """
+
+    row = "%-30s %10i %12i %10.2f %14.1f"
+    lines = ["%-30s %10s %12s %10s %14s" % ('Ecosystem', 'Projects', 'Repositories', 'Seconds', 'Repositories/s')]
+
+    for ecosystem in sorted(stats):
+        (nprojects, nrepos, seconds) = stats[ecosystem]
+        rate = nrepos / seconds if seconds else 0
+        lines.append(row % (ecosystem, nprojects, nrepos, seconds, rate))
+
+    nprojects = sum(eco_stats[0] for eco_stats in stats.values())
+    nrepos = sum(eco_stats[1] for eco_stats in stats.values())
+    rate = nrepos / total_seconds if total_seconds else 0
+    lines.append(row % ('Total', nprojects, nrepos, total_seconds, rate))
+
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+
+    task_init = time()
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    names = [ecosystem for (ecosystem, _) in args.ecosystem]
+    if len(set(names)) != len(names):
+        logging.error("Each ecosystem could be loaded only once")
+        sys.exit(1)
+
+    (stats, errors) = import_ecosystems(args.ecosystem, args.jobs, args.resume)
+
+    print(format_report(stats, time() - task_init))
+
+    if errors:
+        sys.exit(1)
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Run the imports of projects files queued from the web
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import argparse
+import logging
+import multiprocessing
+import os
+
+from time import sleep
+
+import django
+os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
+django.setup()
+
+from django.db import connections
+
+from projects.import_jobs import retry_job, run_next_job
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bestiary_import_worker.py [options]",
+                                     description="Run the imports of projects files queued in beastiary")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Imports run at the same time')
+    parser.add_argument('-s', '--sleep', type=float, default=2,
+                        help='Seconds to wait before looking again for queued imports')
+    parser.add_argument('--once', action='store_true',
+                        help='Exit when there are no more imports queued')
+    parser.add_argument('-r', '--retry', type=int, action='append', default=[], metavar='JOB_ID',
+                        help='Queue again a failed import before running the queued ones')
+    parser.add_argument('-g', '--debug', action='store_true')
+
+    return parser.parse_args()
+
+
+def work(sleep_seconds, once=False):
+    """ Run the queued jobs, waiting for new ones when the queue is empty """
+
+    while True:
+        job = run_next_job()
+        if job:
+            logging.info('Job %i %s: %i projects, %i lines', job.id, job.status, job.nprojects, job.nlines)
+            continue
+        if once:
+            return
+        sleep(sleep_seconds)
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    for job_id in args.retry:
+        if not retry_job(job_id):
+            logging.error("Can't retry job %i, it did not fail", job_id)
+
+    if args.jobs <= 1:
+        work(args.sleep, args.once)
+    else:
+        # The connection must not be shared with the forked processes
+        connections.close_all()
+        workers = [multiprocessing.Process(target=work, args=(args.sleep, args.once)) for _ in range(args.jobs)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
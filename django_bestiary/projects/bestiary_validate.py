@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Validate projects files before importing them in Bestiary
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import argparse
+import logging
+import sys
+
+from time import time
+
+from projects.datasource_codecs import validate_lines
+from projects.projects_stream import NOT_DS_FIELDS, iter_projects, open_projects_file
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: bestiary_validate.py [options] file [file ...]",
+                                     description="Validate projects files without loading them")
+    parser.add_argument("files", nargs='+', help="JSON projects files, could be compressed with gzip, bzip2 or xz")
+    parser.add_argument('-g', '--debug', action='store_true')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only show the number of errors')
+
+    return parser.parse_args()
+
+
+def validate_meta(meta):
+    """ Given the meta of a project return why it is not valid, or None """
+
+    if isinstance(meta, str):
+        # In Mozilla the meta is the title directly
+        return None
+    if not isinstance(meta, dict) or not isinstance(meta.get('title'), str):
+        return "meta is not a title or an object with a title"
+
+    return None
+
+
+class ProjectsValidator():
+    """ Check a projects file against the grammar of each data source
+
+    The file is read incrementally and no Django model is used, so it
+    can be run before importing a file. All the errors are reported,
+    not only the first one.
+    """
+
+    def __init__(self):
+        self.nprojects = 0
+        self.nlines = 0
+
+    def errors(self, pfile):
+        """ Generator of the errors found in a projects file
+
+        Each error is a (project, data_source, position, line, message)
+        tuple, with position being the index of the line in the data
+        source. The fields that do not apply are None.
+        """
+
+        projects = iter_projects(pfile)
+
+        while True:
+            try:
+                (project, project_json) = next(projects)
+            except StopIteration:
+                return
+            except ValueError as ex:
+                yield (None, None, None, None, "projects file is not valid JSON: %s" % ex)
+                return
+
+            self.nprojects += 1
+
+            if not isinstance(project_json, dict):
+                yield (project, None, None, None, "project is not a JSON object")
+                continue
+
+            for data_source in project_json:
+                if data_source in NOT_DS_FIELDS:
+                    error = validate_meta(project_json[data_source])
+                    if error:
+                        yield (project, data_source, None, project_json[data_source], error)
+                    continue
+
+                lines = project_json[data_source]
+                if not isinstance(lines, list):
+                    yield (project, data_source, None, lines, "data source is not a list of repository lines")
+                    continue
+
+                self.nlines += len(lines)
+                for (position, line, error) in validate_lines(data_source, lines):
+                    yield (project, data_source, position, line, error)
+
+
+def format_error(error):
+    (project, data_source, position, line, message) = error
+
+    location = []
+    if project is not None:
+        location.append(project)
+    if data_source is not None:
+        location.append(data_source if position is None else "%s[%i]" % (data_source, position))
+
+    return "%s: %s: %r" % ("/".join(location), message, line) if location else message
+
+
+def validate_projects(projects_file):
+    """ Validate a projects file
+
+    :param projects_file: path to the JSON projects file
+    :return: a list with the errors found, as generated by `ProjectsValidator.errors`
+    """
+
+    with open_projects_file(projects_file) as pfile:
+        return list(ProjectsValidator().errors(pfile))
+
+
+if __name__ == '__main__':
+
+    task_init = time()
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    nerrors = 0
+
+    for projects_file in args.files:
+        validator = ProjectsValidator()
+        nfile_errors = 0
+
+        with open_projects_file(projects_file) as pfile:
+            for error in validator.errors(pfile):
+                nfile_errors += 1
+                if not args.quiet:
+                    print("%s: %s" % (projects_file, format_error(error)))
+
+        print("%s: %i projects, %i repository lines, %i errors" % (projects_file, validator.nprojects,
+                                                                   validator.nlines, nfile_errors))
+        nerrors += nfile_errors
+
+    logging.debug("Total validation time ... %.2f sec", time() - task_init)
+
+    sys.exit(1 if nerrors else 0)
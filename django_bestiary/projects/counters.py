@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Counters of the projects, repository views and repositories of the beasts
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from projects.models import DataSource, Ecosystem, Project, Repository
+
+# The counter field of each model, and the model and lookup of the rows counted
+COUNTERS = {
+    Ecosystem: ('nprojects', Ecosystem.projects.through, 'ecosystem'),
+    Project: ('nrepository_views', Project.repository_views.through, 'project'),
+    DataSource: ('nrepositories', Repository, 'data_source')
+}
+
+# Keep it under the 999 variables limit of SQLite in the lookups
+BATCH_SIZE = 500
+
+
+# The counters are columns of the beasts, so the lists of them can show
+# and sort by the counts without counting the related rows of each one.
+# They are recomputed for the objects whose related rows changed, in the
+# same transaction: the signals do it for the changes done with the ORM,
+# and the bulk imports, which skip the signals, call update_counters.
+
+
+def counted_rows(model):
+    """ Expression with the number of rows counted for each object of a model
+
+    It could be used to annotate a queryset of the model with the value
+    its counter should have.
+    """
+
+    (_, related, lookup) = COUNTERS[model]
+    rows = related.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+    rows = rows.annotate(total=Count('*')).values('total')
+
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def update_counters(model, ids):
+    """ Recompute the counter of some objects of a model
+
+    The objects are locked before they are counted, in the order of their
+    ids. With READ COMMITTED, an UPDATE that waits for the row of other
+    transaction still counts with the rows it saw when it started, missing
+    the ones added by the other. Once the lock is taken the count sees
+    them, and the other transactions wait until this one is committed.
+
+    :param model: Ecosystem, Project or DataSource
+    :param ids: ids of the objects whose related rows changed
+    """
+
+    field = COUNTERS[model][0]
+    ids = sorted(set(ids))
+
+    with transaction.atomic():
+        for i in range(0, len(ids), BATCH_SIZE):
+            objects = model.objects.filter(id__in=ids[i:i + BATCH_SIZE])
+            list(objects.select_for_update().order_by('id').values_list('id', flat=True))
+            objects.update(**{field: counted_rows(model)})
+
+
+def repair_counters(model):
+    """ Recompute in bulk the counters of a model that are wrong
+
+    :return: the number of objects whose counter was wrong
+    """
+
+    field = COUNTERS[model][0]
+    wrong = model.objects.annotate(expected=counted_rows(model)).exclude(**{field: F('expected')})
+    wrong = list(wrong.values_list('id', flat=True))
+    update_counters(model, wrong)
+
+    return len(wrong)
@@ -1,28 +1,45 @@
-from projects.models import DataSource, Ecosystem, Project, Repository, RepositoryView
+from projects import hierarchy, identity_map
+from projects.data_cache import cached_fetch, project_namespace
+from projects.models import DataSource, Ecosystem, Project, RepositoryView
 from grimoire_elk import utils as gelk_utils
 
 
-class DataSourcesData():
+# Each fetch is done with one query, filtering, joining and removing the
+# duplicates in the database, so the number of queries does not depend on
+# the number of projects or repository views. The lists fetched are kept
+# in the cache until the objects they depend on change (see data_cache),
+# and within a request the same fetch returns the same objects. With
+# descendants, the subprojects of the projects, and the projects of the
+# sub-ecosystems of the ecosystem, are included too (see hierarchy).
 
-    def __init__(self, state):
-        self.state = state
 
-    def __fetch_from_repository_views(self, views):
-        already_fetched = []
+def state_projects(state, descendants=False):
+    """ Projects selected in the state, and all their subprojects with descendants """
 
-        for view in views:
-            data_source_name = view.repository.data_source.name
-            if data_source_name not in already_fetched:
-                already_fetched.append(data_source_name)
-                data_source = DataSource.objects.get(name=data_source_name)
-                yield data_source
+    projects = Project.objects.filter(name__in=state.projects)
+    return hierarchy.with_descendants(projects) if descendants else projects
 
-    def __fetch_from_projects(self, projects):
 
-        for project in projects:
-            views = project.repository_views.all()
-            for data_source in self.__fetch_from_repository_views(views):
-                yield data_source
+def state_ecosystem_projects(state, descendants=False):
+    """ Projects of the ecosystem in the state, and all the ones below it with descendants """
+
+    if descendants:
+        return hierarchy.ecosystem_projects(Ecosystem.objects.filter(name=state.eco_name))
+    return Project.objects.filter(ecosystem__name=state.eco_name)
+
+
+def fetch_objects(fetcher, key, namespaces, objects):
+    """ Objects of a fetch, from the request identity map or the cache """
+
+    return identity_map.get_list((fetcher, repr(key)),
+                                 lambda: cached_fetch(fetcher, key, namespaces, objects))
+
+
+class DataSourcesData():
+
+    def __init__(self, state, descendants=False):
+        self.state = state
+        self.descendants = descendants
 
     def fetch(self):
 
@@ -31,23 +48,26 @@ class DataSourcesData():
             for data_source_name in supported_data_sources:
                 data_source = DataSource(name=data_source_name)
                 yield data_source
-        elif self.state.data_sources:
+            return
+
+        if self.state.data_sources:
+            key = ('data_sources', self.state.data_sources)
             data_sources = DataSource.objects.filter(name__in=self.state.data_sources)
-            for data_source in data_sources:
-                yield data_source
         elif self.state.repository_views:
-            views = RepositoryView.objects.filter(id__in=self.state.repository_views)
-            for data_source in self.__fetch_from_repository_views(views):
-                yield data_source
+            key = ('repository_views', self.state.repository_views)
+            data_sources = DataSource.objects.filter(repository__repositoryview__id__in=self.state.repository_views)
         elif self.state.projects:
-            projects = Project.objects.filter(name__in=self.state.projects)
-            for data_source in self.__fetch_from_projects(projects):
-                yield data_source
+            key = ('projects', self.state.projects, self.descendants)
+            data_sources = DataSource.objects.filter(
+                repository__repositoryview__project__in=state_projects(self.state, self.descendants))
         elif self.state.eco_name:
-            ecosystem = Ecosystem.objects.get(name=self.state.eco_name)
-            projects = ecosystem.projects.all()
-            for data_source in self.__fetch_from_projects(projects):
-                yield data_source
+            key = ('eco_name', self.state.eco_name, self.descendants)
+            data_sources = DataSource.objects.filter(
+                repository__repositoryview__project__in=state_ecosystem_projects(self.state, self.descendants))
+        else:
+            return
+
+        yield from fetch_objects('data_sources', key, ['data_sources'], data_sources.distinct().order_by('name'))
 
 
 class EcosystemsData():
@@ -56,69 +76,70 @@ class EcosystemsData():
         self.state = state
 
     def fetch(self):
-        for ecosystem in Ecosystem.objects.all():
-            yield ecosystem
+        yield from fetch_objects('ecosystems', (), ['ecosystems'], Ecosystem.objects.order_by('name'))
 
 
 class ProjectsData():
 
-    def __init__(self, state):
+    def __init__(self, state, descendants=False):
         self.state = state
+        self.descendants = descendants
 
     def fetch(self):
         if not self.state or self.state.is_empty():
-            for project in Project.objects.all():
-                yield project
+            key = ()
+            projects = Project.objects.all()
         elif self.state.projects:
-            projects = Project.objects.filter(name__in=self.state.projects)
-            for project in projects:
-                yield project
+            key = ('projects', self.state.projects, self.descendants)
+            projects = state_projects(self.state, self.descendants)
         elif self.state.repository_views:
-            repository_views_idata_source = RepositoryView.objects.filter(id__in=self.state.repository_views).values_list("id")
-            projects = Project.objects.filter(repository_views__in=list(repository_views_idata_source))
-            for project in projects:
-                yield project
+            key = ('repository_views', self.state.repository_views)
+            projects = Project.objects.filter(repository_views__in=self.state.repository_views)
         elif self.state.data_sources:
-            data_source_idata_source = DataSource.objects.filter(name__in=self.state.data_sources).values_list("id")
-            repos_idata_source = Repository.objects.filter(data_source__in=list(data_source_idata_source)).values_list("id")
-            repository_views_idata_source = RepositoryView.objects.filter(repository__in=list(repos_idata_source)).values_list("id")
-            projects = Project.objects.filter(repository_views__in=list(repository_views_idata_source))
-            for project in projects:
-                yield project
+            key = ('data_sources', self.state.data_sources)
+            projects = Project.objects.filter(repository_views__repository__data_source__name__in=self.state.data_sources)
         elif self.state.eco_name:
-            ecosystem = Ecosystem.objects.get(name=self.state.eco_name)
-            projects = ecosystem.projects.all()
-            for project in projects:
-                yield project
+            key = ('eco_name', self.state.eco_name, self.descendants)
+            projects = state_ecosystem_projects(self.state, self.descendants)
+        else:
+            return
+
+        yield from fetch_objects('projects', key, ['projects'], projects.distinct().order_by('name'))
 
 
 class RepositoryViewsData():
 
-    def __init__(self, state=None):
+    def __init__(self, state=None, descendants=False):
         self.state = state
+        self.descendants = descendants
 
     def fetch(self):
+        # The views of some projects are invalidated only when those projects change,
+        # but their subprojects are not known until they are fetched
+        namespaces = ['views']
+
         if not self.state or self.state.is_empty():
-            for view in RepositoryView.objects.all():
-                yield view
+            key = ()
+            views = RepositoryView.objects.all()
         elif self.state.repository_views:
-            repository_views = RepositoryView.objects.filter(id__in=self.state.repository_views)
-            for view in repository_views:
-                yield view
+            key = ('repository_views', self.state.repository_views)
+            views = RepositoryView.objects.filter(id__in=self.state.repository_views)
         elif self.state.projects:
-            projects = Project.objects.filter(name__in=self.state.projects)
-            for project in projects:
-                for view in project.repository_views.all():
-                    if self.state.data_sources:
-                        if view.repository.data_source.name not in self.state.data_sources:
-                            continue
-                    yield view
+            key = ('projects', self.state.projects, self.state.data_sources, self.descendants)
+            if not self.descendants:
+                namespaces = [project_namespace(project) for project in self.state.projects]
+            views = RepositoryView.objects.filter(project__in=state_projects(self.state, self.descendants))
+            if self.state.data_sources:
+                views = views.filter(repository__data_source__name__in=self.state.data_sources)
         elif self.state.data_sources:
-            for view in RepositoryView.objects.all():
-                if view.repository.data_source.name in self.state.data_sources:
-                    yield view
+            key = ('data_sources', self.state.data_sources)
+            views = RepositoryView.objects.filter(repository__data_source__name__in=self.state.data_sources)
         elif self.state.eco_name:
-            ecosystem = Ecosystem.objects.get(name=self.state.eco_name)
-            for project in ecosystem.projects.all():
-                for view in project.repository_views.all():
-                    yield view
+            key = ('eco_name', self.state.eco_name, self.descendants)
+            views = RepositoryView.objects.filter(project__in=state_ecosystem_projects(self.state, self.descendants))
+        else:
+            return
+
+        # The views are shown with the name of their repository and data source
+        views = views.select_related('repository__data_source').distinct().order_by('id')
+        yield from fetch_objects('repository_views', key, namespaces, views)
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Cache of the objects fetched by the editor
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import collections
+import hashlib
+import logging
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Name of the cache, in CACHES, used by default
+DATA_CACHE = 'data'
+# Seconds a fetched list is kept in the cache
+DATA_CACHE_TIMEOUT = 300
+# Namespace all the cached lists depend on
+ALL = 'all'
+
+# Hits and misses of each fetcher in this process
+_stats = collections.Counter()
+
+
+def data_cache():
+    """ Django cache of the fetched lists, the one named in BESTIARY_DATA_CACHE
+
+    The cache is invalidated from the process that changes the objects,
+    so it must be shared by all the processes (web workers, import
+    workers ...), like the file based cache of the settings. A cache
+    local to each process would keep serving the lists changed by others.
+    """
+
+    return caches[getattr(settings, 'BESTIARY_DATA_CACHE', DATA_CACHE)]
+
+
+def namespace_key(namespace):
+    return 'bestiary:data:ns:' + hashlib.sha1(namespace.encode('utf-8')).hexdigest()
+
+
+def project_namespace(project_name):
+    """ Namespace of the repository views of a project """
+
+    return 'project:' + project_name
+
+
+def namespace_versions(namespaces):
+    """ Current version of some namespaces, starting the ones not in the cache
+
+    A new version is random, so the lists cached with the version of a
+    namespace evicted from the cache are never used again.
+    """
+
+    cache = data_cache()
+    keys = [namespace_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            # Other process could be starting it too
+            cache.add(key, random.getrandbits(62), None)
+            versions[key] = cache.get(key)
+
+    return [versions[key] for key in keys]
+
+
+def invalidate(*namespaces):
+    """ Drop the cached lists that depend on some namespaces
+
+    Their version is increased, so the keys of those lists change.
+    """
+
+    cache = data_cache()
+    for namespace in namespaces:
+        try:
+            cache.incr(namespace_key(namespace))
+        except ValueError:
+            # Not in the cache, a new version will be started
+            pass
+
+
+def invalidate_all():
+    """ Drop all the cached lists, used when the objects are changed without signals """
+
+    invalidate(ALL)
+
+
+def cached_fetch(fetcher, state, namespaces, fetch):
+    """ List of objects fetched, read from the cache if they did not change
+
+    :param fetcher: name of the fetcher, for the key and the stats
+    :param state: values of the state the list depends on, with a repr
+    :param namespaces: namespaces whose changes invalidate the list
+    :param fetch: iterable with the objects, like a queryset, only read
+                  if the list is not in the cache
+    """
+
+    cache = data_cache()
+    versions = namespace_versions([ALL] + sorted(namespaces))
+    key = 'bestiary:data:%s:%s:%s' % (fetcher, hashlib.sha1(repr(state).encode('utf-8')).hexdigest(),
+                                      '.'.join(str(version) for version in versions))
+
+    objects = cache.get(key)
+    if objects is not None:
+        _stats[fetcher, 'hits'] += 1
+        return objects
+
+    _stats[fetcher, 'misses'] += 1
+    objects = list(fetch)
+    cache.set(key, objects, getattr(settings, 'BESTIARY_DATA_CACHE_TIMEOUT', DATA_CACHE_TIMEOUT))
+
+    return objects
+
+
+def stats():
+    """ Hits and misses of the cache for each fetcher in this process """
+
+    fetchers = {}
+    for ((fetcher, counter), value) in _stats.items():
+        fetchers.setdefault(fetcher, {'hits': 0, 'misses': 0})[counter] = value
+
+    return fetchers
+
+
+def reset_stats():
+    _stats.clear()
+
+
+def warm_up():
+    """ Fill the cache with the lists read by the editor when nothing is selected
+
+    It is run when the web application is loaded if BESTIARY_DATA_CACHE_WARM_UP
+    is set, so with gunicorn preload_app the workers start with the cache full.
+    """
+
+    from projects import data
+    from projects.models import Ecosystem, Project
+    from projects.views import EditorState
+
+    for fetcher in (data.EcosystemsData, data.ProjectsData, data.RepositoryViewsData):
+        for _ in fetcher(EditorState()).fetch():
+            pass
+
+    for eco_name in Ecosystem.objects.values_list('name', flat=True):
+        for fetcher in (data.ProjectsData, data.DataSourcesData):
+            for _ in fetcher(EditorState(eco_name=eco_name)).fetch():
+                pass
+
+    nprojects = 0
+    for name in Project.objects.values_list('name', flat=True):
+        for _ in data.RepositoryViewsData(EditorState(projects=[name])).fetch():
+            pass
+        nprojects += 1
+
+    logging.info("Data cache warmed up with the views of %i projects", nprojects)
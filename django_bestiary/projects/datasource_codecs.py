@@ -0,0 +1,293 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Translation between repository lines and repository views
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import re
+import shlex
+
+from abc import ABC, abstractmethod
+
+from urllib.parse import parse_qsl
+
+
+class DataSourceCodec(ABC):
+    """ Translate the repository lines of a data source
+
+    In a projects file, each repository view of a data source is a line
+    which includes both the repository and the params used to collect
+    it, with a grammar that depends on the data source. A codec parses
+    those lines into (repository, params) and formats them back.
+
+    The pattern matches the lines that can be parsed and formatted back
+    as they are. It is compiled once, when the codec is created.
+
+    The params are also parsed into (key, value) pairs, so the views could
+    be looked up by them. By default they are options of a command line:
+    "--key=value", "--key value1 value2", "--flag" or just "value", with
+    the values quoted as in a shell when they have spaces.
+
+    Each data source has a subclass implementing `parse` and `format`.
+    """
+
+    PATTERN = r'.*'
+
+    def __init__(self, pattern=None):
+        self.pattern = re.compile(pattern or self.PATTERN, re.DOTALL)
+
+    def validate(self, line):
+        """ Given a repository line return why it is not valid, or None """
+
+        if not isinstance(line, str):
+            return "repository line is not a string"
+        if not self.pattern.fullmatch(line):
+            return "repository line does not match %s" % self.pattern.pattern
+
+        return None
+
+    def validate_many(self, lines):
+        """ Generator of the (position, line, error) of the lines not valid """
+
+        fullmatch = self.pattern.fullmatch
+
+        for (position, line) in enumerate(lines):
+            if isinstance(line, str) and fullmatch(line):
+                continue
+            yield (position, line, self.validate(line))
+
+    @abstractmethod
+    def parse(self, line):
+        """ Given a repository line return its (repository, params) """
+
+    @abstractmethod
+    def format(self, repo, params):
+        """ Given a repository and its params return the repository line """
+
+    def parse_params(self, params):
+        """ Given the params of a repository view return its (key, value) pairs """
+
+        pairs = []
+        option = ''
+        pending = False
+
+        try:
+            tokens = shlex.split(params)
+        except ValueError:
+            # Unbalanced quotes
+            tokens = params.split()
+
+        for token in tokens:
+            if token.startswith('--'):
+                if pending:
+                    pairs.append((option, ''))
+                (option, separator, value) = token[2:].partition('=')
+                pending = not separator
+                if separator:
+                    pairs.append((option, value))
+                    option = ''
+            else:
+                pairs.append((option, token))
+                pending = False
+
+        if pending:
+            pairs.append((option, ''))
+
+        return pairs
+
+    def parse_many(self, lines):
+        parse = self.parse
+        return [parse(line) for line in lines]
+
+    def format_many(self, views):
+        format_ = self.format
+        return [format_(repo, params) for (repo, params) in views]
+
+
+class RepositoryCodec(DataSourceCodec):
+    """ The line is the repository. These data sources does not support filtering """
+
+    PATTERN = r'\S+'
+
+    def parse(self, line):
+        return (line, '')
+
+    def format(self, repo, params):
+        return repo
+
+    def parse_many(self, lines):
+        return [(line, '') for line in lines]
+
+
+class SeparatorCodec(DataSourceCodec):
+    """ The params follow the repository after a separator
+
+    With a params key, the params are a single value of that key.
+    """
+
+    def __init__(self, separator, params_key=None):
+        self.separator = separator
+        self.params_key = params_key
+        super(SeparatorCodec, self).__init__(r'[^%(sep)s\s]+(%(sep)s.+)?' % {'sep': re.escape(separator)})
+
+    def parse(self, line):
+        tokens = line.split(self.separator, 1)
+        return (tokens[0], tokens[1] if len(tokens) > 1 else '')
+
+    def format(self, repo, params):
+        return repo + self.separator + params if params else repo
+
+    def parse_params(self, params):
+        if self.params_key:
+            return [(self.params_key, params)] if params else []
+        return super(SeparatorCodec, self).parse_params(params)
+
+
+class MboxCodec(DataSourceCodec):
+    """ The repository is the mailing list name and its path, the params follow them """
+
+    PATTERN = r'\S+ \S+( .+)?'
+
+    def parse(self, line):
+        tokens = line.split(" ", 2)
+        return (tokens[0] + " " + tokens[1], tokens[2] if len(tokens) > 2 else '')
+
+    def format(self, repo, params):
+        return repo + " " + params if params else repo
+
+
+class BugzillaCodec(DataSourceCodec):
+    """ The params are the query string of a buglist.cgi URL """
+
+    BUGLIST = '/bugs/buglist.cgi'
+    PATTERN = r'[^?\s]+(/bugs/buglist\.cgi\?.+)?'
+
+    def parse(self, line):
+        tokens = line.split("?", 1)
+        return (tokens[0].replace(self.BUGLIST, ''), tokens[1] if len(tokens) > 1 else '')
+
+    def format(self, repo, params):
+        return repo + self.BUGLIST + '?' + params if params else repo
+
+    def parse_params(self, params):
+        return parse_qsl(params, keep_blank_values=True)
+
+
+class StackExchangeCodec(DataSourceCodec):
+    """ The repository is the site and the params the tag of the questions """
+
+    PATTERN = r'\S+?questions/tagged/\S+'
+
+    def parse(self, line):
+        return (line.split("questions")[0], line.split("tagged/")[1])
+
+    def format(self, repo, params):
+        return repo + "questions" + ("/tagged/" + params if params else '')
+
+    def parse_params(self, params):
+        return [('tag', params)] if params else []
+
+
+class ParamsCodec(DataSourceCodec):
+    """ The repository is always the same, so the line only has the params """
+
+    def parse(self, line):
+        return ('', line)
+
+    def format(self, repo, params):
+        return params
+
+    def parse_many(self, lines):
+        return [('', line) for line in lines]
+
+
+class EmptyCodec(DataSourceCodec):
+    """ Neither the repository nor the params are needed """
+
+    def parse(self, line):
+        return ('', '')
+
+    def format(self, repo, params):
+        return ''
+
+
+# data source -> codec
+CODECS = {}
+
+
+def register_codec(codec, data_sources):
+    for data_source in data_sources:
+        CODECS[data_source] = codec
+
+
+register_codec(RepositoryCodec(), ['askbot', 'functest', 'hyperkitty', 'jenkins', 'mediawiki',
+                                   'mozillaclub', 'phabricator', 'pipermail', 'redmine', 'remo', 'rss'])
+register_codec(BugzillaCodec(), ['bugzilla', 'bugzillarest'])
+register_codec(SeparatorCodec(" "), ['confluence', 'discourse', 'git', 'github', 'jira', 'supybot', 'nntp'])
+register_codec(EmptyCodec(), ['crates', 'puppetforge'])
+register_codec(ParamsCodec(), ['dockerhub', 'google_hits', 'meetup', 'slack', 'telegram', 'twitter'])
+register_codec(SeparatorCodec("_", params_key='branch'), ['gerrit'])
+register_codec(MboxCodec(), ['mbox'])
+register_codec(StackExchangeCodec(), ['stackexchange'])
+
+# Used to export the views of data sources without a codec
+DEFAULT_CODEC = SeparatorCodec(" ")
+
+
+def get_codec(data_source):
+    """ Codec for a data source, None if the data source is not supported """
+
+    return CODECS.get(data_source)
+
+
+def validate_lines(data_source, lines):
+    """ Generator of the (position, line, error) of the lines of a data source not valid """
+
+    codec = CODECS.get(data_source)
+    if not codec:
+        for (position, line) in enumerate(lines):
+            yield (position, line, "data source %s is not supported" % data_source)
+        return
+
+    yield from codec.validate_many(lines)
+
+
+def parse_lines(data_source, lines):
+    """ Parse the repository lines of a data source into (repository, params)
+
+    Lines from data sources without a codec are parsed as (None, '')
+    """
+
+    codec = CODECS.get(data_source)
+    if not codec:
+        return [(None, '') for _ in lines]
+
+    return codec.parse_many(lines)
+
+
+def parse_params(data_source, params):
+    """ Parse the params of a repository view of a data source into (key, value) pairs """
+
+    return CODECS.get(data_source, DEFAULT_CODEC).parse_params(params)
+
+
+def format_lines(data_source, views):
+    """ Format the (repository, params) of a data source into repository lines """
+
+    return CODECS.get(data_source, DEFAULT_CODEC).format_many(views)
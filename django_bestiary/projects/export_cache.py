@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Cache of the projects files exported from Bestiary
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+from django.conf import settings
+from django.core.cache import cache
+
+from projects.bestiary_export import iter_export
+from projects.single_flight import iter_single_flight
+
+# Seconds an exported projects file is kept in the cache
+EXPORT_CACHE_TIMEOUT = 3600
+
+
+def export_cache_timeout():
+    return getattr(settings, 'BESTIARY_EXPORT_CACHE_TIMEOUT', EXPORT_CACHE_TIMEOUT)
+
+
+def export_cache_key(eco_orm, export_format='json'):
+    key = 'bestiary:export:%i:%i' % (eco_orm.id, eco_orm.export_version)
+    return key if export_format == 'json' else key + ':' + export_format
+
+
+def export_etag(eco_orm):
+    """ ETag of the projects file of an ecosystem in its current version """
+
+    return '%i-%i' % (eco_orm.id, eco_orm.export_version)
+
+
+def export_flight_key(eco_orm):
+    """ Key of the current version of an ecosystem for `iter_single_flight`
+
+    The results of single flight are files shared by all the databases
+    in the host, where the ids and versions could be the same, so the
+    time of the last change is part of the key too.
+    """
+
+    return '%i:%i:%f' % (eco_orm.id, eco_orm.export_version, eco_orm.updated_at.timestamp())
+
+
+def iter_cached_export(eco_orm, export_format='json'):
+    """ Generator of the projects file of an ecosystem in bytes, using the cache
+
+    If the projects file of the current version of the ecosystem is not
+    in the cache, it is generated with `iter_export` and added to the
+    cache once it is complete. Only the projects changed since their
+    last export are formatted again.
+
+    The requests of the same projects file that arrive while it is
+    generated, from this or other web workers, wait for it and reuse it
+    (see `iter_single_flight`), so it is generated only once.
+    """
+
+    key = export_cache_key(eco_orm, export_format)
+    chunks = cache.get(key)
+
+    if chunks is not None:
+        yield from chunks
+        return
+
+    def generate():
+        # The projects not changed are taken from the cache too
+        for chunk in iter_export(eco_orm, export_format, cache=cache):
+            yield chunk.encode('utf-8')
+
+    flight_key = 'bestiary:export:%s:%s' % (export_flight_key(eco_orm), export_format)
+    chunks = []
+    for chunk in iter_single_flight(flight_key, generate, export_cache_timeout()):
+        chunks.append(chunk)
+        yield chunk
+
+    cache.set(key, chunks, export_cache_timeout())
@@ -8,6 +8,7 @@ from django import forms
 from projects.models import Project, RepositoryView
 
 from . import data
+from . import identity_map
 
 SELECT_LINES = 20
 MAX_ITEMS = 1000  # Implement pagination if there are more items
@@ -177,14 +178,14 @@ class RepositoryViewForm(BestiaryEditorForm):
             self.repository_view_id = self.state.repository_views[0]
 
         if self.state and self.state.projects:
-            project_orm = Project.objects.get(name=self.state.projects[0])
+            project_orm = identity_map.get(Project, name=self.state.projects[0])
             kwargs['initial'].update({
                 'project': project_orm.name
             })
 
         if self.repository_view_id:
             try:
-                repository_view_orm = RepositoryView.objects.get(id=self.repository_view_id)
+                repository_view_orm = identity_map.get(RepositoryView, id=self.repository_view_id)
                 kwargs['initial'].update({
                     'repository_view_id': self.repository_view_id,
                     'repository': repository_view_orm.repository.name,
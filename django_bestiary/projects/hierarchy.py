@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Transitive hierarchies of the subprojects and sub-ecosystems
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from projects.models import Ecosystem, EcosystemClosure, Project, ProjectClosure
+
+# The links between the objects of each hierarchy and their closure table
+HIERARCHIES = {
+    Project: ('subprojects', ProjectClosure),
+    Ecosystem: ('subecos', EcosystemClosure)
+}
+
+# Ids in each lookup or delete, under the 999 variables limit of SQLite
+BATCH_SIZE = 500
+
+
+# The closure table of a hierarchy has a row (ancestor, descendant) for
+# each object and each one of the objects below it, at any depth. So the
+# objects under some others are found with one indexed query, instead of
+# one query per level. The rows are added and removed when the links
+# change (see signals), and the links that would create a cycle are
+# rejected.
+
+
+def closure_model(model):
+    return HIERARCHIES[model][1]
+
+
+def links_fields(model):
+    """ Model of the links of a hierarchy and the names of its parent and child fields """
+
+    field = model._meta.get_field(HIERARCHIES[model][0])
+    return (field.remote_field.through, field.m2m_column_name(), field.m2m_reverse_name())
+
+
+def check_links(model, parent_ids, child_ids):
+    """ Check that linking some children to some parents does not create a cycle
+
+    :raises ValidationError: if a child is one of the parents or above them
+    """
+
+    closure = closure_model(model)
+
+    if set(parent_ids) & set(child_ids) or \
+            closure.objects.filter(ancestor__in=child_ids, descendant__in=parent_ids).exists():
+        raise ValidationError("The hierarchy of %s can not have cycles" % model._meta.verbose_name_plural)
+
+
+def add_links(model, parent_ids, child_ids):
+    """ Add to the closure table the rows of some children linked to some parents
+
+    Each parent and the objects above it become ancestors of each child
+    and the objects below it.
+    """
+
+    closure = closure_model(model)
+
+    ancestors = set(parent_ids)
+    ancestors.update(closure.objects.filter(descendant__in=parent_ids).values_list('ancestor_id', flat=True))
+    descendants = set(child_ids)
+    descendants.update(closure.objects.filter(ancestor__in=child_ids).values_list('descendant_id', flat=True))
+
+    existing = set(closure.objects.filter(ancestor__in=ancestors, descendant__in=descendants)
+                   .values_list('ancestor_id', 'descendant_id'))
+    closure.objects.bulk_create([closure(ancestor_id=ancestor, descendant_id=descendant)
+                                 for ancestor in sorted(ancestors) for descendant in sorted(descendants)
+                                 if (ancestor, descendant) not in existing])
+
+
+def rows_in(queryset, field, ids, *fields):
+    """ Values of the rows of a queryset with a field in some ids, read in batches """
+
+    ids = sorted(ids)
+    for i in range(0, len(ids), BATCH_SIZE):
+        yield from queryset.filter(**{field + '__in': ids[i:i + BATCH_SIZE]}).values_list(*fields)
+
+
+def expand(model, parent_ids, child_ids):
+    """ The parents and the objects above them, and the children and the objects below them """
+
+    closure = closure_model(model)
+
+    ancestors = set(parent_ids)
+    ancestors.update(ancestor for (ancestor,) in rows_in(closure.objects, 'descendant', parent_ids, 'ancestor_id'))
+    descendants = set(child_ids)
+    descendants.update(descendant for (descendant,) in rows_in(closure.objects, 'ancestor', child_ids, 'descendant_id'))
+
+    return (ancestors, descendants)
+
+
+def remove_links(model, parent_ids, child_ids):
+    """ Remove from the closure table the rows of some children unlinked from some parents
+
+    It must be called once the links are removed, before any other change
+    in the closure table. See `prune`.
+
+    :return: the number of rows removed
+    """
+
+    (ancestors, descendants) = expand(model, parent_ids, child_ids)
+    return prune(model, ancestors, descendants)
+
+
+def prune(model, ancestors, descendants):
+    """ Remove the closure rows between some objects no longer joined by the links
+
+    Only the rows of the ancestors and the descendants given are checked,
+    which are the ones some links removed could break: other paths could
+    still join them. The ancestors that still reach each descendant are
+    found from the links of its parents, starting with the descendants
+    that have no parents among the others. The ancestors of the parents
+    which are not descendants did not change.
+
+    :param ancestors: ids of the objects above the links removed
+    :param descendants: ids of the objects below the links removed
+    :return: the number of rows removed
+    """
+
+    (links, parent_field, child_field) = links_fields(model)
+    closure = closure_model(model)
+    ancestors = set(ancestors)
+    descendants = set(descendants)
+
+    parents = {}
+    for (parent, child) in rows_in(links.objects, child_field, descendants, parent_field, child_field):
+        parents.setdefault(child, set()).add(parent)
+
+    outside = set(parent for child_parents in parents.values() for parent in child_parents) - descendants
+    above = {parent: {parent} & ancestors for parent in outside}
+    for (ancestor, parent) in rows_in(closure.objects, 'descendant', outside, 'ancestor_id', 'descendant_id'):
+        if ancestor in ancestors:
+            above[parent].add(ancestor)
+
+    # The descendants sorted so the parents come before their children
+    pending = {child: len(parents.get(child, set()) & descendants) for child in descendants}
+    ready = [child for (child, npending) in pending.items() if npending == 0]
+    children = {}
+    for (child, child_parents) in parents.items():
+        for parent in child_parents & descendants:
+            children.setdefault(parent, []).append(child)
+
+    reached = {}
+    while ready:
+        descendant = ready.pop()
+        reached[descendant] = set()
+        for parent in parents.get(descendant, []):
+            reached[descendant].update(reached[parent] if parent in descendants else above[parent])
+        for child in children.get(descendant, []):
+            pending[child] -= 1
+            if pending[child] == 0:
+                ready.append(child)
+
+    stale = [row_id for (row_id, ancestor, descendant)
+             in rows_in(closure.objects, 'descendant', descendants, 'id', 'ancestor_id', 'descendant_id')
+             if ancestor in ancestors and ancestor not in reached[descendant]]
+    for i in range(0, len(stale), BATCH_SIZE):
+        closure.objects.filter(id__in=stale[i:i + BATCH_SIZE]).delete()
+
+    return len(stale)
+
+
+def rebuild(model):
+    """ Rebuild the closure table of a hierarchy from the links between its objects
+
+    Only the rows that changed are added or removed. It reads all the
+    links and rows of the hierarchy, so it is used to repair a broken
+    closure table: the signals only change the rows of the links changed.
+
+    :return: a tuple with the number of rows added and removed
+    """
+
+    (links, parent_field, child_field) = links_fields(model)
+    closure = closure_model(model)
+
+    children = {}
+    for (parent, child) in links.objects.values_list(parent_field, child_field):
+        children.setdefault(parent, set()).add(child)
+
+    expected = set()
+    for ancestor in children:
+        pending = list(children[ancestor])
+        reached = set()
+        while pending:
+            descendant = pending.pop()
+            if descendant not in reached:
+                reached.add(descendant)
+                pending.extend(children.get(descendant, []))
+        expected.update((ancestor, descendant) for descendant in reached)
+
+    existing = {(ancestor, descendant): row_id for (row_id, ancestor, descendant)
+                in closure.objects.values_list('id', 'ancestor_id', 'descendant_id')}
+
+    stale = [row_id for (pair, row_id) in existing.items() if pair not in expected]
+    for i in range(0, len(stale), BATCH_SIZE):
+        closure.objects.filter(id__in=stale[i:i + BATCH_SIZE]).delete()
+
+    missing = sorted(expected.difference(existing))
+    closure.objects.bulk_create([closure(ancestor_id=ancestor, descendant_id=descendant)
+                                 for (ancestor, descendant) in missing])
+
+    return (len(missing), len(stale))
+
+
+def with_descendants(objects):
+    """ Queryset with some objects of a hierarchy and all the objects below them
+
+    :param objects: queryset of projects or ecosystems
+    """
+
+    closure = closure_model(objects.model)
+    ids = objects.values('id')
+
+    return objects.model.objects.filter(Q(id__in=ids) |
+                                        Q(id__in=closure.objects.filter(ancestor__in=ids).values('descendant_id')))
+
+
+def ecosystem_projects(ecosystems):
+    """ Queryset with the projects of some ecosystems, their sub-ecosystems and all their subprojects
+
+    For example, all the repository views under an ecosystem are found
+    with one query with:
+
+        RepositoryView.objects.filter(project__in=ecosystem_projects(Ecosystem.objects.filter(name=name)))
+
+    :param ecosystems: queryset of ecosystems
+    """
+
+    return with_descendants(Project.objects.filter(ecosystem__in=with_descendants(ecosystems)))
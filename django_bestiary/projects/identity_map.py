@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Objects loaded in a request, found by their natural key
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import threading
+
+from contextlib import contextmanager
+
+from projects.models import DataSource, Ecosystem, Project, Repository, RepositoryView
+
+# Fields that identify the objects of each model, besides the id
+NATURAL_KEYS = {
+    DataSource: [('name',)],
+    Ecosystem: [('name',)],
+    Project: [('name',)],
+    Repository: [('name', 'data_source')],
+    RepositoryView: [('repository', 'params')]
+}
+
+# Objects and lists loaded in the current request, only while it is active
+_registry = threading.local()
+
+
+@contextmanager
+def activate():
+    """ Keep the objects loaded until the end of the block, usually a request """
+
+    _registry.objects = {}
+    _registry.lists = {}
+    try:
+        yield
+    finally:
+        del _registry.objects
+        del _registry.lists
+
+
+def is_active():
+    return hasattr(_registry, 'objects')
+
+
+def clear():
+    """ Forget the objects loaded, as some of them changed """
+
+    if is_active():
+        _registry.objects.clear()
+        _registry.lists.clear()
+
+
+def lookup_key(model, lookup):
+    """ Key of an object in the registry from the fields and values of a lookup """
+
+    values = []
+    for field_name in sorted(lookup):
+        field = model._meta.get_field(field_name)
+        value = lookup[field_name]
+        if field.is_relation:
+            value = value.pk if hasattr(value, 'pk') else field.target_field.to_python(value)
+        else:
+            value = field.to_python(value)
+        values.append((field.name, value))
+
+    return (model, tuple(values))
+
+
+def register(obj):
+    """ Add an object to the registry, with its id and its natural keys """
+
+    model = type(obj)
+    objects = _registry.objects
+    objects[lookup_key(model, {'id': obj.pk})] = obj
+    for fields in NATURAL_KEYS.get(model, []):
+        objects[lookup_key(model, {field: getattr(obj, model._meta.get_field(field).attname)
+                                   for field in fields})] = obj
+
+
+def get(model, **lookup):
+    """ Object of a model with an id or a natural key, as model.objects.get
+
+    Within a request the object is loaded only the first time. Outside
+    them, it is always loaded.
+    """
+
+    if not is_active():
+        return model.objects.get(**lookup)
+
+    key = lookup_key(model, lookup)
+    if key not in _registry.objects:
+        obj = model.objects.get(**lookup)
+        register(obj)
+        _registry.objects[key] = obj
+
+    return _registry.objects[key]
+
+
+def get_list(key, fetch):
+    """ List of objects returned by fetch, called only once per request for a key
+
+    The objects in the list are registered, so they are not loaded again
+    by `get`.
+    """
+
+    if not is_active():
+        return list(fetch())
+
+    if key not in _registry.lists:
+        objects = list(fetch())
+        for obj in objects:
+            if type(obj) in NATURAL_KEYS and obj.pk is not None:
+                register(obj)
+        _registry.lists[key] = objects
+
+    return _registry.lists[key]
@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Queue of the imports of projects files run in background
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import datetime
+import logging
+import os
+import shutil
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from projects.bestiary_import import load_projects
+from projects.models import ImportJob
+
+# Seconds after which a running job not updated is taken as dead
+JOB_TIMEOUT = 1800
+
+
+def job_timeout():
+    return getattr(settings, 'BESTIARY_IMPORT_JOB_TIMEOUT', JOB_TIMEOUT)
+
+
+def queue_import(file_path, ecosystem, user=None, remove_file=False, archive_path=''):
+    """ Queue the import of a projects file in an ecosystem
+
+    The import is done by a worker (bestiary_import_worker.py), so the
+    file must be in a path the worker can read.
+
+    :param file_path: path to the projects file, could be compressed
+    :param ecosystem: name of the ecosystem in which to load the projects
+    :param user: user that queued the import
+    :param remove_file: remove the file once the job is finished
+    :param archive_path: path in which to copy the file while it is imported
+    :return: the ImportJob queued
+    """
+
+    return ImportJob.objects.create(ecosystem=ecosystem, file_path=file_path, created_by=user,
+                                    remove_file=remove_file, archive_path=archive_path,
+                                    bytes_total=os.path.getsize(file_path))
+
+
+def requeue_stale_jobs():
+    """ Queue again the running jobs whose worker died
+
+    A running job is updated after each batch of projects imported, so
+    a job not updated in `job_timeout` seconds is taken as dead. It is
+    resumed from its last batch.
+
+    :return: the number of jobs queued again
+    """
+
+    stale = timezone.now() - datetime.timedelta(seconds=job_timeout())
+    return ImportJob.objects.filter(status=ImportJob.RUNNING, updated_at__lt=stale).update(status=ImportJob.QUEUED)
+
+
+def retry_job(job_id):
+    """ Queue again a failed job, whose file is kept
+
+    :return: True if the job was queued, False if it did not fail
+    """
+
+    failed = ImportJob.objects.filter(id=job_id, status=ImportJob.FAILED)
+    return bool(failed.update(status=ImportJob.QUEUED, error='', finished_at=None, updated_at=timezone.now()))
+
+
+def claim_job():
+    """ Take the oldest queued job, so no other worker runs it
+
+    The jobs of the workers that died are queued again before.
+
+    :return: the ImportJob claimed or None if there are no jobs queued
+    """
+
+    requeue_stale_jobs()
+
+    for job_id in ImportJob.objects.filter(status=ImportJob.QUEUED).order_by('id').values_list('id', flat=True):
+        # Other workers could be claiming the same job
+        claimed = ImportJob.objects.filter(id=job_id, status=ImportJob.QUEUED)
+        now = timezone.now()
+        if claimed.update(status=ImportJob.RUNNING, started_at=now, updated_at=now):
+            return ImportJob.objects.get(id=job_id)
+
+    return None
+
+
+def run_job(job):
+    """ Import the projects file of a job, recording its progress in it
+
+    The projects are committed in batches, and after each one the
+    number of projects and lines read are saved in the job. A job queued
+    again goes on after its last batch. If the file has to be archived,
+    it is copied in a thread while it is imported. The file of a failed
+    job is kept, so the job can be retried.
+    """
+
+    def progress(nprojects, nlines, bytes_read):
+        ImportJob.objects.filter(id=job.id).update(nprojects=nprojects, nlines=nlines,
+                                                   bytes_read=bytes_read, updated_at=timezone.now())
+
+    logging.info('Importing %s in %s (job %i)', job.file_path, job.ecosystem, job.id)
+
+    archiver = None
+    if job.archive_path:
+        os.makedirs(os.path.dirname(job.archive_path), exist_ok=True)
+        archiver = threading.Thread(target=shutil.copyfile, args=(job.file_path, job.archive_path))
+        archiver.start()
+
+    try:
+        (job.nprojects, job.nlines) = load_projects(job.file_path, job.ecosystem, resume=True,
+                                                    progress=progress)
+        job.bytes_read = job.bytes_total
+        job.status = ImportJob.DONE
+    except Exception as ex:
+        logging.error("Can't import %s in %s (job %i): %s", job.file_path, job.ecosystem, job.id, ex)
+        job.refresh_from_db(fields=['nprojects', 'nlines', 'bytes_read'])
+        job.status = ImportJob.FAILED
+        job.error = str(ex)
+
+    if archiver:
+        archiver.join()
+    if job.remove_file and job.status == ImportJob.DONE:
+        os.remove(job.file_path)
+
+    job.finished_at = timezone.now()
+    job.save()
+
+    return job
+
+
+def run_next_job():
+    """ Run the oldest queued job
+
+    :return: the ImportJob run or None if there are no jobs queued
+    """
+
+    job = claim_job()
+    if job:
+        run_job(job)
+
+    return job
+
+
+def job_progress(job):
+    """ Progress of an import job
+
+    The rate is the number of lines imported per second, and the ETA
+    the seconds expected until the job is done, estimated from the
+    fraction of the file already read.
+    """
+
+    elapsed = None
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+
+    rate = None
+    if elapsed:
+        rate = job.nlines / elapsed
+
+    eta = None
+    if job.status == ImportJob.RUNNING and job.bytes_read and job.bytes_total:
+        done = min(job.bytes_read / job.bytes_total, 1)
+        eta = elapsed * (1 - done) / done
+    elif job.status in (ImportJob.DONE, ImportJob.FAILED):
+        eta = 0
+
+    return {
+        "id": job.id,
+        "ecosystem": job.ecosystem,
+        "status": job.status,
+        "error": job.error,
+        "projects": job.nprojects,
+        "lines": job.nlines,
+        "bytes_read": job.bytes_read,
+        "bytes_total": job.bytes_total,
+        "elapsed": elapsed,
+        "rate": rate,
+        "eta": eta
+    }
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Locks shared by the processes writing to Bestiary
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+
+def lock_key(name):
+    """ Signed 64 bits key for a lock name, as used by PostgreSQL advisory locks """
+
+    digest = hashlib.sha1(name.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def locks_dir():
+    path = getattr(settings, 'BESTIARY_LOCKS_DIR', None)
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), 'bestiary_locks')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def database_lock(name):
+    """ Lock held in the database server, shared by all its clients """
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [lock_key(name)])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_key(name)])
+    else:
+        # MySQL: lock names are limited to 64 characters
+        key = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, -1)", [key])
+        try:
+            yield
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", [key])
+
+
+@contextmanager
+def file_lock(name):
+    """ Lock file shared by the processes of the same host """
+
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    with open(os.path.join(locks_dir(), digest + '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def named_lock(name):
+    """ Exclusive lock identified by a name
+
+    The lock is held by the database server when it supports it
+    (PostgreSQL advisory locks and MySQL named locks), so it works for
+    processes running in different hosts. With SQLite a lock file is used.
+    """
+
+    logging.debug('Waiting for lock %s', name)
+    if connection.vendor in ('postgresql', 'mysql'):
+        lock = database_lock(name)
+    else:
+        lock = file_lock(name)
+
+    with lock:
+        logging.debug('Lock %s acquired', name)
+        yield
+
+
+def ecosystem_lock(ecosystem):
+    """ Lock taken by the writers of the projects of an ecosystem """
+
+    return named_lock('ecosystem:' + ecosystem)
+
+
+@contextmanager
+def write_lock():
+    """ Lock taken by the transactions of the imports, before they start
+
+    SQLite writes one transaction at a time, and a transaction that
+    read before writing fails at once, instead of waiting, when other is
+    already writing. So with SQLite the imports running at the same time
+    take turns with a lock file. The other databases lock only the rows
+    written, and nothing is done.
+    """
+
+    if connection.vendor == 'sqlite':
+        with file_lock('sqlite-writes'):
+            yield
+    else:
+        yield
@@ -0,0 +1,12 @@
+from projects import identity_map
+
+
+class IdentityMapMiddleware():
+    """ Load only once the objects found by their natural key in each request """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with identity_map.activate():
+            return self.get_response(request)
@@ -17,6 +17,8 @@ class BeastModel(models.Model):
 class DataSource(BeastModel):
     """ The type of data source: git, github ... """
     name = models.CharField(max_length=200, unique=True)
+    # Number of repositories of the data source (see counters)
+    nrepositories = models.IntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -29,6 +31,9 @@ class Repository(BeastModel):
 
     class Meta:
         unique_together = ('name', 'data_source')
+        # The repositories of a data source are listed by name
+        indexes = [models.Index(fields=['data_source', 'name']),
+                   models.Index(fields=['updated_at'])]
 
     def __str__(self):
         return "%s (%s)" % (self.name, self.data_source)
@@ -37,34 +42,151 @@ class Repository(BeastModel):
 class RepositoryView(BeastModel):
     """ A repository wit the extra params needed to collect it """
     params = models.CharField(max_length=400)
+    # JSON with the values of each key of the params (see view_params)
+    parsed_params = models.TextField(default='{}')
     # Relations
     # Base Repository from which to create the View
     repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
 
     class Meta:
         unique_together = ('repository', 'params')
+        indexes = [models.Index(fields=['updated_at'])]
 
     def __str__(self):
         return self.repository.name + " " + self.params
 
 
+class RepositoryViewParam(models.Model):
+    """ A key and a value of the params of a repository view (see view_params) """
+    # As long as the params, which could be a single key
+    key = models.CharField(max_length=400)
+    value = models.CharField(max_length=400)
+    # Relations
+    repository_view = models.ForeignKey(RepositoryView, on_delete=models.CASCADE, related_name='param_values')
+
+    class Meta:
+        unique_together = ('repository_view', 'key', 'value')
+        # The views are looked up by the values of a key
+        indexes = [models.Index(fields=['key', 'value'])]
+
+    def __str__(self):
+        return "%s: %s=%s" % (self.repository_view, self.key, self.value)
+
+
 class Project(BeastModel):
     name = models.CharField(max_length=200, unique=True)
     meta_title = models.CharField(max_length=200)
+    # Increased each time the project or its repository views change
+    export_version = models.IntegerField(default=0)
+    # Number of repository views of the project (see counters)
+    nrepository_views = models.IntegerField(default=0)
     # Relations
     repository_views = models.ManyToManyField(RepositoryView)
     # https://docs.djangoproject.com/en/1.11/ref/models/fields/#foreignkey
     subprojects = models.ManyToManyField("Project")
 
+    class Meta:
+        # The objects changed since some time are read by incremental consumers
+        indexes = [models.Index(fields=['updated_at'])]
+
     def __str__(self):
         return self.name
 
 
 class Ecosystem(BeastModel):
     name = models.CharField(max_length=200, unique=True)
+    # Increased each time the projects file of the ecosystem changes
+    export_version = models.IntegerField(default=0)
+    # Number of projects of the ecosystem (see counters)
+    nprojects = models.IntegerField(default=0)
     # Relations
     projects = models.ManyToManyField(Project)
     subecos = models.ManyToManyField("Ecosystem")
 
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'])]
+
     def __str__(self):
         return self.name
+
+
+class ProjectClosure(models.Model):
+    """ A project and one of its subprojects, at any depth (see hierarchy) """
+    ancestor = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='ancestor_links')
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+
+    def __str__(self):
+        return "%s > %s" % (self.ancestor, self.descendant)
+
+
+class EcosystemClosure(models.Model):
+    """ An ecosystem and one of its sub-ecosystems, at any depth (see hierarchy) """
+    ancestor = models.ForeignKey(Ecosystem, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Ecosystem, on_delete=models.CASCADE, related_name='ancestor_links')
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+
+    def __str__(self):
+        return "%s > %s" % (self.ancestor, self.descendant)
+
+
+class ImportRun(BeastModel):
+    """ An import of a projects file in an ecosystem """
+    # sha256 of the contents of the projects file
+    file_hash = models.CharField(max_length=64)
+    incremental = models.BooleanField(default=False)
+    finished = models.BooleanField(default=False)
+    # Checkpoint: last project committed, to resume an interrupted import
+    last_project = models.CharField(max_length=200, blank=True)
+    # Relations
+    ecosystem = models.ForeignKey(Ecosystem, on_delete=models.CASCADE)
+
+    def __str__(self):
+        return "%s (%s)" % (self.ecosystem, self.file_hash)
+
+
+class ImportedProject(BeastModel):
+    """ Hash of the contents of a project when it was last imported in an ecosystem """
+    content_hash = models.CharField(max_length=64)
+    # Relations
+    ecosystem = models.ForeignKey(Ecosystem, on_delete=models.CASCADE)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('ecosystem', 'project')
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.ecosystem, self.project, self.content_hash)
+
+
+class ImportJob(BeastModel):
+    """ Import of an uploaded projects file, run in background by a worker """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(status, status) for status in (QUEUED, RUNNING, DONE, FAILED)]
+
+    # The ecosystem is created by the import if it does not exist
+    ecosystem = models.CharField(max_length=200)
+    file_path = models.CharField(max_length=500)
+    # The file was uploaded for the job, so it is removed once imported
+    remove_file = models.BooleanField(default=False)
+    # Where to keep a copy of the file, if any
+    archive_path = models.CharField(max_length=500, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True)
+    # Progress
+    nprojects = models.IntegerField(default=0)
+    nlines = models.IntegerField(default=0)
+    bytes_read = models.BigIntegerField(default=0)
+    bytes_total = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return "%s %s (%s)" % (self.ecosystem, self.file_path, self.status)
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Differences between the projects of two projects files, or a file and Bestiary
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import hashlib
+import json
+
+from projects.projects_stream import NOT_DS_FIELDS, iter_projects, open_projects_file
+
+
+def normalize_meta(meta):
+    """ Meta of a project as it is loaded: None or an object with the title """
+
+    if isinstance(meta, str):
+        # In Mozilla the meta is the title directly
+        return {"title": meta}
+
+    return meta or None
+
+
+def normalize_line(line):
+    return line.strip() if isinstance(line, str) else json.dumps(line, sort_keys=True)
+
+
+def normalize_project(project_json):
+    """ Meta and the set of repository lines of each data source of a project
+
+    The lines are compared without the surrounding whitespace, and
+    without taking into account their order or if they are repeated.
+    Data sources without lines are ignored, as they are not loaded.
+    """
+
+    data_sources = {}
+    for (data_source, lines) in project_json.items():
+        if data_source in NOT_DS_FIELDS or not lines:
+            continue
+        data_sources[data_source] = set(normalize_line(line) for line in lines)
+
+    return (normalize_meta(project_json.get('meta')), data_sources)
+
+
+def project_digest(normalized):
+    """ Digest of a normalized project, equal for projects with the same contents """
+
+    (meta, data_sources) = normalized
+    contents = [meta, sorted((data_source, sorted(lines)) for (data_source, lines) in data_sources.items())]
+
+    return hashlib.sha1(json.dumps(contents, sort_keys=True).encode('utf-8')).digest()
+
+
+def iter_file_projects(path):
+    """ Generator of the (project name, project JSON) of a projects file, which could be compressed """
+
+    with open_projects_file(path) as pfile:
+        yield from iter_projects(pfile)
+
+
+class ProjectsDiff():
+    """ Compare the projects of two sources, usually projects files
+
+    A source is a function that returns a new generator of the (project
+    name, project JSON) each time it is called, like `iter_file_projects`.
+    The projects are compared by name, and two projects with the same
+    name by their meta and by the set of normalized repository lines of
+    each data source, see `normalize_project`.
+
+    The sources are streamed, and only a digest of each old project and
+    the new projects that changed are kept in memory. The old source is
+    read twice: once to get the digests of its projects and, if there are
+    differences, once more to compare the changed projects line by line.
+    The time needed is linear in the number of lines of the sources.
+    """
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.stats = {
+            'projects_unchanged': 0,
+            'projects_added': 0,
+            'projects_removed': 0,
+            'projects_changed': 0,
+            'lines_added': 0,
+            'lines_removed': 0
+        }
+
+    def __changed(self, name, old, new):
+        """ Entry of a project whose contents changed """
+
+        entry = {"project": name, "status": "changed"}
+
+        if old[0] != new[0]:
+            entry["meta"] = {"old": old[0], "new": new[0]}
+
+        data_sources = {}
+        for data_source in sorted(set(old[1]) | set(new[1])):
+            old_lines = old[1].get(data_source, set())
+            new_lines = new[1].get(data_source, set())
+            if old_lines == new_lines:
+                continue
+            data_sources[data_source] = {
+                "added": sorted(new_lines - old_lines),
+                "removed": sorted(old_lines - new_lines)
+            }
+            self.stats['lines_added'] += len(data_sources[data_source]["added"])
+            self.stats['lines_removed'] += len(data_sources[data_source]["removed"])
+
+        if data_sources:
+            entry["data_sources"] = data_sources
+
+        return entry
+
+    def differences(self):
+        """ Generator of the projects added, removed or changed
+
+        Each difference is a dict with the project name and its status,
+        "added", "removed" or "changed". The changed ones have too the old
+        and new "meta" if it changed, and the repository lines "added" and
+        "removed" of each data source changed, in "data_sources".
+        """
+
+        digests = {}
+        for (name, project_json) in self.old():
+            digests[name] = project_digest(normalize_project(project_json))
+
+        changed = {}
+        found = set()
+        for (name, project_json) in self.new():
+            found.add(name)
+            if name not in digests:
+                self.stats['projects_added'] += 1
+                self.stats['lines_added'] += sum(len(lines) for lines in
+                                                 normalize_project(project_json)[1].values())
+                yield {"project": name, "status": "added"}
+                continue
+
+            normalized = normalize_project(project_json)
+            if project_digest(normalized) == digests[name]:
+                self.stats['projects_unchanged'] += 1
+            else:
+                changed[name] = normalized
+
+        if not changed and found == set(digests):
+            return
+
+        for (name, project_json) in self.old():
+            if name not in found:
+                self.stats['projects_removed'] += 1
+                self.stats['lines_removed'] += sum(len(lines) for lines in
+                                                   normalize_project(project_json)[1].values())
+                yield {"project": name, "status": "removed"}
+            elif name in changed:
+                self.stats['projects_changed'] += 1
+                yield self.__changed(name, normalize_project(project_json), changed.pop(name))
+
+
+def diff_projects_files(old_file, new_file):
+    """ Compare two projects files
+
+    :return: a tuple with the list of differences, as generated by
+             `ProjectsDiff.differences`, and the stats of the comparison
+    """
+
+    diff = ProjectsDiff(lambda: iter_file_projects(old_file), lambda: iter_file_projects(new_file))
+    differences = list(diff.differences())
+
+    return (differences, diff.stats)
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Incremental reader for projects files
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import bz2
+import codecs
+import gzip
+import json
+import lzma
+import re
+
+from contextlib import contextmanager
+
+# Characters read from the file in each read
+CHUNK_SIZE = 64 * 1024
+
+# fields in project that are not a data source
+NOT_DS_FIELDS = ['meta']
+
+WHITESPACE = re.compile(r'\s*')
+
+# Magic number of the compressed files -> function to decompress them
+COMPRESSIONS = [
+    (b'\x1f\x8b', lambda fileobj: gzip.GzipFile(fileobj=fileobj, mode='rb')),
+    (b'BZh', lambda fileobj: bz2.BZ2File(fileobj, mode='rb')),
+    (b'\xfd7zXZ\x00', lambda fileobj: lzma.LZMAFile(fileobj, mode='rb'))
+]
+
+
+class ProjectsReader():
+    """ Read the projects of a JSON projects file one by one
+
+    The projects file is a JSON object with a project in each field.
+    Instead of decoding the whole document, the file is read in chunks
+    and only one project is decoded at a time, so the memory needed
+    depends on the size of the biggest project and not on the size
+    of the file.
+
+    The file could be opened in text or binary mode. In the latter, its
+    contents are decoded as UTF-8.
+    """
+
+    def __init__(self, pfile, chunk_size=CHUNK_SIZE):
+        self.pfile = pfile
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.bytes_decoder = None
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def __read(self, size):
+        chunk = self.pfile.read(size)
+
+        if isinstance(chunk, bytes):
+            if not self.bytes_decoder:
+                self.bytes_decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = self.bytes_decoder.decode(chunk, final=not chunk)
+
+        return chunk
+
+    def __fill(self):
+        """ Read more data, dropping the already consumed one """
+
+        # Read at least as much as it is pending so decoding
+        # a big value that needs several reads is not quadratic
+        pending = len(self.buffer) - self.pos
+        chunk = self.__read(max(self.chunk_size, pending))
+        if not chunk:
+            self.eof = True
+
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def __skip_whitespace(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return
+            self.__fill()
+
+    def __next_char(self):
+        self.__skip_whitespace()
+        if self.pos >= len(self.buffer):
+            raise ValueError("Unexpected end of projects file")
+        return self.buffer[self.pos]
+
+    def __expect(self, chars):
+        char = self.__next_char()
+        if char not in chars:
+            raise ValueError("Expecting '%s' in projects file, found '%s'" % ("' or '".join(chars), char))
+        self.pos += 1
+        return char
+
+    def __decode(self):
+        """ Decode the JSON value that starts in the current position """
+
+        self.__skip_whitespace()
+
+        while True:
+            try:
+                (value, end) = self.decoder.raw_decode(self.buffer, self.pos)
+                self.pos = end
+                return value
+            except json.JSONDecodeError:
+                # Only strings and objects are decoded, which can not
+                # be decoded before they are complete
+                if self.eof:
+                    raise
+                self.__fill()
+
+    def projects(self):
+        """ Generator of the (project name, project JSON) in the file """
+
+        self.__expect('{')
+        if self.__next_char() == '}':
+            self.pos += 1
+            return
+
+        while True:
+            name = self.__decode()
+            if not isinstance(name, str):
+                raise ValueError("Expecting a project name in projects file, found %s" % name)
+            self.__expect(':')
+            yield (name, self.__decode())
+
+            if self.__expect(',}') == '}':
+                return
+
+
+def iter_projects(pfile, chunk_size=CHUNK_SIZE):
+    """ Read one by one the (project name, project JSON) from a projects file """
+
+    return ProjectsReader(pfile, chunk_size).projects()
+
+
+def iter_project_lines(pfile, chunk_size=CHUNK_SIZE):
+    """ Read one by one the repository lines from a projects file
+
+    For each line a (project, meta, data_source, repository_view_str)
+    tuple is generated. Data sources without lines generate a tuple
+    with repository_view_str set to None, and projects without data
+    sources one with data_source set to None too, so they are not lost.
+    """
+
+    for (project, project_json) in iter_projects(pfile, chunk_size):
+        meta = project_json.get('meta')
+        ndata_sources = 0
+
+        for data_source in project_json:
+            if data_source in NOT_DS_FIELDS:
+                continue
+
+            ndata_sources += 1
+            if not project_json[data_source]:
+                yield (project, meta, data_source, None)
+
+            for repository_view_str in project_json[data_source]:
+                yield (project, meta, data_source, repository_view_str)
+
+        if not ndata_sources:
+            yield (project, meta, None, None)
+
+
+def decompress(fileobj):
+    """ Decompress on the fly a file compressed with gzip, bzip2 or xz
+
+    The compression is found from the first bytes of the file, which
+    must be opened in binary mode and be seekable, like a regular file
+    or an uploaded one. The file returned is read in chunks as the
+    original one, so the whole file is never decompressed in memory.
+    Files not compressed are returned as they are.
+    """
+
+    position = fileobj.tell()
+    magic = fileobj.read(6)
+    fileobj.seek(position)
+
+    for (magic_number, decompressor) in COMPRESSIONS:
+        if magic.startswith(magic_number):
+            return decompressor(fileobj)
+
+    return fileobj
+
+
+@contextmanager
+def open_projects_file(path):
+    """ Open a projects file, which could be compressed, for reading it in binary mode """
+
+    with open(path, 'rb') as raw:
+        with decompress(raw) as pfile:
+            yield pfile
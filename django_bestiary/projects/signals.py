@@ -0,0 +1,423 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Track the changes in the projects files of the ecosystems
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from projects import hierarchy, identity_map, view_params
+from projects.counters import COUNTERS, update_counters
+from projects.data_cache import ALL, invalidate, project_namespace
+from projects.models import DataSource, Ecosystem, Project, Repository, RepositoryView
+
+
+def bump_export_version(ecosystems):
+    """ Mark the projects files of some ecosystems, or some projects, as changed
+
+    The version of the ecosystems is increased, so their cached exports
+    are not used anymore, and their updated_at is set to now. The signals
+    below do it when the objects are changed with the ORM; the bulk
+    imports, which skip the signals, call it directly.
+
+    :param ecosystems: queryset with the ecosystems, or projects, changed
+    """
+
+    ecosystems.update(export_version=F('export_version') + 1, updated_at=timezone.now())
+
+
+def bump_projects_export_version(project_ids):
+    """ Mark as changed some projects and the projects files of their ecosystems """
+
+    bump_export_version(Project.objects.filter(id__in=project_ids))
+    bump_export_version(Ecosystem.objects.filter(projects__in=project_ids))
+
+
+def bump_views_export_version(views):
+    """ Mark as changed the projects of some repository views and their ecosystems
+
+    :param views: dict with the lookup of the repository views in a project
+    """
+
+    project_ids = list(Project.objects.filter(**views).values_list('id', flat=True))
+    if project_ids:
+        bump_projects_export_version(project_ids)
+
+
+@receiver(pre_save, sender=Ecosystem)
+def ecosystem_saving(sender, instance, **kwargs):
+    """ The name of an ecosystem is in some of its projects files, so renaming it changes them
+
+    The version is taken from the database, so an instance read before
+    other changes does not take it back.
+    """
+
+    if instance.pk is None:
+        return
+
+    current = Ecosystem.objects.filter(pk=instance.pk).values_list('name', 'export_version').first()
+    if current:
+        (name, export_version) = current
+        instance.export_version = export_version + 1 if name != instance.name else export_version
+
+
+@receiver(pre_save, sender=Project)
+def project_saving(sender, instance, **kwargs):
+    """ The version of a project is taken from the database before saving it
+
+    An instance read before other changes would write back an old
+    version, which bumped after the save could be one already exported.
+    """
+
+    if instance.pk is None:
+        return
+
+    versions = Project.objects.filter(pk=instance.pk).values_list('export_version', flat=True)
+    if versions:
+        instance.export_version = versions[0]
+
+
+@receiver(post_save, sender=Project)
+@receiver(pre_delete, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    bump_projects_export_version([instance.id])
+
+
+@receiver(post_save, sender=RepositoryView)
+@receiver(pre_delete, sender=RepositoryView)
+def repository_view_changed(sender, instance, **kwargs):
+    bump_views_export_version({'repository_views': instance.id})
+
+
+@receiver(post_save, sender=Repository)
+@receiver(pre_delete, sender=Repository)
+def repository_changed(sender, instance, **kwargs):
+    bump_views_export_version({'repository_views__repository': instance.id})
+
+
+@receiver(post_save, sender=DataSource)
+@receiver(pre_delete, sender=DataSource)
+def data_source_changed(sender, instance, **kwargs):
+    bump_views_export_version({'repository_views__repository__data_source': instance.id})
+
+
+@receiver(m2m_changed, sender=Project.repository_views.through)
+def project_views_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        bump_projects_export_version([instance.id])
+    elif action == 'pre_clear':
+        bump_views_export_version({'repository_views': instance.id})
+    else:
+        bump_projects_export_version(pk_set)
+
+
+@receiver(m2m_changed, sender=Ecosystem.projects.through)
+def ecosystem_projects_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        bump_export_version(Ecosystem.objects.filter(id=instance.id))
+    elif action == 'pre_clear':
+        bump_projects_export_version([instance.id])
+    else:
+        bump_export_version(Ecosystem.objects.filter(id__in=pk_set))
+
+
+#
+# Invalidation of the lists cached by the editor fetchers (see data_cache)
+#
+
+# Namespaces of the lists that depend on the relations between objects
+GRAPH_NAMESPACES = ['projects', 'data_sources', 'views']
+
+
+def project_names(lookup):
+    """ Names of the projects found with a lookup, like the ones with some repository views """
+
+    return list(Project.objects.filter(**lookup).values_list('name', flat=True))
+
+
+def invalidate_projects(names):
+    invalidate(*[project_namespace(name) for name in names])
+
+
+def views_lookup(sender, instance):
+    """ Lookup of the repository views of a RepositoryView or a Repository in a project """
+
+    if sender is RepositoryView:
+        return {'repository_views': instance.id}
+    return {'repository_views__repository': instance.id}
+
+
+@receiver(post_save, sender=Ecosystem)
+@receiver(post_delete, sender=Ecosystem)
+def ecosystem_data_changed(sender, instance, **kwargs):
+    invalidate('ecosystems', *GRAPH_NAMESPACES)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_data_changed(sender, instance, **kwargs):
+    invalidate_projects([instance.name])
+    invalidate(*GRAPH_NAMESPACES)
+
+
+@receiver(pre_delete, sender=RepositoryView)
+@receiver(pre_delete, sender=Repository)
+def repository_view_data_deleting(sender, instance, **kwargs):
+    # The projects are found before the views are removed from them
+    instance._bestiary_projects = project_names(views_lookup(sender, instance))
+
+
+@receiver(post_save, sender=RepositoryView)
+@receiver(post_save, sender=Repository)
+@receiver(post_delete, sender=RepositoryView)
+@receiver(post_delete, sender=Repository)
+def repository_view_data_changed(sender, instance, **kwargs):
+    names = getattr(instance, '_bestiary_projects', None)
+    if names is None:
+        names = project_names(views_lookup(sender, instance))
+
+    invalidate_projects(names)
+    invalidate(*GRAPH_NAMESPACES)
+
+
+@receiver(post_save, sender=DataSource)
+@receiver(post_delete, sender=DataSource)
+def data_source_data_changed(sender, instance, **kwargs):
+    # The views of any project could be affected
+    invalidate(ALL)
+
+
+@receiver(m2m_changed, sender=Project.repository_views.through)
+def project_views_data_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        invalidate_projects([instance.name])
+    elif action == 'pre_clear':
+        invalidate_projects(project_names({'repository_views': instance.id}))
+    else:
+        invalidate_projects(project_names({'id__in': pk_set}))
+    invalidate(*GRAPH_NAMESPACES)
+
+
+@receiver(m2m_changed, sender=Ecosystem.projects.through)
+def ecosystem_projects_data_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate(*GRAPH_NAMESPACES)
+
+
+#
+# Closure tables of the subprojects and sub-ecosystems (see hierarchy)
+#
+
+@receiver(m2m_changed, sender=Project.subprojects.through)
+@receiver(m2m_changed, sender=Ecosystem.subecos.through)
+def hierarchy_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        # The objects unlinked are not sent with post_clear, and post_remove
+        # sends the ones asked for, even if they were not linked
+        (_, parent_field, child_field) = hierarchy.links_fields(model)
+        (field, linked) = (child_field, parent_field) if reverse else (parent_field, child_field)
+        links = sender.objects.filter(**{field: instance.id})
+        if action == 'pre_remove':
+            pk_set = set(linked_id for (linked_id,) in hierarchy.rows_in(links, linked, pk_set, linked))
+        else:
+            pk_set = set(links.values_list(linked, flat=True))
+        instance._bestiary_unlinked = pk_set
+    elif action in ('post_remove', 'post_clear'):
+        pk_set = getattr(instance, '_bestiary_unlinked', set())
+
+    if reverse:
+        (parent_ids, child_ids) = (pk_set, [instance.id])
+    else:
+        (parent_ids, child_ids) = ([instance.id], pk_set)
+
+    if action == 'pre_add':
+        hierarchy.check_links(model, parent_ids, child_ids)
+    elif action == 'post_add':
+        hierarchy.add_links(model, parent_ids, child_ids)
+    elif action in ('post_remove', 'post_clear') and pk_set:
+        # Other paths could still join the objects unlinked
+        hierarchy.remove_links(model, parent_ids, child_ids)
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate(*GRAPH_NAMESPACES)
+
+
+@receiver(pre_delete, sender=Project)
+@receiver(pre_delete, sender=Ecosystem)
+def hierarchy_member_deleting(sender, instance, **kwargs):
+    # The rows of the paths through the object are not removed with it
+    (ancestors, descendants) = hierarchy.expand(sender, [instance.id], [instance.id])
+    ancestors.discard(instance.id)
+    descendants.discard(instance.id)
+    instance._bestiary_path = (ancestors, descendants)
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Ecosystem)
+def hierarchy_member_deleted(sender, instance, **kwargs):
+    (ancestors, descendants) = getattr(instance, '_bestiary_path', (None, None))
+    if ancestors and descendants:
+        hierarchy.prune(sender, ancestors, descendants)
+
+
+#
+# Counters of the ecosystems, projects and data sources (see counters)
+#
+
+@receiver(pre_save, sender=Ecosystem)
+@receiver(pre_save, sender=Project)
+@receiver(pre_save, sender=DataSource)
+def counter_saving(sender, instance, **kwargs):
+    """ The counters are only changed by update_counters
+
+    An instance read before its counter changed would write back the old
+    value, so the counter is taken from the database before saving it.
+    """
+
+    if instance.pk is None:
+        return
+
+    field = COUNTERS[sender][0]
+    counts = sender.objects.filter(pk=instance.pk).values_list(field, flat=True)
+    if counts:
+        setattr(instance, field, counts[0])
+
+
+def relation_changed_ids(model, instance, action, reverse, pk_set, lookup):
+    """ Ids of the objects whose counters change with a change in a many to many relation
+
+    :param model: model with the counter, the source of the relation
+    :param lookup: lookup of the objects of the model related to the target instance
+    """
+
+    if not reverse:
+        return [instance.id]
+    if action == 'pre_clear':
+        instance._bestiary_counted = list(model.objects.filter(**{lookup: instance.id}).values_list('id', flat=True))
+    if action == 'post_clear':
+        return getattr(instance, '_bestiary_counted', [])
+    return pk_set
+
+
+@receiver(m2m_changed, sender=Ecosystem.projects.through)
+def ecosystem_projects_counted(sender, instance, action, reverse, pk_set, **kwargs):
+    ids = relation_changed_ids(Ecosystem, instance, action, reverse, pk_set, 'projects')
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        update_counters(Ecosystem, ids)
+
+
+@receiver(m2m_changed, sender=Project.repository_views.through)
+def project_views_counted(sender, instance, action, reverse, pk_set, **kwargs):
+    ids = relation_changed_ids(Project, instance, action, reverse, pk_set, 'repository_views')
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        update_counters(Project, ids)
+
+
+@receiver(pre_delete, sender=Project)
+@receiver(pre_delete, sender=RepositoryView)
+def relation_member_deleting(sender, instance, **kwargs):
+    # The relations of the object are removed with it, without m2m_changed
+    if sender is Project:
+        instance._bestiary_counted = list(Ecosystem.objects.filter(projects=instance.id).values_list('id', flat=True))
+    else:
+        instance._bestiary_counted = list(Project.objects.filter(repository_views=instance.id)
+                                          .values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=RepositoryView)
+def relation_member_deleted(sender, instance, **kwargs):
+    update_counters(Ecosystem if sender is Project else Project, getattr(instance, '_bestiary_counted', []))
+
+
+@receiver(pre_save, sender=Repository)
+def repository_moving(sender, instance, **kwargs):
+    # The data source of the repository could change
+    instance._bestiary_data_source = None
+    if instance.pk:
+        instance._bestiary_data_source = Repository.objects.filter(pk=instance.pk) \
+            .values_list('data_source_id', flat=True).first()
+
+
+@receiver(post_save, sender=Repository)
+@receiver(post_delete, sender=Repository)
+def repository_counted(sender, instance, **kwargs):
+    data_sources = [instance.data_source_id]
+    if getattr(instance, '_bestiary_data_source', None):
+        data_sources.append(instance._bestiary_data_source)
+    update_counters(DataSource, data_sources)
+
+
+#
+# Params of the repository views parsed into keys and values (see view_params)
+#
+
+@receiver(pre_save, sender=RepositoryView)
+def repository_view_parsing(sender, instance, **kwargs):
+    data_source = DataSource.objects.filter(repository=instance.repository_id).values_list('name', flat=True).first()
+    parsed = view_params.parsed_params(data_source, instance.params)
+
+    instance._bestiary_data_source_name = data_source
+    instance._bestiary_parsed = instance._state.adding or parsed != instance.parsed_params
+    instance.parsed_params = parsed
+
+
+@receiver(post_save, sender=RepositoryView)
+def repository_view_parsed(sender, instance, **kwargs):
+    if getattr(instance, '_bestiary_parsed', False):
+        view_params.replace_params(instance.id, instance._bestiary_data_source_name, instance.params)
+
+
+@receiver(post_save, sender=Repository)
+def repository_views_reparsed(sender, instance, created, **kwargs):
+    # The params are parsed with the codec of the data source
+    old_data_source = getattr(instance, '_bestiary_data_source', None)
+    if not created and old_data_source and old_data_source != instance.data_source_id:
+        view_params.reindex_params(RepositoryView.objects.filter(repository=instance.id).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ecosystem)
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=RepositoryView)
+@receiver(post_save, sender=Repository)
+@receiver(post_save, sender=DataSource)
+@receiver(post_delete, sender=Ecosystem)
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=RepositoryView)
+@receiver(post_delete, sender=Repository)
+@receiver(post_delete, sender=DataSource)
+@receiver(m2m_changed, sender=Project.repository_views.through)
+@receiver(m2m_changed, sender=Ecosystem.projects.through)
+@receiver(m2m_changed, sender=Project.subprojects.through)
+@receiver(m2m_changed, sender=Ecosystem.subecos.through)
+def loaded_objects_changed(sender, **kwargs):
+    # The objects loaded before in the request could have changed
+    identity_map.clear()
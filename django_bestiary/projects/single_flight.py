@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Computations run once for the concurrent requests of the same result
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import hashlib
+import logging
+import os
+import threading
+
+from contextlib import contextmanager
+from time import time
+
+from projects.locks import locks_dir, named_lock
+
+# Bytes read in each read of a result file
+READ_SIZE = 64 * 1024
+# Seconds a result is reused by default
+RESULT_TIMEOUT = 600
+
+# Locks of the keys computed in this process, with the number of their users
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def local_lock(key):
+    """ Lock of a key shared by the threads of this process """
+
+    with _local_locks_guard:
+        (lock, users) = _local_locks.get(key, (threading.Lock(), 0))
+        _local_locks[key] = (lock, users + 1)
+
+    try:
+        with lock:
+            yield
+    finally:
+        with _local_locks_guard:
+            (lock, users) = _local_locks[key]
+            if users == 1:
+                del _local_locks[key]
+            else:
+                _local_locks[key] = (lock, users - 1)
+
+
+def results_dir():
+    path = os.path.join(locks_dir(), 'results')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def result_path(key):
+    return os.path.join(results_dir(), hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def open_result(path, timeout):
+    """ Open a result file for reading, None if it does not exist or it is too old """
+
+    try:
+        result = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    if os.fstat(result.fileno()).st_mtime < time() - timeout:
+        result.close()
+        return None
+
+    return result
+
+
+def remove_old_results(timeout):
+    """ Remove the result files older than timeout seconds """
+
+    directory = results_dir()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < time() - timeout:
+                os.remove(path)
+        except FileNotFoundError:
+            # Removed by other process
+            pass
+
+
+def write_result(path, chunks):
+    """ Write the chunks of a result to its file
+
+    The file is only visible once the result is complete, so a result
+    interrupted is never reused.
+    """
+
+    temp_path = '%s.%i.%i.tmp' % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(temp_path, 'wb') as result:
+            for chunk in chunks:
+                result.write(chunk)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def iter_single_flight(key, compute, timeout=RESULT_TIMEOUT):
+    """ Generator of the chunks of a result, computed once for the concurrent calls with the same key
+
+    The first call computes the result with compute(), which must return
+    an iterable of bytes, and writes it to a file. The calls with the same
+    key that arrive meanwhile, from this process or from others, wait for
+    it to finish and then read the file instead of computing it again. The
+    threads of a process wait for a local lock and the processes for a
+    named lock (a database lock or a lock file).
+
+    The locks are released once the file is complete, before any chunk is
+    generated, so a slow client does not make the others wait for it.
+
+    The result is reused for timeout seconds, so the key must change when
+    the result does, for example including the version of the data.
+    """
+
+    path = result_path(key)
+
+    result = open_result(path, timeout)
+    if result is None:
+        with local_lock(key), named_lock('single-flight:' + key):
+            result = open_result(path, timeout)
+            if result is None:
+                logging.debug('Computing %s', key)
+                remove_old_results(timeout)
+                write_result(path, compute())
+                # Opened before the locks are released, so it is not removed meanwhile
+                result = open(path, 'rb')
+
+    with result:
+        yield from iter(lambda: result.read(READ_SIZE), b'')
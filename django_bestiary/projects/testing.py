@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Runner of the Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from projects import data_cache
+
+
+class BestiaryTestRunner(DiscoverRunner):
+    """ Run the tests with a data cache of their own
+
+    The data cache of the settings is shared with the server, so the
+    tests, which clear it and fill it with their lists, use a file based
+    cache, shared with the processes they fork too, in a temporary
+    directory removed once they finish.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+
+        self.data_cache_dir = tempfile.mkdtemp()
+        caches = dict(settings.CACHES)
+        caches[getattr(settings, 'BESTIARY_DATA_CACHE', data_cache.DATA_CACHE)] = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.data_cache_dir
+        }
+        self.data_cache_settings = override_settings(CACHES=caches)
+        self.data_cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.data_cache_settings.disable()
+        shutil.rmtree(self.data_cache_dir)
+
+        super().teardown_test_environment(**kwargs)
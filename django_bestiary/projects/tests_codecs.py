@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import json
+import random
+
+from django.test import SimpleTestCase
+
+from .datasource_codecs import (CODECS, BugzillaCodec, DataSourceCodec, EmptyCodec, MboxCodec, ParamsCodec,
+                                RepositoryCodec, SeparatorCodec, StackExchangeCodec,
+                                format_lines, parse_lines, parse_params)
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEF0123456789/:.-_~?=& #'
+SAMPLES = 200
+
+
+def random_text(rnd, exclude=(), min_length=0):
+    """ Random text without any of the exclude substrings """
+
+    while True:
+        text = ''.join(rnd.choice(ALPHABET) for _ in range(rnd.randint(min_length, 30)))
+        if not any(token in text for token in exclude):
+            return text
+
+
+def random_view(rnd, codec):
+    """ Random (repository, params) which can be represented by a codec """
+
+    params = random_text(rnd) if rnd.random() > 0.3 else ''
+
+    if isinstance(codec, RepositoryCodec):
+        return (random_text(rnd), '')
+    elif isinstance(codec, SeparatorCodec):
+        return (random_text(rnd, exclude=[codec.separator]), params)
+    elif isinstance(codec, MboxCodec):
+        return (random_text(rnd, exclude=[' ']) + ' ' + random_text(rnd, exclude=[' ']), params)
+    elif isinstance(codec, BugzillaCodec):
+        return (random_text(rnd, exclude=['?', BugzillaCodec.BUGLIST]), params)
+    elif isinstance(codec, StackExchangeCodec):
+        return (random_text(rnd, exclude=['questions', 'tagged/']),
+                random_text(rnd, exclude=['tagged/'], min_length=1))
+    elif isinstance(codec, ParamsCodec):
+        return ('', params)
+    elif isinstance(codec, EmptyCodec):
+        return ('', '')
+
+    raise ValueError("No random views for %s" % codec)
+
+
+class DataSourceCodecsTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        """ Formatting a view and parsing it back returns the same view """
+
+        rnd = random.Random(1)
+
+        for (data_source, codec) in CODECS.items():
+            views = [random_view(rnd, codec) for _ in range(SAMPLES)]
+            lines = format_lines(data_source, views)
+
+            self.assertListEqual(parse_lines(data_source, lines), views, data_source)
+            self.assertListEqual(format_lines(data_source, parse_lines(data_source, lines)), lines, data_source)
+
+            for (view, line) in zip(views, lines):
+                self.assertEqual(codec.format(*view), line)
+                self.assertEqual(codec.parse(line), view)
+
+    def test_projects_file(self):
+        """ The lines of the projects file are formatted back as they are """
+
+        with open('projects/projects-release.json') as pfile:
+            projects = json.load(pfile)
+
+        for (data_source, lines) in projects['grimoire'].items():
+            self.assertListEqual(format_lines(data_source, parse_lines(data_source, lines)), lines)
+
+    def test_unknown_data_source(self):
+        self.assertListEqual(parse_lines('unknown', ['https://a.org']), [(None, '')])
+        self.assertListEqual(format_lines('unknown', [('https://a.org', 'b')]), ['https://a.org b'])
+
+    def test_abstract_codec(self):
+        """ A codec must implement parse and format """
+
+        class ParseCodec(DataSourceCodec):
+            def parse(self, line):
+                return (line, '')
+
+        with self.assertRaises(TypeError):
+            DataSourceCodec()
+        with self.assertRaises(TypeError):
+            ParseCodec()
+
+    def test_parse_params(self):
+        self.assertListEqual(parse_params('git', '--filters-raw-prefix data.files.file:a data.files.file:b'),
+                             [('filters-raw-prefix', 'data.files.file:a'), ('filters-raw-prefix', 'data.files.file:b')])
+        self.assertListEqual(parse_params('git', 'a --from-date=2018-01-01 --no-archive'),
+                             [('', 'a'), ('from-date', '2018-01-01'), ('no-archive', '')])
+        self.assertListEqual(parse_params('git', '--filter-raw="data.component:Foo Bar" --category \'a b\''),
+                             [('filter-raw', 'data.component:Foo Bar'), ('category', 'a b')])
+        self.assertListEqual(parse_params('git', '--filter-raw="Foo'), [('filter-raw', '"Foo')])
+        self.assertListEqual(parse_params('gerrit', 'stable/queens'), [('branch', 'stable/queens')])
+        self.assertListEqual(parse_params('bugzilla', 'product=Kibana&component='),
+                             [('product', 'Kibana'), ('component', '')])
+        self.assertListEqual(parse_params('stackexchange', 'ovirt'), [('tag', 'ovirt')])
+        self.assertListEqual(parse_params('unknown', 'b'), [('', 'b')])
+        for data_source in CODECS:
+            self.assertListEqual(parse_params(data_source, ''), [], data_source)
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import json
+import tempfile
+import threading
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from .bestiary_counters import repair_all
+from .bestiary_export import export_projects
+from .bestiary_import import load_projects, load_projects_incremental
+from .counters import COUNTERS, update_counters
+from .models import DataSource, Ecosystem, Project, Repository, RepositoryView
+
+
+class CountersTests(TestCase):
+
+    def assertCounted(self):
+        """ Check that all the counters have the number of rows they count """
+
+        self.assertEqual(repair_all(), {model.__name__: 0 for model in COUNTERS})
+
+    def counter(self, obj):
+        obj.refresh_from_db()
+        return getattr(obj, COUNTERS[type(obj)][0])
+
+    def test_orm_changes(self):
+        git = DataSource.objects.create(name='git')
+        github = DataSource.objects.create(name='github')
+        eco = Ecosystem.objects.create(name='eco')
+        other_eco = Ecosystem.objects.create(name='other')
+        projects = [Project.objects.create(name=name) for name in ['a', 'b', 'c']]
+        repos = [Repository.objects.create(name='https://example.com/%i' % i, data_source=git) for i in range(3)]
+        views = [RepositoryView.objects.create(repository=repo, params='') for repo in repos]
+
+        eco.projects.add(*projects)
+        projects[0].ecosystem_set.add(other_eco)
+        projects[0].repository_views.add(*views)
+        views[0].project_set.add(projects[1])
+        self.assertEqual([self.counter(obj) for obj in [eco, other_eco, git, github]], [3, 1, 3, 0])
+        self.assertEqual([self.counter(project) for project in projects], [3, 1, 0])
+
+        eco.projects.remove(projects[2])
+        # a is removed from both ecosystems
+        projects[0].ecosystem_set.clear()
+        views[0].project_set.clear()
+        self.assertEqual([self.counter(obj) for obj in [eco, other_eco]], [1, 0])
+        self.assertEqual([self.counter(project) for project in projects], [2, 0, 0])
+
+        # The relations removed with the objects
+        eco.projects.add(projects[2])
+        projects[1].delete()
+        views[1].delete()
+        self.assertEqual(self.counter(eco), 1)
+        self.assertEqual(self.counter(projects[0]), 1)
+
+        repos[2].data_source = github
+        repos[2].save()
+        self.assertEqual([self.counter(git), self.counter(github)], [2, 1])
+        repos[2].delete()
+        self.assertEqual([self.counter(projects[0]), self.counter(github)], [0, 0])
+
+        self.assertCounted()
+
+    def test_imports(self):
+        load_projects('projects/projects-release.json', "Test Org")
+        self.assertCounted()
+
+        with open('projects/projects-release.json') as pfile:
+            projects = json.load(pfile)
+        nviews = sum(len(projects['grimoire'][ds]) for ds in projects['grimoire'] if ds != 'meta')
+        grimoire = Project.objects.get(name='grimoire')
+        self.assertEqual(self.counter(grimoire), nviews)
+
+        with tempfile.NamedTemporaryFile('w') as temp:
+            projects['grimoire']['git'] = projects['grimoire']['git'][1:]
+            projects['bestiary'] = {'github': ['https://github.com/chaoss/grimoirelab-bestiary']}
+            json.dump(projects, temp)
+            temp.flush()
+
+            load_projects_incremental(temp.name, "Test Org")
+            load_projects_incremental(temp.name, "Test Org")
+            self.assertEqual(self.counter(grimoire), nviews - 1)
+            self.assertEqual(Ecosystem.objects.get(name="Test Org").nprojects, 2)
+            self.assertCounted()
+
+            del projects['grimoire']
+            temp.seek(0)
+            temp.truncate()
+            json.dump(projects, temp)
+            temp.flush()
+            load_projects_incremental(temp.name, "Test Org")
+            self.assertEqual(Ecosystem.objects.get(name="Test Org").nprojects, 1)
+            self.assertCounted()
+
+        with tempfile.NamedTemporaryFile() as exported:
+            self.assertEqual(export_projects(exported.name, "Test Org"), (1, 1))
+
+    def test_stale_saves(self):
+        """ Saving an instance read before its counter changed keeps the counter """
+
+        load_projects('projects/projects-release.json', "Test Org", bulk=False)
+        self.assertCounted()
+
+        project = Project.objects.get(name='grimoire')
+        nviews = project.nrepository_views
+        project.repository_views.remove(project.repository_views.first())
+        project.save()
+        self.assertEqual(self.counter(project), nviews - 1)
+        self.assertCounted()
+
+    def test_editor(self):
+        """ The editor saves the objects after adding them to others """
+
+        Ecosystem.objects.create(name="Test Org")
+        DataSource.objects.create(name='git')
+        self.client.post('/projects/add_project', {'project_name': 'grimoire', 'eco_name_state': "Test Org"})
+        self.client.post('/projects/add_repository_view',
+                         {'repository': 'https://github.com/chaoss/grimoirelab', 'params': '',
+                          'data_source': 'git', 'projects_state': 'grimoire'})
+
+        self.assertEqual(Ecosystem.objects.get(name="Test Org").nprojects, 1)
+        self.assertEqual(Project.objects.get(name='grimoire').nrepository_views, 1)
+        self.assertCounted()
+
+    def test_repair(self):
+        load_projects('projects/projects-release.json', "Test Org")
+        Ecosystem.objects.update(nprojects=0)
+        Project.objects.update(nrepository_views=7)
+        DataSource.objects.filter(name='git').update(nrepositories=0)
+
+        # The export counts what it writes, even with the counters wrong
+        with tempfile.NamedTemporaryFile() as exported:
+            self.assertEqual(export_projects(exported.name, "Test Org"),
+                             (1, Project.objects.get().repository_views.count()))
+
+        self.assertEqual(repair_all(), {'DataSource': 1, 'Ecosystem': 1, 'Project': 1})
+        self.assertCounted()
+
+    def test_view(self):
+        load_projects('projects/projects-release.json', "Test Org")
+
+        response = self.client.get('/projects/counters', {'ecosystem': "Test Org"})
+        counters = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(counters['ecosystems'], [{'name': "Test Org", 'nprojects': 1}])
+        self.assertEqual(counters['projects'], [{'name': 'grimoire',
+                                                 'nrepository_views': Project.objects.get().repository_views.count()}])
+        nrepositories = [data_source['nrepositories'] for data_source in counters['data_sources']]
+        self.assertEqual(nrepositories, sorted(nrepositories, reverse=True))
+        self.assertEqual(sum(nrepositories), Repository.objects.count())
+
+
+class ConcurrentCountersTests(TransactionTestCase):
+
+    def test_overlapping_batches(self):
+        """ Two batches adding repositories to the same data source count the rows of both """
+
+        git = DataSource.objects.create(name='git')
+        # Both batches add their rows before any of them is counted
+        concurrent = connection.features.has_select_for_update
+        barrier = threading.Barrier(2)
+
+        def add_batch(first):
+            try:
+                with transaction.atomic():
+                    # Like the bulk imports, without signals
+                    Repository.objects.bulk_create([Repository(name='https://example.com/%i' % i, data_source=git)
+                                                    for i in range(first, first + 10)])
+                    if concurrent:
+                        barrier.wait()
+                    update_counters(DataSource, [git.id])
+            finally:
+                if concurrent:
+                    connection.close()
+
+        if concurrent:
+            threads = [threading.Thread(target=add_batch, args=(first,)) for first in (0, 10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            # SQLite serializes the writes
+            add_batch(0)
+            add_batch(10)
+
+        git.refresh_from_db()
+        self.assertEqual(git.nrepositories, 20)
@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import multiprocessing
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import data_cache, identity_map
+from .bestiary_import import insert_ignore, load_projects
+from .data import DataSourcesData, EcosystemsData, ProjectsData, RepositoryViewsData
+from .models import DataSource, Ecosystem, Project, Repository, RepositoryView
+from .views import EditorState
+
+DATA_SOURCES = ["git", "github", "gerrit", "mbox", "jira"]
+# Size of the dataset, which must not change the number of queries
+NVIEWS = 100000
+NPROJECTS = 1000
+
+
+class FetchQueriesTests(TestCase):
+    """ Each fetch is done with one query, whatever the number of views """
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in DATA_SOURCES:
+            DataSource.objects.create(name=name)
+        data_sources = [DataSource.objects.get(name=name).id for name in DATA_SOURCES]
+
+        # The ids follow the numbers of the names
+        insert_ignore(Repository, ['name', 'data_source'],
+                      [("https://bestiary.org/repo-%i" % i, data_sources[i % len(data_sources)]) for i in range(NVIEWS)],
+                      sort_fields=0)
+        repo_ids = Repository.objects.order_by('id').values_list('id', flat=True)
+        insert_ignore(RepositoryView, ['repository', 'params'], [(repo_id, "") for repo_id in repo_ids])
+        insert_ignore(Project, ['name', 'meta_title'], [("project-%i" % i, "") for i in range(NPROJECTS)],
+                      sort_fields=0)
+        project_ids = list(Project.objects.order_by('id').values_list('id', flat=True))
+        view_ids = RepositoryView.objects.order_by('id').values_list('id', flat=True)
+        insert_ignore(Project.repository_views.through, ['project', 'repositoryview'],
+                      [(project_ids[i % NPROJECTS], view_id) for (i, view_id) in enumerate(view_ids)])
+
+        # The ecosystem has the first half of the projects
+        eco = Ecosystem.objects.create(name="Test Org")
+        insert_ignore(Ecosystem.projects.through, ['ecosystem', 'project'],
+                      [(eco.id, project_id) for project_id in project_ids[:NPROJECTS // 2]])
+
+        cls.view_ids = list(view_ids[:3])
+
+    def setUp(self):
+        cache.clear()
+        data_cache.data_cache().clear()
+
+    def fetch(self, fetcher, *attrs, **state):
+        """ Fetch with one query, reading the given attributes of each object """
+
+        with self.assertNumQueries(1):
+            objects = list(fetcher(EditorState(**state)).fetch())
+            for obj in objects:
+                for attr in attrs:
+                    value = obj
+                    for name in attr.split('.'):
+                        value = getattr(value, name)
+        return objects
+
+    def test_data_sources(self):
+        self.assertEqual([ds.name for ds in self.fetch(DataSourcesData, data_sources=["git", "mbox"])],
+                         ["git", "mbox"])
+        self.assertEqual([ds.name for ds in self.fetch(DataSourcesData, repository_views=self.view_ids)],
+                         ["gerrit", "git", "github"])
+        self.assertEqual([ds.name for ds in self.fetch(DataSourcesData, projects=["project-0", "project-1"])],
+                         ["git", "github"])
+        self.assertEqual([ds.name for ds in self.fetch(DataSourcesData, eco_name="Test Org")], sorted(DATA_SOURCES))
+
+    def test_projects(self):
+        self.assertEqual(len(self.fetch(ProjectsData)), NPROJECTS)
+        self.assertEqual([p.name for p in self.fetch(ProjectsData, projects=["project-1"])], ["project-1"])
+        self.assertEqual([p.name for p in self.fetch(ProjectsData, repository_views=self.view_ids)],
+                         ["project-0", "project-1", "project-2"])
+        # Projects whose views have git repositories
+        self.assertEqual(len(self.fetch(ProjectsData, data_sources=["git"])), NPROJECTS // len(DATA_SOURCES))
+        self.assertEqual(len(self.fetch(ProjectsData, eco_name="Test Org")), NPROJECTS // 2)
+
+    def test_repository_views(self):
+        attrs = ('repository.name', 'repository.data_source.name')
+
+        self.assertEqual(len(self.fetch(RepositoryViewsData, *attrs)), NVIEWS)
+        self.assertEqual([view.id for view in self.fetch(RepositoryViewsData, *attrs, repository_views=self.view_ids)],
+                         self.view_ids)
+        self.assertEqual(len(self.fetch(RepositoryViewsData, *attrs, projects=["project-0"])), NVIEWS // NPROJECTS)
+        self.assertEqual(len(self.fetch(RepositoryViewsData, *attrs, projects=["project-0"], data_sources=["git"])),
+                         NVIEWS // NPROJECTS)
+        self.assertEqual(len(self.fetch(RepositoryViewsData, *attrs, projects=["project-0"], data_sources=["jira"])), 0)
+        self.assertEqual(len(self.fetch(RepositoryViewsData, *attrs, data_sources=["git"])),
+                         NVIEWS // len(DATA_SOURCES))
+        self.assertEqual(len(self.fetch(RepositoryViewsData, *attrs, eco_name="Test Org")), NVIEWS // 2)
+
+
+class DataCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.data_cache().clear()
+        data_cache.reset_stats()
+
+        self.eco = Ecosystem.objects.create(name="Test Org")
+        self.git = DataSource.objects.create(name="git")
+        self.projects = []
+        for name in ("bestiary", "perceval"):
+            project = Project.objects.create(name=name)
+            repo = Repository.objects.create(name="https://github.com/chaoss/" + name, data_source=self.git)
+            project.repository_views.add(RepositoryView.objects.create(repository=repo, params=""))
+            self.eco.projects.add(project)
+            self.projects.append(project)
+
+    def fetch(self, fetcher, queries, **state):
+        with self.assertNumQueries(queries):
+            return [str(obj) for obj in fetcher(EditorState(**state)).fetch()]
+
+    def test_invalidation(self):
+        self.assertEqual(self.fetch(ProjectsData, 1, eco_name="Test Org"), ["bestiary", "perceval"])
+        self.assertEqual(self.fetch(ProjectsData, 0, eco_name="Test Org"), ["bestiary", "perceval"])
+        self.assertEqual(self.fetch(EcosystemsData, 1), ["Test Org"])
+        views = {name: self.fetch(RepositoryViewsData, 1, projects=[name]) for name in ("bestiary", "perceval")}
+
+        # Only the views of the project changed are fetched again
+        view = self.projects[0].repository_views.get()
+        view.params = "--category pull_request"
+        view.save()
+        self.assertEqual(self.fetch(RepositoryViewsData, 1, projects=["bestiary"]),
+                         ["https://github.com/chaoss/bestiary --category pull_request"])
+        self.assertEqual(self.fetch(RepositoryViewsData, 0, projects=["perceval"]), views["perceval"])
+        self.assertEqual(self.fetch(EcosystemsData, 0), ["Test Org"])
+
+        self.projects[1].repository_views.clear()
+        self.assertEqual(self.fetch(RepositoryViewsData, 1, projects=["perceval"]), [])
+        self.assertEqual(self.fetch(DataSourcesData, 1, projects=["perceval"]), [])
+
+        self.eco.projects.remove(self.projects[1])
+        self.assertEqual(self.fetch(ProjectsData, 1, eco_name="Test Org"), ["bestiary"])
+
+        Project.objects.create(name="grimoirelab")
+        self.assertEqual(self.fetch(ProjectsData, 1), ["bestiary", "grimoirelab", "perceval"])
+
+        # A data source could change the views of any project
+        self.fetch(RepositoryViewsData, 0, projects=["bestiary"])
+        self.git.save()
+        self.fetch(RepositoryViewsData, 1, projects=["bestiary"])
+
+        self.fetch(ProjectsData, 1)
+
+        # The bulk imports skip the signals
+        self.fetch(ProjectsData, 0)
+        load_projects('projects/projects-release.json', "Test Org")
+        self.assertIn("grimoire", self.fetch(ProjectsData, 1))
+
+        self.assertEqual(data_cache.stats()['projects'], {'hits': 2, 'misses': 5})
+        self.assertEqual(self.client.get('/projects/data_cache_stats').json()['ecosystems'], {'hits': 1, 'misses': 1})
+
+    def test_invalidation_from_other_process(self):
+        """ The lists changed by other processes, like the import workers, are not served """
+
+        self.fetch(EcosystemsData, 1)
+        self.fetch(EcosystemsData, 0)
+
+        process = multiprocessing.get_context('fork').Process(target=data_cache.invalidate, args=('ecosystems',))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+
+        self.fetch(EcosystemsData, 1)
+
+    def test_warm_up(self):
+        data_cache.warm_up()
+
+        self.fetch(EcosystemsData, 0)
+        self.fetch(ProjectsData, 0)
+        self.fetch(ProjectsData, 0, eco_name="Test Org")
+        self.fetch(DataSourcesData, 0, eco_name="Test Org")
+        self.fetch(RepositoryViewsData, 0, projects=["perceval"])
+
+
+class IdentityMapTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.data_cache().clear()
+        load_projects('projects/projects-release.json', "Test Org")
+
+    def test_get(self):
+        with identity_map.activate():
+            with self.assertNumQueries(1):
+                project = identity_map.get(Project, name="grimoire")
+                self.assertIs(identity_map.get(Project, name="grimoire"), project)
+                self.assertIs(identity_map.get(Project, id=str(project.id)), project)
+
+            # The objects fetched are registered too
+            views = list(RepositoryViewsData(EditorState(projects=["grimoire"])).fetch())
+            with self.assertNumQueries(0):
+                self.assertIs(identity_map.get(RepositoryView, id=views[0].id), views[0])
+                self.assertIs(identity_map.get(RepositoryView, repository=views[0].repository,
+                                               params=views[0].params), views[0])
+                self.assertEqual(list(RepositoryViewsData(EditorState(projects=["grimoire"])).fetch()), views)
+
+            # Until an object changes
+            project.save()
+            with self.assertNumQueries(1):
+                self.assertIsNot(identity_map.get(Project, name="grimoire"), project)
+
+            with self.assertRaises(Project.DoesNotExist):
+                identity_map.get(Project, name="perceval")
+
+        with self.assertNumQueries(2):
+            identity_map.get(Project, name="grimoire")
+            identity_map.get(Project, name="grimoire")
+
+    def test_editor_request(self):
+        """ Queries of an editor interaction, with and without the identity map """
+
+        def select_project():
+            cache.clear()
+            data_cache.data_cache().clear()
+            # The middleware of a client is loaded in its first request
+            client = Client()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post('/projects/editor_select_project',
+                                       {'name': 'grimoire', 'eco_name_state': 'Test Org'})
+            self.assertEqual(response.status_code, 200)
+            return [query['sql'] for query in queries]
+
+        queries = select_project()
+        middleware = [name for name in settings.MIDDLEWARE if not name.endswith('IdentityMapMiddleware')]
+        with override_settings(MIDDLEWARE=middleware):
+            queries_without_map = select_project()
+
+        self.assertLess(len(queries), len(queries_without_map))
+        # Each object is loaded once
+        project_queries = [query for query in queries if query.startswith('SELECT') and
+                           'FROM "projects_project" WHERE "projects_project"."name" =' in query]
+        self.assertLessEqual(len(project_queries), 1)
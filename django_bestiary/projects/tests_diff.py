@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import json
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from .bestiary_import import check_projects, load_projects
+from .models import Project
+from .projects_diff import ProjectsDiff, diff_projects_files
+
+
+class ProjectsDiffTests(SimpleTestCase):
+
+    def diff(self, old, new):
+        diff = ProjectsDiff(lambda: iter(old.items()), lambda: iter(new.items()))
+        return (list(diff.differences()), diff.stats)
+
+    def test_equal(self):
+        old = {
+            "bestiary": {"meta": {"title": "Bestiary"}, "git": ["https://github.com/chaoss/a", "https://github.com/chaoss/b"]},
+            "perceval": {"meta": "Perceval", "github": [], "git": ["https://github.com/chaoss/perceval"]}
+        }
+        # Order, whitespace, repeated lines and empty data sources are not differences
+        new = {
+            "perceval": {"meta": {"title": "Perceval"}, "git": ["https://github.com/chaoss/perceval "]},
+            "bestiary": {"git": ["https://github.com/chaoss/b", "https://github.com/chaoss/a", "https://github.com/chaoss/b"],
+                         "meta": {"title": "Bestiary"}}
+        }
+
+        (differences, stats) = self.diff(old, new)
+        self.assertEqual(differences, [])
+        self.assertEqual(stats['projects_unchanged'], 2)
+
+    def test_differences(self):
+        old = {
+            "bestiary": {"meta": {"title": "Bestiary"}, "git": ["https://github.com/chaoss/a", "https://github.com/chaoss/b"]},
+            "removed": {"git": ["https://github.com/chaoss/removed"]},
+            "same": {"git": ["https://github.com/chaoss/same"]}
+        }
+        new = {
+            "added": {"git": ["https://github.com/chaoss/added"]},
+            "same": {"git": ["https://github.com/chaoss/same"]},
+            "bestiary": {"meta": {"title": "The Bestiary"}, "git": ["https://github.com/chaoss/a"],
+                         "github": ["https://github.com/chaoss/c"]}
+        }
+
+        (differences, stats) = self.diff(old, new)
+        self.assertEqual(differences, [
+            {"project": "added", "status": "added"},
+            {"project": "bestiary", "status": "changed",
+             "meta": {"old": {"title": "Bestiary"}, "new": {"title": "The Bestiary"}},
+             "data_sources": {"git": {"added": [], "removed": ["https://github.com/chaoss/b"]},
+                              "github": {"added": ["https://github.com/chaoss/c"], "removed": []}}},
+            {"project": "removed", "status": "removed"}
+        ])
+        self.assertEqual(stats, {'projects_unchanged': 1, 'projects_added': 1, 'projects_removed': 1,
+                                 'projects_changed': 1, 'lines_added': 2, 'lines_removed': 2})
+
+    def test_replaced(self):
+        """ A project replaced by another one is removed, even if there are as many projects """
+
+        old = {"a": {"git": ["https://github.com/chaoss/a"]}, "b": {"git": ["https://github.com/chaoss/b"]}}
+        new = {"a": {"git": ["https://github.com/chaoss/a"]}, "c": {"git": ["https://github.com/chaoss/c"]}}
+
+        (differences, stats) = self.diff(old, new)
+        self.assertEqual(differences, [{"project": "c", "status": "added"},
+                                       {"project": "b", "status": "removed"}])
+        self.assertEqual(stats['projects_removed'], 1)
+
+    def test_files(self):
+        with open('projects/projects-release.json') as pfile:
+            projects = json.load(pfile)
+        projects.pop("grimoire")
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as new_file:
+            json.dump(projects, new_file)
+            new_file.flush()
+            (differences, stats) = diff_projects_files('projects/projects-release.json', new_file.name)
+
+        self.assertEqual(differences, [{"project": "grimoire", "status": "removed"}])
+        self.assertEqual(stats['projects_unchanged'], len(projects))
+
+
+class CheckProjectsTests(TestCase):
+
+    def test_check(self):
+        load_projects('projects/projects-release.json', "Test Org")
+        (differences, _) = check_projects('projects/projects-release.json', "Test Org")
+        self.assertEqual(differences, [])
+
+        Project.objects.get(name="grimoire").repository_views.all().delete()
+        (differences, _) = check_projects('projects/projects-release.json', "Test Org")
+        self.assertEqual([(difference['project'], difference['status']) for difference in differences],
+                         [("grimoire", "changed")])
+        self.assertTrue(all(not lines['added'] for lines in differences[0]['data_sources'].values()))
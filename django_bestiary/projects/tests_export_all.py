@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from django.test import TestCase, override_settings
+
+from .bestiary_export_all import export_ecosystems, hash_file
+from .bestiary_import import load_projects
+from .models import Ecosystem
+
+
+@override_settings(BESTIARY_EXPORT_WORKERS=1)
+class ExportAllTests(TestCase):
+
+    projects_file = 'projects/projects-release.json'
+
+    def setUp(self):
+        load_projects(self.projects_file, "Test Org")
+        load_projects(self.projects_file, "Test/Org")
+
+    def test_export_ecosystems(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        manifest = export_ecosystems(directory)
+
+        entries = manifest['ecosystems']
+        self.assertListEqual([entry['ecosystem'] for entry in entries], ["Test Org", "Test/Org"])
+        # The names of the files are safe, and different
+        self.assertListEqual([entry['file'] for entry in entries], ["projects_Test_Org.json", "projects_Test_Org_1.json"])
+
+        with open(self.projects_file) as pfile:
+            projects = json.load(pfile)
+        for entry in entries:
+            path = os.path.join(directory, entry['file'])
+            with open(path) as exported:
+                self.assertDictEqual(json.load(exported), projects)
+            self.assertEqual(entry['sha256'], hash_file(path))
+            self.assertEqual(entry['projects'], 1)
+            self.assertEqual(entry['repository_views'], sum(len(projects['grimoire'][ds])
+                                                            for ds in projects['grimoire'] if ds != 'meta'))
+
+        with open(os.path.join(directory, 'manifest.json')) as mfile:
+            self.assertDictEqual(json.load(mfile), manifest)
+
+        with self.assertRaises(Ecosystem.DoesNotExist):
+            export_ecosystems(directory, ["Other Org"])
+
+    def test_export_all_endpoint(self):
+        response = self.client.get('/projects/export_all/', {'ecosystem': 'Test Org'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as zfile:
+            self.assertListEqual(zfile.namelist(), ['manifest.json', 'projects_Test_Org.json'])
+            exported = json.loads(zfile.read('projects_Test_Org.json').decode('utf-8'))
+        with open(self.projects_file) as pfile:
+            self.assertDictEqual(exported, json.load(pfile))
+
+        response = self.client.get('/projects/export_all/', {'format': 'tar'})
+        with tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content)), mode='r:gz') as tfile:
+            self.assertListEqual(tfile.getnames(), ['manifest.json', 'projects_Test_Org.json',
+                                                    'projects_Test_Org_1.json'])
+
+        self.assertEqual(self.client.get('/projects/export_all/', {'ecosystem': 'Other'}).status_code, 404)
+        self.assertEqual(self.client.get('/projects/export_all/', {'format': 'rar'}).status_code, 400)
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from .bestiary_export import iter_projects_json
+from .bestiary_import import load_projects
+from .models import DataSource, Ecosystem, Project, Repository, RepositoryView
+
+
+class ExportCacheTests(TestCase):
+
+    projects_file = 'projects/projects-release.json'
+    export_url = '/projects/export/ecosystem=Test Org'
+
+    def setUp(self):
+        cache.clear()
+
+    def version(self, name="Test Org"):
+        return Ecosystem.objects.get(name=name).export_version
+
+    def test_signals(self):
+        eco = Ecosystem.objects.create(name="Test Org")
+        other = Ecosystem.objects.create(name="Other Org")
+        project = Project.objects.create(name="grimoire")
+        version = self.version()
+
+        eco.projects.add(project)
+        self.assertGreater(self.version(), version)
+        self.assertEqual(self.version("Other Org"), 0)
+
+        data_source = DataSource.objects.create(name="git")
+        repo = Repository.objects.create(name="https://github.com/chaoss/grimoirelab", data_source=data_source)
+        view = RepositoryView.objects.create(repository=repo, params="")
+
+        for change in (lambda: project.repository_views.add(view),
+                       lambda: view.save(),
+                       lambda: repo.save(),
+                       lambda: project.save(),
+                       lambda: data_source.save(),
+                       lambda: view.project_set.clear(),
+                       lambda: project.ecosystem_set.clear()):
+            version = self.version()
+            change()
+            self.assertGreater(self.version(), version)
+
+        self.assertEqual(self.version("Other Org"), 0)
+
+        # Bulk imports skip the signals, so they bump the versions themselves
+        other.projects.add(project)
+        (eco_version, other_version) = (self.version(), self.version("Other Org"))
+        load_projects(self.projects_file, "Other Org")
+        self.assertEqual(self.version(), eco_version)
+        self.assertGreater(self.version("Other Org"), other_version)
+
+    def test_conditional_export(self):
+        load_projects(self.projects_file, "Test Org")
+
+        response = self.client.get(self.export_url)
+        content = b''.join(response.streaming_content)
+        etag = response['ETag']
+        self.assertEqual(response['Last-Modified'], http_date(Ecosystem.objects.get(name="Test Org")
+                                                              .updated_at.timestamp()))
+
+        # Not modified: only the ecosystem is read
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.export_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('projects_ecosystem', queries[0]['sql'])
+
+        response = self.client.get(self.export_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # The gzipped file has its own ETag
+        response = self.client.get(self.export_url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Cached: the repository views are not read again
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.export_url)
+            self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertFalse([query for query in queries if 'projects_repositoryview' in query['sql']])
+
+        # A change in the ecosystem gives a new version of the file
+        project = Project.objects.get(name="grimoire")
+        project.meta_title = "Grimoire"
+        project.save()
+
+        response = self.client.get(self.export_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'"title": "Grimoire"', b''.join(response.streaming_content))
+
+    def test_rename(self):
+        """ The name of the ecosystem is exported, so renaming it gives a new version of the files """
+
+        load_projects(self.projects_file, "Test Org")
+        response = self.client.get(self.export_url, {'format': 'tsv'})
+        etag = response['ETag']
+        self.assertIn(b'Test Org\tgrimoire', b''.join(response.streaming_content))
+
+        # An instance read before other changes
+        eco = Ecosystem.objects.get(name="Test Org")
+        Project.objects.get(name="grimoire").save()
+        version = self.version()
+        eco.name = "New Org"
+        eco.save()
+        self.assertEqual(self.version("New Org"), version + 1)
+
+        response = self.client.get('/projects/export/ecosystem=New Org', {'format': 'tsv'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertIn(b'New Org\tgrimoire', content)
+        self.assertNotIn(b'Test Org', content)
+
+        # Other saves keep the version
+        eco.save()
+        self.assertEqual(self.version("New Org"), version + 1)
+
+    def test_project_fragments(self):
+        load_projects(self.projects_file, "Test Org")
+        eco_orm = Ecosystem.objects.get(name="Test Org")
+        cold = ''.join(iter_projects_json(eco_orm))
+
+        self.assertEqual(''.join(iter_projects_json(eco_orm, cache=cache)), cold)
+
+        # Only the views of the changed project are read again
+        project = Project.objects.get(name="grimoire")
+        project.meta_title = "Grimoire"
+        project.save()
+        eco_orm.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as queries:
+            warm = ''.join(iter_projects_json(eco_orm, cache=cache))
+        self.assertEqual(warm, ''.join(iter_projects_json(eco_orm)))
+        self.assertNotEqual(warm, cold)
+        views_queries = [query['sql'] for query in queries if 'projects_repositoryview' in query['sql']]
+        self.assertEqual(len(views_queries), 1)
+        self.assertIn('IN (%i)' % project.id, views_queries[0])
+
+    def test_stale_project(self):
+        """ Saving a project read before other changes gives a new version of its fragment """
+
+        load_projects(self.projects_file, "Test Org")
+        stale = Project.objects.get(name="grimoire")
+
+        # Other change of the project, exported with the cache
+        Project.objects.get(name="grimoire").repository_views.remove(stale.repository_views.first())
+        eco_orm = Ecosystem.objects.get(name="Test Org")
+        ''.join(iter_projects_json(eco_orm, cache=cache))
+
+        stale.meta_title = "Grimoire"
+        stale.save()
+        eco_orm.refresh_from_db()
+
+        warm = ''.join(iter_projects_json(eco_orm, cache=cache))
+        self.assertIn('"title": "Grimoire"', warm)
+        self.assertEqual(warm, ''.join(iter_projects_json(eco_orm)))
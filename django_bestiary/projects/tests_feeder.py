@@ -24,15 +24,19 @@
 #
 
 
+import gzip
 import json
 import tempfile
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from .models import Ecosystem, Project, Repository, RepositoryView, DataSource
+from .models import Ecosystem, ImportRun, Project, Repository, RepositoryView, DataSource
 
-from .bestiary_import import load_projects, list_not_ds_fields, find_repo_name
-from .bestiary_export import export_projects
+from .bestiary_import import (BulkLoader, insert_ignore, load_projects, load_projects_incremental,
+                              list_not_ds_fields, find_repo_name, hash_file, iter_parsed_projects, unique)
+from .bestiary_export import EXPORT_FORMATS, export_projects, fetch_projects, iter_export, iter_projects_json
 
 
 class BeastFeederTests(TestCase):
@@ -85,6 +89,174 @@ class BeastFeederTests(TestCase):
         self.assertEqual(total_repos, read_repos)
         self.assertEqual(total_repository_views, read_repository_views)
 
+    def test_bulk_load(self):
+        projects_file = 'projects/projects-release.json'
+
+        loaded = load_projects(projects_file, "Test Org", bulk=False)
+        objects = [model.objects.count() for model in (Project, DataSource, Repository, RepositoryView)]
+        views = sorted(Project.repository_views.through.objects.values_list('project__name', 'repositoryview_id'))
+
+        # Loading again in bulk must reuse all the objects already added
+        loaded_bulk = load_projects(projects_file, "Test Org")
+        objects_bulk = [model.objects.count() for model in (Project, DataSource, Repository, RepositoryView)]
+        views_bulk = sorted(Project.repository_views.through.objects.values_list('project__name', 'repositoryview_id'))
+
+        self.assertEqual(loaded, loaded_bulk)
+        self.assertEqual(objects, objects_bulk)
+        self.assertEqual(views, views_bulk)
+
+        # A new ecosystem with the same projects only adds the ecosystem
+        load_projects(projects_file, "Test Org 2")
+        self.assertEqual(Ecosystem.objects.count(), 2)
+        self.assertEqual(Ecosystem.objects.get(name="Test Org 2").projects.count(), loaded[0])
+        self.assertEqual(RepositoryView.objects.count(), objects[3])
+
+    def test_insert_ignore(self):
+        DataSource.objects.create(name='git')
+
+        # Rows already added, maybe by another import, are skipped
+        inserted = insert_ignore(DataSource, ['name'], [('git',), ('github',), ('jira',)], batch_size=2)
+        self.assertEqual(inserted, 2)
+        self.assertListEqual(sorted(DataSource.objects.values_list('name', flat=True)), ['git', 'github', 'jira'])
+        self.assertIsNotNone(DataSource.objects.get(name='jira').created_at)
+
+        git = DataSource.objects.get(name='git')
+        rows = [('repo', git.id), ('repo', git.id)]
+        self.assertEqual(insert_ignore(Repository, ['name', 'data_source'], rows), 1)
+        self.assertEqual(insert_ignore(Repository, ['name', 'data_source'], rows), 0)
+
+        # The rows are inserted sorted, unless their order is kept
+        names = Repository.objects.exclude(name='repo').order_by('id').values_list('name', flat=True)
+        insert_ignore(Repository, ['name', 'data_source'], [('c', git.id), ('a', git.id), ('b', git.id)])
+        self.assertListEqual(list(names), ['a', 'b', 'c'])
+        insert_ignore(Repository, ['name', 'data_source'], [('f', git.id), ('d', git.id), ('e', git.id)], sort_fields=0)
+        self.assertListEqual(list(names.all()), ['a', 'b', 'c', 'f', 'd', 'e'])
+
+    def test_parse_chunks(self):
+        projects_file = 'projects/projects-release.json'
+        projects = ', '.join('"p%i": {"git": ["https://github.com/org/repo%i"]}' % (i, i) for i in range(5))
+
+        with open(projects_file) as pfile:
+            parsed = list(iter_parsed_projects(pfile))
+        self.assertEqual(len(parsed), 1)
+
+        # The rows of the projects of each chunk, in the order of the file
+        with tempfile.NamedTemporaryFile('w') as pfile:
+            pfile.write('{' + projects + '}')
+            pfile.flush()
+            with open(pfile.name) as chunks_file:
+                parsed = list(iter_parsed_projects(chunks_file, chunk_size=2))
+        self.assertEqual([[row[0] for row in rows] for (rows, _) in parsed], [['p0', 'p1'], ['p2', 'p3'], ['p4']])
+
+        loaded = load_projects(projects_file, "Test Org")
+        self.assertEqual(loaded, (1, RepositoryView.objects.count()))
+
+    def test_incremental_load(self):
+        pfile = 'projects/projects-release.json'
+
+        with open(pfile) as orig:
+            projects = json.load(orig)
+        nviews = sum(len(projects['grimoire'][ds]) for ds in projects['grimoire'])
+
+        delta = load_projects_incremental(pfile, "Test Org")
+        self.assertEqual(delta['projects_added'], 1)
+        self.assertEqual(delta['views_added'], nviews)
+        self.assertEqual(Project.objects.get(name='grimoire').repository_views.count(), nviews)
+
+        # The same file is skipped
+        delta = load_projects_incremental(pfile, "Test Org")
+        self.assertTrue(delta['skipped'])
+
+        projects['grimoire']['stackexchange'].remove('https://stackoverflow.com/questions/tagged/rdo')
+        projects['grimoire']['git'].append('https://github.com/chaoss/grimoirelab-bestiary')
+        projects['bestiary'] = {'meta': {'title': 'Bestiary'}, 'github': ['https://github.com/chaoss/grimoirelab-bestiary']}
+
+        with tempfile.NamedTemporaryFile('w') as temp:
+            json.dump(projects, temp)
+            temp.flush()
+
+            delta = load_projects_incremental(temp.name, "Test Org", dry_run=True)
+            self.assertEqual(delta['projects_added'], 1)
+            self.assertEqual(delta['projects_changed'], 1)
+            self.assertEqual(delta['views_added'], 2)
+            self.assertEqual(delta['views_unlinked'], 1)
+            self.assertEqual(Project.objects.count(), 1)
+
+            delta = load_projects_incremental(temp.name, "Test Org")
+            self.assertEqual(delta['views_added'], 2)
+            self.assertEqual(delta['views_unlinked'], 1)
+
+            with tempfile.NamedTemporaryFile() as exported:
+                export_projects(exported.name, "Test Org")
+                with open(exported.name) as exported_file:
+                    self.assertDictEqual(json.load(exported_file), projects)
+
+            del projects['grimoire']
+            temp.seek(0)
+            temp.truncate()
+            json.dump(projects, temp)
+            temp.flush()
+
+            delta = load_projects_incremental(temp.name, "Test Org")
+            self.assertEqual(delta['projects_unchanged'], 1)
+            self.assertEqual(delta['projects_removed'], 1)
+            self.assertListEqual([project.name for project in Ecosystem.objects.get(name="Test Org").projects.all()],
+                                 ['bestiary'])
+
+    def test_import_runs(self):
+        """ Only the imports with checkpoints are recorded """
+
+        load_projects('projects/projects-release.json', "Test Org")
+        self.assertFalse(ImportRun.objects.exists())
+
+        load_projects('projects/projects-release.json', "Test Org", checkpoint=True)
+        run = ImportRun.objects.get()
+        self.assertTrue(run.finished)
+        self.assertEqual(run.last_project, "grimoire")
+
+    def test_unique(self):
+        self.assertListEqual(unique(['b', 'a', 'b', 'c', 'a']), ['b', 'a', 'c'])
+
+    def test_resume_load(self):
+        with open('projects/projects-release.json') as orig:
+            release = json.load(orig)['grimoire']
+        # A project for each data source
+        projects = {data_source: {data_source: lines} for (data_source, lines) in release.items()}
+
+        def interrupted(parsed, nchunks):
+            for (nchunk, chunk) in enumerate(parsed):
+                if nchunk == nchunks:
+                    raise RuntimeError("Import interrupted")
+                yield chunk
+
+        with tempfile.NamedTemporaryFile('w') as temp:
+            json.dump(projects, temp)
+            temp.flush()
+
+            run = ImportRun.objects.create(ecosystem=Ecosystem.objects.create(name="Test Org"),
+                                           file_hash=hash_file(temp.name))
+            with open(temp.name) as pfile:
+                parsed = iter_parsed_projects(pfile, chunk_size=1)
+                with self.assertRaises(RuntimeError):
+                    BulkLoader("Test Org", projects_batch_size=2).load(interrupted(parsed, 7), run)
+
+            run.refresh_from_db()
+            self.assertFalse(run.finished)
+            self.assertEqual(run.last_project, list(projects)[5])
+            self.assertEqual(Ecosystem.objects.get(name="Test Org").projects.count(), 6)
+
+            loaded = load_projects(temp.name, "Test Org", resume=True)
+            self.assertEqual(loaded, (len(projects), sum(len(lines) for lines in release.values())))
+
+            run.refresh_from_db()
+            self.assertTrue(run.finished)
+            self.assertEqual(run.last_project, list(projects)[-1])
+
+            with tempfile.NamedTemporaryFile() as exported:
+                export_projects(exported.name, "Test Org")
+                with open(exported.name) as exported_file:
+                    self.assertDictEqual(json.load(exported_file), projects)
+
     def test_import_export(self):
         pfile = 'projects/projects-release.json'
         pfile_export = '/tmp/projects-release.json'
@@ -105,3 +277,111 @@ class BeastFeederTests(TestCase):
             self.maxDiff = 1000000
             print("Comparing projects contents between imported and exported")
             self.assertDictEqual(orig_json, exported_json)
+
+    def test_export_queries(self):
+        """ The exports read the same number of rows whatever the size of the ecosystem """
+
+        def projects_file(nprojects):
+            return {"project %i" % i: {"meta": {"title": "Project %i" % i},
+                                       "git": ["https://github.com/org/repo%i-%i" % (i, j) for j in range(1 + i % 3)],
+                                       "github": ["https://github.com/org/repo%i" % i]}
+                    for i in range(nprojects)}
+
+        projects = {}
+        for (name, nprojects) in (("Small Org", 50), ("Big Org", 2000)):
+            projects[name] = projects_file(nprojects)
+            with tempfile.NamedTemporaryFile('w') as pfile:
+                json.dump(projects[name], pfile)
+                pfile.flush()
+                load_projects(pfile.name, name)
+
+        small_orm = Ecosystem.objects.get(name="Small Org")
+        big_orm = Ecosystem.objects.get(name="Big Org")
+
+        # The projects and their repository views
+        for export_format in EXPORT_FORMATS:
+            for descendants in (False, True):
+                with CaptureQueriesContext(connection) as small_queries:
+                    small = ''.join(iter_export(small_orm, export_format, descendants=descendants))
+                with CaptureQueriesContext(connection) as big_queries:
+                    big = ''.join(iter_export(big_orm, export_format, descendants=descendants))
+                self.assertEqual(len(small_queries), len(big_queries))
+                self.assertLessEqual(len(big_queries), 2)
+                self.assertGreater(len(big), len(small))
+
+        with self.assertNumQueries(2):
+            big_projects = json.loads(''.join(iter_export(big_orm)))
+        self.assertDictEqual(big_projects, projects["Big Org"])
+
+        # The ecosystem too
+        with self.assertNumQueries(3):
+            self.assertDictEqual(fetch_projects("Big Org"), projects["Big Org"])
+        with self.assertRaises(Ecosystem.DoesNotExist):
+            fetch_projects("Missing Org")
+
+    def test_export_stream(self):
+        load_projects('projects/projects-release.json', "Test Org")
+        eco_orm = Ecosystem.objects.get(name="Test Org")
+        Ecosystem.objects.create(name="Empty Org")
+
+        with open('projects/projects-release.json') as pfile:
+            expected = json.dumps(json.load(pfile), indent=True, sort_keys=True)
+        # Chunks of one project at most
+        self.assertEqual(''.join(iter_projects_json(eco_orm, chunk_size=1)), expected)
+        self.assertEqual(''.join(iter_projects_json(Ecosystem.objects.get(name="Empty Org"))), '{}')
+
+        response = self.client.get('/projects/export/ecosystem=Test Org')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8'), expected)
+
+        response = self.client.get('/projects/export/ecosystem=Test Org', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode('utf-8'), expected)
+
+        # The codings refused, or other than gzip
+        for accept_encoding in ('gzip;q=0', 'gzip; q=0.0, deflate', 'x-gzip', 'deflate, *;q=0', 'gzip;q=x'):
+            response = self.client.get('/projects/export/ecosystem=Test Org', HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+        for accept_encoding in ('GZIP;q=0.5', 'deflate, *', 'gzip;q=1, *;q=0'):
+            response = self.client.get('/projects/export/ecosystem=Test Org', HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        self.assertEqual(self.client.get('/projects/export/ecosystem=Other Org').status_code, 404)
+
+    def test_export_formats(self):
+        load_projects('projects/projects-release.json', "Test Org")
+        eco_orm = Ecosystem.objects.get(name="Test Org")
+        with open('projects/projects-release.json') as pfile:
+            projects = json.load(pfile)
+
+        lines = ''.join(iter_export(eco_orm, 'ndjson', chunk_size=1)).splitlines()
+        self.assertEqual(len(lines), len(projects))
+        merged = {}
+        for line in lines:
+            merged.update(json.loads(line))
+        self.assertEqual(merged, projects)
+
+        views = [json.loads(line) for line in ''.join(iter_export(eco_orm, 'ndjson-views')).splitlines()]
+        nviews = RepositoryView.objects.filter(project__ecosystem=eco_orm).count()
+        self.assertEqual(len(views), nviews)
+        self.assertEqual(set(view['ecosystem'] for view in views), {"Test Org"})
+        self.assertEqual(sorted(views, key=lambda view: view['project']), views)
+
+        rows = ''.join(iter_export(eco_orm, 'tsv')).splitlines()
+        self.assertEqual(rows[0].split('\t'), ['ecosystem', 'project', 'data_source', 'repo', 'params'])
+        self.assertEqual([row.split('\t') for row in rows[1:]],
+                         [[view[field] for field in ('ecosystem', 'project', 'data_source', 'repo', 'params')]
+                          for view in views])
+
+        response = self.client.get('/projects/export/ecosystem=Test Org', {'format': 'tsv'})
+        self.assertEqual(response['Content-Type'], 'text/tab-separated-values; charset=utf-8')
+        self.assertEqual(b''.join(response.streaming_content).decode('utf-8').splitlines(), rows)
+        etag = response['ETag']
+
+        response = self.client.get('/projects/export/ecosystem=Test Org', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.get('/projects/export/ecosystem=Test Org', {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import random
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import data_cache
+from .bestiary_export import iter_export
+from .data import ProjectsData, RepositoryViewsData
+from .hierarchy import ecosystem_projects, rebuild, with_descendants
+from .models import (DataSource, Ecosystem, EcosystemClosure, Project, ProjectClosure,
+                     Repository, RepositoryView)
+from .views import EditorState
+
+
+def closure_names(closure):
+    return sorted(closure.objects.values_list('ancestor__name', 'descendant__name'))
+
+
+class HierarchyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        data_cache.data_cache().clear()
+        data_source = DataSource.objects.create(name='git')
+
+        # root > a > b > c, and each project has a repository view
+        self.projects = {}
+        for name in ['root', 'a', 'b', 'c', 'other']:
+            project = Project.objects.create(name=name, meta_title=name.upper())
+            repo = Repository.objects.create(name='https://example.com/' + name, data_source=data_source)
+            project.repository_views.add(RepositoryView.objects.create(repository=repo, params=''))
+            self.projects[name] = project
+        for (parent, child) in [('root', 'a'), ('a', 'b'), ('b', 'c')]:
+            self.projects[parent].subprojects.add(self.projects[child])
+
+        self.eco = Ecosystem.objects.create(name='eco')
+        self.eco.projects.add(self.projects['root'])
+        self.subeco = Ecosystem.objects.create(name='subeco')
+        self.subeco.projects.add(self.projects['other'])
+        self.eco.subecos.add(self.subeco)
+
+    def test_closure(self):
+        self.assertEqual(closure_names(ProjectClosure),
+                         [('a', 'b'), ('a', 'c'), ('b', 'c'), ('root', 'a'), ('root', 'b'), ('root', 'c')])
+        self.assertEqual(closure_names(EcosystemClosure), [('eco', 'subeco')])
+
+        # Other path to c, removing one of them keeps c below root
+        self.projects['root'].subprojects.add(self.projects['c'])
+        self.projects['b'].subprojects.remove(self.projects['c'])
+        self.assertEqual(closure_names(ProjectClosure),
+                         [('a', 'b'), ('root', 'a'), ('root', 'b'), ('root', 'c')])
+
+        # Linked from the child side
+        self.projects['c'].project_set.add(self.projects['b'])
+        self.assertIn(('a', 'c'), closure_names(ProjectClosure))
+
+        # The paths through a removed project are removed too
+        self.projects['a'].delete()
+        self.assertEqual(closure_names(ProjectClosure), [('b', 'c'), ('root', 'c')])
+        self.assertEqual(rebuild(Project), (0, 0))
+
+        # A broken closure table is repaired
+        ProjectClosure.objects.all().delete()
+        self.assertEqual(rebuild(Project), (2, 0))
+        self.assertEqual(closure_names(ProjectClosure), [('b', 'c'), ('root', 'c')])
+
+    def test_removals(self):
+        """ The rows removed with the links are the ones a full rebuild would remove """
+
+        rnd = random.Random(1)
+        projects = [Project.objects.create(name='p%i' % i) for i in range(30)]
+        # Links only from a project to the ones after it, so there are no cycles
+        for (i, project) in enumerate(projects[:-1]):
+            project.subprojects.add(*rnd.sample(projects[i + 1:], min(3, len(projects) - i - 1)))
+
+        for step in range(40):
+            project = rnd.choice(projects)
+            subprojects = list(project.subprojects.all())
+            if step % 5 == 4:
+                project.project_set.clear()
+            elif step % 5 == 3:
+                # Links that do not exist, some of them to projects above
+                project.subprojects.remove(*rnd.sample(projects, 3))
+            elif step % 5 == 2:
+                project.project_set.remove(*rnd.sample(projects, 3))
+            elif subprojects:
+                project.subprojects.remove(rnd.choice(subprojects))
+            self.assertEqual(rebuild(Project), (0, 0))
+
+        # A project above the one it is unlinked from
+        self.projects['c'].subprojects.remove(self.projects['a'])
+        self.assertEqual(rebuild(Project), (0, 0))
+
+        projects[10].delete()
+        self.assertEqual(rebuild(Project), (0, 0))
+
+        # Only the rows of the objects unlinked are read
+        with CaptureQueriesContext(connection) as queries:
+            self.projects['b'].subprojects.remove(self.projects['c'])
+        closure_queries = [query['sql'] for query in queries if 'projects_projectclosure' in query['sql']]
+        self.assertTrue(closure_queries)
+        for sql in closure_queries:
+            self.assertIn('WHERE', sql)
+        self.assertEqual(closure_names(ProjectClosure).count(('root', 'c')), 0)
+
+    def test_cycles(self):
+        # As with any error in a query, the links are added in a savepoint to go on after it
+        for (parent, child) in [('c', 'root'), ('b', 'a'), ('a', 'a')]:
+            with self.assertRaises(ValidationError), transaction.atomic():
+                self.projects[parent].subprojects.add(self.projects[child])
+            with self.assertRaises(ValidationError), transaction.atomic():
+                self.projects[child].project_set.add(self.projects[parent])
+
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.subeco.subecos.add(self.eco)
+
+        self.assertFalse(self.projects['c'].subprojects.exists())
+        self.assertFalse(self.subeco.subecos.exists())
+
+    def test_descendants(self):
+        projects = with_descendants(Project.objects.filter(name='a'))
+        self.assertEqual(sorted(projects.values_list('name', flat=True)), ['a', 'b', 'c'])
+
+        # All the repository views under an ecosystem with one query
+        with self.assertNumQueries(1):
+            views = RepositoryView.objects.filter(project__in=ecosystem_projects(Ecosystem.objects.filter(name='eco')))
+            self.assertEqual(len(views), 5)
+
+        state = EditorState(eco_name='eco')
+        self.assertEqual([project.name for project in ProjectsData(state).fetch()], ['root'])
+        self.assertEqual([project.name for project in ProjectsData(state, descendants=True).fetch()],
+                         ['a', 'b', 'c', 'other', 'root'])
+
+        state = EditorState(projects=['b'])
+        self.assertEqual(len(list(RepositoryViewsData(state).fetch())), 1)
+        self.assertEqual(len(list(RepositoryViewsData(state, descendants=True).fetch())), 2)
+
+        # The lists cached are invalidated when the hierarchy changes
+        self.projects['b'].subprojects.remove(self.projects['c'])
+        self.assertEqual(len(list(RepositoryViewsData(state, descendants=True).fetch())), 1)
+
+    def test_export(self):
+        projects = ''.join(iter_export(self.eco, 'ndjson'))
+        self.assertEqual(projects.count('\n'), 1)
+
+        projects = ''.join(iter_export(self.eco, 'ndjson', descendants=True))
+        self.assertEqual([line.split('"')[1] for line in projects.splitlines()], ['a', 'b', 'c', 'other', 'root'])
+        self.assertEqual(''.join(iter_export(self.eco, 'json', cache=cache, descendants=True)).count('"meta"'), 5)
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import concurrent.futures
+import shutil
+import tempfile
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from .bestiary_import_many import import_ecosystem, import_ecosystems
+from .bestiary_import import load_projects
+from .locks import ecosystem_lock
+from .models import DataSource, Ecosystem, Project, Repository, RepositoryView
+
+
+class LocksTests(TransactionTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(BESTIARY_LOCKS_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_ecosystem_lock(self):
+        """ Only one writer holds the lock of an ecosystem, the others wait for it """
+
+        events = []
+        locked = threading.Event()
+        release = threading.Event()
+
+        def writer(ecosystem, name):
+            try:
+                with ecosystem_lock(ecosystem):
+                    events.append(name + ' locked')
+                    locked.set()
+                    release.wait(5)
+                    events.append(name + ' released')
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=writer, args=("Test Org", 'first'))
+        first.start()
+        locked.wait(5)
+
+        # Other ecosystems are not locked
+        with ecosystem_lock("Other Org"):
+            events.append('other locked')
+
+        second = threading.Thread(target=writer, args=("Test Org", 'second'))
+        second.start()
+        second.join(0.5)
+        self.assertTrue(second.is_alive())
+
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(events, ['first locked', 'other locked', 'first released',
+                                  'second locked', 'second released'])
+
+
+class ImportManyTests(TransactionTestCase):
+
+    projects_file = 'projects/projects-release.json'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(BESTIARY_LOCKS_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_import_ecosystems(self):
+        """ The ecosystems imported at the same time share their repositories """
+
+        ecosystems = [("Test Org", self.projects_file), ("Other Org", self.projects_file)]
+        (stats, errors) = import_ecosystems(ecosystems, jobs=2, executor_class=concurrent.futures.ThreadPoolExecutor)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(sorted(stats), ["Other Org", "Test Org"])
+        nrepos = RepositoryView.objects.count()
+        for (nprojects, nrepository_views, _) in stats.values():
+            self.assertEqual((nprojects, nrepository_views), (1, nrepos))
+
+        # The rows are the ones of a single import
+        imported = (Repository.objects.count(), RepositoryView.objects.count(), Project.objects.count())
+        for eco_orm in Ecosystem.objects.all():
+            self.assertEqual(eco_orm.nprojects, 1)
+            self.assertEqual(list(eco_orm.projects.values_list('nrepository_views', flat=True)), [nrepos])
+        self.assertEqual(sum(DataSource.objects.values_list('nrepositories', flat=True)), imported[0])
+
+        load_projects(self.projects_file, "Test Org")
+        self.assertEqual((Repository.objects.count(), RepositoryView.objects.count(), Project.objects.count()),
+                         imported)
+
+    def test_failed_import(self):
+        """ The connection of a process is closed even if its import fails """
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as broken:
+            broken.write('{"grimoire": ')
+            broken.flush()
+            connection.ensure_connection()
+            with self.assertRaises(ValueError):
+                import_ecosystem("Test Org", broken.name)
+
+        self.assertIsNone(connection.connection)
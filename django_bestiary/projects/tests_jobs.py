@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .import_jobs import claim_job, job_progress, job_timeout, queue_import, retry_job, run_next_job
+from .models import Ecosystem, ImportJob, RepositoryView
+
+
+class ImportJobsTests(TestCase):
+
+    projects_file = 'projects/projects-release.json'
+
+    def test_run_job(self):
+        job = queue_import(self.projects_file, "Test Org")
+        self.assertEqual(job.status, ImportJob.QUEUED)
+        self.assertEqual(job_progress(job)['eta'], None)
+
+        job = run_next_job()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.nprojects, 1)
+        self.assertEqual(job.nlines, RepositoryView.objects.count())
+        self.assertEqual(Ecosystem.objects.get(name="Test Org").projects.count(), 1)
+
+        progress = job_progress(ImportJob.objects.get(id=job.id))
+        self.assertEqual(progress['projects'], 1)
+        self.assertEqual(progress['bytes_read'], progress['bytes_total'])
+        self.assertEqual(progress['eta'], 0)
+        self.assertIsNotNone(progress['rate'])
+
+        # The queue is empty now
+        self.assertIsNone(run_next_job())
+
+    def test_failed_job(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        broken = os.path.join(spool_dir, 'projects.json')
+        with open(broken, 'w') as broken_file:
+            broken_file.write('{"grimoire": ')
+
+        queue_import(broken, "Test Org", remove_file=True)
+        job = run_next_job()
+
+        self.assertEqual(job.status, ImportJob.FAILED)
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.finished_at)
+
+        # The file is kept to retry the job
+        self.assertTrue(os.path.exists(broken))
+        shutil.copyfile(self.projects_file, broken)
+        self.assertTrue(retry_job(job.id))
+        job = run_next_job()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.nprojects, 1)
+        self.assertFalse(os.path.exists(broken))
+        self.assertFalse(retry_job(job.id))
+
+    def test_stale_job(self):
+        """ The jobs of the workers that died are run again """
+
+        job = queue_import(self.projects_file, "Test Org")
+        self.assertEqual(claim_job().id, job.id)
+        self.assertIsNone(claim_job())
+
+        dead = timezone.now() - datetime.timedelta(seconds=job_timeout() + 1)
+        ImportJob.objects.filter(id=job.id).update(updated_at=dead)
+        job = run_next_job()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.nprojects, 1)
+
+    def test_claim_job(self):
+        first = queue_import(self.projects_file, "Test Org")
+        second = queue_import(self.projects_file, "Test Org 2")
+
+        # Each job is claimed only once, in the order they were queued
+        self.assertEqual(claim_job().id, first.id)
+        self.assertEqual(claim_job().id, second.id)
+        self.assertIsNone(claim_job())
+        self.assertEqual(ImportJob.objects.filter(status=ImportJob.RUNNING).count(), 2)
+
+    def test_upload(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with open(self.projects_file, 'rb') as pfile:
+            upload = SimpleUploadedFile('projects.json', pfile.read())
+
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post('/projects/import/', {'name': 'Test Org', 'imported_file': upload},
+                                        HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+        # The request returns before the file is imported
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(job['status'], ImportJob.QUEUED)
+        self.assertFalse(Ecosystem.objects.filter(name='Test Org').exists())
+
+        run_next_job()
+
+        response = self.client.get('/projects/import/%i' % job['id'])
+        progress = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(progress['status'], ImportJob.DONE)
+        self.assertEqual(progress['projects'], 1)
+        self.assertEqual(self.client.get('/projects/import/%i' % (job['id'] + 1)).status_code, 404)
+
+    def test_upload_compressed(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with open(self.projects_file, 'rb') as pfile:
+            contents = pfile.read()
+        upload = SimpleUploadedFile('projects.json.gz', gzip.compress(contents))
+
+        with override_settings(MEDIA_ROOT=media_root):
+            self.client.post('/projects/import/', {'name': 'Test Org', 'imported_file': upload},
+                             HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            job = run_next_job()
+
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.nprojects, 1)
+
+        # The uploaded file is removed, only its archived copy is kept
+        self.assertFalse(os.path.exists(job.file_path))
+        self.assertTrue(job.archive_path.endswith('.json.gz'))
+        with open(job.archive_path, 'rb') as archived:
+            self.assertEqual(gzip.decompress(archived.read()), contents)
+
+        with override_settings(MEDIA_ROOT=media_root, BESTIARY_ARCHIVE_IMPORTS=False):
+            upload.seek(0)
+            self.client.post('/projects/import/', {'name': 'Test Org', 'imported_file': upload},
+                             HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            job = run_next_job()
+
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertEqual(job.archive_path, '')
+        self.assertFalse(os.path.exists(job.file_path))
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+
+import json
+import re
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from . import data_cache
+from .bestiary_export import EXPORT_FORMATS, iter_export
+from .bestiary_import import load_projects
+from .data import DataSourcesData, EcosystemsData, ProjectsData, RepositoryViewsData
+from .models import DataSource, Ecosystem, Project, Repository, RepositoryView
+from .view_params import views_with_param
+from .views import EditorState
+
+
+def sqlite_full_scans(sql, params):
+    """ Tables read entirely by a query in SQLite """
+
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        details = [row[-1] for row in cursor.fetchall()]
+
+    tables = connection.introspection.table_names()
+    scans = [re.match(r'SCAN (?:TABLE )?(\w+)', detail) for detail in details]
+    return [scan.group(1) for scan in scans if scan and scan.group(1) in tables]
+
+
+def postgresql_full_scans(sql, params):
+    """ Tables read entirely by a query in PostgreSQL
+
+    The sequential scans are disabled, as they are cheaper than the
+    indexes in the tiny tables of the tests, so they are used only if
+    no index could be used instead.
+    """
+
+    def scans(node):
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from scans(child)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(scans(plan[0]['Plan']))
+
+
+class QueryPlanTests(TestCase):
+    """ The hot queries must use indexes, not read whole tables """
+
+    @classmethod
+    def setUpTestData(cls):
+        load_projects('projects/projects-release.json', "Test Org")
+        sub_eco = Ecosystem.objects.create(name="Sub Org")
+        Ecosystem.objects.get(name="Test Org").subecos.add(sub_eco)
+        Project.objects.get(name="grimoire").subprojects.add(Project.objects.create(name="perceval"))
+
+    def setUp(self):
+        if connection.vendor == 'sqlite':
+            self.full_scans = sqlite_full_scans
+        elif connection.vendor == 'postgresql':
+            self.full_scans = postgresql_full_scans
+        else:
+            self.skipTest("Query plans are checked only in SQLite and PostgreSQL")
+        cache.clear()
+        data_cache.data_cache().clear()
+
+    def assertIndexed(self, run):
+        """ Check that none of the queries done by run reads a whole table """
+
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            run()
+
+        self.assertTrue(queries)
+        for (sql, params) in queries:
+            self.assertEqual(self.full_scans(sql, params), [], sql)
+
+    def test_fetchers(self):
+        view = RepositoryView.objects.filter(project__name="grimoire").first()
+        states = [EditorState(eco_name="Test Org"),
+                  EditorState(projects=["grimoire"]),
+                  EditorState(projects=["grimoire"], data_sources=["git"]),
+                  EditorState(data_sources=["git"]),
+                  EditorState(repository_views=[view.id])]
+
+        for fetcher in (DataSourcesData, ProjectsData, RepositoryViewsData):
+            for state in states:
+                for descendants in (False, True):
+                    with self.subTest(fetcher=fetcher.__name__, state=vars(state), descendants=descendants):
+                        cache.clear()
+                        data_cache.data_cache().clear()
+                        self.assertIndexed(lambda: list(fetcher(state, descendants).fetch()))
+
+    def test_export(self):
+        eco_orm = Ecosystem.objects.get(name="Test Org")
+
+        for export_format in EXPORT_FORMATS:
+            for descendants in (False, True):
+                with self.subTest(export_format=export_format, descendants=descendants):
+                    self.assertIndexed(lambda: list(iter_export(eco_orm, export_format, descendants=descendants)))
+
+    def test_lookups(self):
+        git = DataSource.objects.get(name="git")
+        repository = Repository.objects.filter(data_source=git).first()
+        since = timezone.now() - timedelta(hours=1)
+
+        lookups = [
+            Project.objects.filter(name="grimoire"),
+            Repository.objects.filter(name=repository.name, data_source=git),
+            Repository.objects.filter(data_source=git).order_by('name').values_list('name', flat=True),
+            RepositoryView.objects.filter(repository=repository, params=''),
+            # The objects changed since some time, for the incremental consumers
+            Project.objects.filter(updated_at__gte=since),
+            Ecosystem.objects.filter(updated_at__gte=since),
+            Repository.objects.filter(updated_at__gte=since),
+            RepositoryView.objects.filter(updated_at__gte=since),
+            # The views with some params
+            views_with_param('tag', 'ovirt'),
+            views_with_param('filters-raw-prefix', data_source='git'),
+        ]
+
+        for lookup in lookups:
+            with self.subTest(query=str(lookup.query)):
+                self.assertIndexed(lambda: list(lookup))
+
+        # The list of the ecosystems is small and always read whole
+        self.assertEqual(len(list(EcosystemsData().fetch())), 2)
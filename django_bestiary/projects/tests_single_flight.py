@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+
+from time import sleep
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, SimpleTestCase, TransactionTestCase, override_settings
+
+from . import export_cache
+from .bestiary_import import load_projects
+from .single_flight import iter_single_flight
+
+CONCURRENT_REQUESTS = 50
+
+
+def slow_result(counter_path):
+    """ Result that takes a while to compute, counting each computation in a file """
+
+    with open(counter_path, 'a') as counter:
+        counter.write('computed\n')
+    sleep(0.5)
+    yield b'slow '
+    yield b'result'
+
+
+def run_flight(key, counter_path, results):
+    results.append(b''.join(iter_single_flight(key, lambda: slow_result(counter_path))))
+
+
+def run_flight_process(key, counter_path, barrier):
+    barrier.wait()
+    result = b''.join(iter_single_flight(key, lambda: slow_result(counter_path)))
+    os._exit(0 if result == b'slow result' else 1)
+
+
+def count_lines(path):
+    with open(path) as counter:
+        return len(counter.readlines())
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.counter_path = os.path.join(self.directory, 'counter')
+        settings = override_settings(BESTIARY_LOCKS_DIR=os.path.join(self.directory, 'locks'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_threads(self):
+        results = []
+        threads = [threading.Thread(target=run_flight, args=('threads', self.counter_path, results))
+                   for _ in range(CONCURRENT_REQUESTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [b'slow result'] * CONCURRENT_REQUESTS)
+        self.assertEqual(count_lines(self.counter_path), 1)
+
+        # Other keys are computed
+        self.assertEqual(b''.join(iter_single_flight('other', lambda: slow_result(self.counter_path))),
+                         b'slow result')
+        self.assertEqual(count_lines(self.counter_path), 2)
+
+    def test_processes(self):
+        barrier = multiprocessing.Barrier(8)
+        processes = [multiprocessing.Process(target=run_flight_process,
+                                             args=('processes', self.counter_path, barrier))
+                     for _ in range(8)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual([process.exitcode for process in processes], [0] * 8)
+        self.assertEqual(count_lines(self.counter_path), 1)
+
+    def test_slow_client(self):
+        """ A client that stops reading the result does not block the others """
+
+        stalled = iter_single_flight('stalled', lambda: slow_result(self.counter_path))
+        self.assertEqual(next(stalled), b'slow result')
+
+        results = []
+        thread = threading.Thread(target=run_flight, args=('stalled', self.counter_path, results))
+        thread.start()
+        thread.join(5)
+        blocked = thread.is_alive()
+        stalled.close()
+        thread.join()
+
+        self.assertFalse(blocked)
+        self.assertEqual(results, [b'slow result'])
+        self.assertEqual(count_lines(self.counter_path), 1)
+
+    def test_interrupted(self):
+        def failing():
+            yield b'half'
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            b''.join(iter_single_flight('failing', failing))
+
+        # The half result is not reused
+        self.assertEqual(b''.join(iter_single_flight('failing', lambda: iter([b'full']))), b'full')
+
+
+class ExportLoadTests(TransactionTestCase):
+
+    export_url = '/projects/export/ecosystem=Test Org'
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(BESTIARY_LOCKS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_concurrent_exports(self):
+        load_projects('projects/projects-release.json', "Test Org")
+
+        iter_export = export_cache.iter_export
+        computations = []
+
+        def slow_export(*args, **kwargs):
+            computations.append(args)
+            sleep(0.5)
+            return iter_export(*args, **kwargs)
+
+        barrier = threading.Barrier(CONCURRENT_REQUESTS)
+        responses = []
+
+        def request():
+            barrier.wait()
+            try:
+                response = Client().get(self.export_url)
+                responses.append((response.status_code, b''.join(response.streaming_content)))
+            finally:
+                connection.close()
+
+        with mock.patch.object(export_cache, 'iter_export', side_effect=slow_export):
+            threads = [threading.Thread(target=request) for _ in range(CONCURRENT_REQUESTS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(computations), 1)
+        self.assertEqual(len(responses), CONCURRENT_REQUESTS)
+        self.assertEqual(set(responses), {(200, b''.join(Client().get(self.export_url).streaming_content))})
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import bz2
+import gzip
+import io
+import json
+import lzma
+
+from django.test import SimpleTestCase
+
+from .projects_stream import decompress, iter_projects, iter_project_lines
+
+
+class ProjectsStreamTests(SimpleTestCase):
+
+    projects_file = 'projects/projects-release.json'
+
+    def test_iter_projects(self):
+        with open(self.projects_file) as pfile:
+            projects = json.load(pfile)
+
+        # Tiny chunks force the values to be split between reads
+        for chunk_size in (1, 7, 4096):
+            with open(self.projects_file) as pfile:
+                read = dict(iter_projects(pfile, chunk_size=chunk_size))
+            self.assertDictEqual(read, projects)
+
+            with open(self.projects_file, 'rb') as pfile:
+                read = dict(iter_projects(pfile, chunk_size=chunk_size))
+            self.assertDictEqual(read, projects)
+
+    def test_iter_project_lines(self):
+        projects = {
+            "empty": {},
+            "ñandú": {"meta": {"title": "Ñandú"}, "git": ["https://a.org/ñ", "https://a.org/b"]},
+            "no lines": {"meta": "No lines", "github": []}
+        }
+        pfile = io.BytesIO(json.dumps(projects, ensure_ascii=False).encode('utf-8'))
+
+        lines = list(iter_project_lines(pfile, chunk_size=3))
+
+        self.assertListEqual(lines, [
+            ("empty", None, None, None),
+            ("ñandú", {"title": "Ñandú"}, "git", "https://a.org/ñ"),
+            ("ñandú", {"title": "Ñandú"}, "git", "https://a.org/b"),
+            ("no lines", "No lines", "github", None)
+        ])
+
+    def test_empty_and_malformed(self):
+        self.assertListEqual(list(iter_projects(io.StringIO(' { } '))), [])
+
+        with self.assertRaises(ValueError):
+            list(iter_projects(io.StringIO('[]')))
+
+        with self.assertRaises(ValueError):
+            list(iter_projects(io.StringIO('{"project": {"git": []}')))
+
+        with self.assertRaises(ValueError):
+            list(iter_projects(io.StringIO('{"project": {"git": [}')))
+
+    def test_decompress(self):
+        with open(self.projects_file, 'rb') as pfile:
+            contents = pfile.read()
+        projects = json.loads(contents.decode('utf-8'))
+
+        for compress in (gzip.compress, bz2.compress, lzma.compress, lambda data: data):
+            pfile = io.BytesIO(compress(contents))
+            read = dict(iter_projects(decompress(pfile), chunk_size=16))
+            self.assertDictEqual(read, projects)
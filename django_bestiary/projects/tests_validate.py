@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import io
+import json
+
+from django.test import SimpleTestCase
+
+from .bestiary_validate import ProjectsValidator, format_error, validate_projects
+
+
+class ProjectsValidatorTests(SimpleTestCase):
+
+    def test_valid_file(self):
+        self.assertListEqual(validate_projects('projects/projects-release.json'), [])
+
+    def test_errors(self):
+        projects = {
+            "bestiary": {
+                "meta": {"name": "Bestiary"},
+                "git": ["https://github.com/chaoss/grimoirelab-bestiary", " https://github.com/chaoss/grimoirelab"],
+                "stackexchange": ["https://stackoverflow.com/questions/tagged/bestiary",
+                                  "https://stackoverflow.com/questions/bestiary"],
+                "bugzilla": ["https://bugs.bestiary.org?product=bestiary"],
+                "unknown": ["https://unknown.org"],
+                "gerrit": "review.bestiary.org"
+            },
+            "grimoirelab": {"meta": "GrimoireLab", "mbox": ["grimoirelab"]}
+        }
+
+        validator = ProjectsValidator()
+        errors = list(validator.errors(io.StringIO(json.dumps(projects))))
+
+        self.assertEqual(validator.nprojects, 2)
+        self.assertEqual(validator.nlines, 7)
+        self.assertListEqual([error[:3] for error in errors], [
+            ("bestiary", "meta", None),
+            ("bestiary", "git", 1),
+            ("bestiary", "stackexchange", 1),
+            ("bestiary", "bugzilla", 0),
+            ("bestiary", "unknown", 0),
+            ("bestiary", "gerrit", None),
+            ("grimoirelab", "mbox", 0)
+        ])
+        self.assertEqual(format_error(errors[4]),
+                         "bestiary/unknown[0]: data source unknown is not supported: 'https://unknown.org'")
+
+    def test_malformed_json(self):
+        errors = list(ProjectsValidator().errors(io.StringIO('{"bestiary": {"git": []}, "grimoire": {')))
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0][4].startswith("projects file is not valid JSON"))
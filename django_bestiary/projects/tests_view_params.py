@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Bestiary Tests
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import json
+import tempfile
+
+from django.test import Client, TestCase
+
+from .bestiary_export import export_projects
+from .bestiary_import import load_projects
+from .models import DataSource, Repository, RepositoryView, RepositoryViewParam
+from .view_params import reindex_params, views_with_param
+
+GIT_PARAMS = "--filters-raw-prefix data.files.file:grimoirelib_alch data.files.file:README.md"
+
+
+class ViewParamsTests(TestCase):
+
+    def assertParams(self, view, values):
+        view.refresh_from_db()
+        self.assertEqual(json.loads(view.parsed_params), values)
+        rows = RepositoryViewParam.objects.filter(repository_view=view).values_list('key', 'value')
+        self.assertEqual(sorted(rows), sorted((key, value) for key in values for value in values[key]))
+
+    def check_import(self, bulk):
+        load_projects('projects/projects-release.json', "Test Org", bulk=bulk)
+
+        view = RepositoryView.objects.get(params=GIT_PARAMS)
+        self.assertParams(view, {'filters-raw-prefix': ['data.files.file:grimoirelib_alch',
+                                                        'data.files.file:README.md']})
+
+        ovirt = RepositoryView.objects.get(params='ovirt', repository__data_source__name='stackexchange')
+        self.assertParams(ovirt, {'tag': ['ovirt']})
+        self.assertEqual(list(views_with_param('tag', 'ovirt')), [ovirt])
+        self.assertEqual(views_with_param('tag').count(), 3)
+        self.assertEqual(list(views_with_param('filters-raw-prefix', data_source='git')), [view])
+        self.assertFalse(views_with_param('filters-raw-prefix', data_source='github').exists())
+
+        # Nothing to fix once imported
+        self.assertEqual(reindex_params(), 0)
+
+        # The params are exported as they were imported
+        with tempfile.NamedTemporaryFile() as efile:
+            export_projects(efile.name, "Test Org")
+            with open('projects/projects-release.json') as pfile:
+                self.assertEqual(json.load(open(efile.name)), json.load(pfile))
+
+    def test_bulk_import(self):
+        self.check_import(bulk=True)
+
+    def test_import(self):
+        self.check_import(bulk=False)
+
+    def test_long_key(self):
+        """ A key could be almost as long as the params """
+
+        git = DataSource.objects.create(name='git')
+        repo = Repository.objects.create(name='https://example.com/a', data_source=git)
+        key = 'k' * (RepositoryView._meta.get_field('params').max_length - len('--=v'))
+        view = RepositoryView.objects.create(repository=repo, params='--%s=v' % key)
+        self.assertParams(view, {key: ['v']})
+
+        param = RepositoryViewParam.objects.get(repository_view=view)
+        param.full_clean()
+        self.assertEqual(list(views_with_param(key)), [view])
+
+    def test_orm_changes(self):
+        git = DataSource.objects.create(name='git')
+        gerrit = DataSource.objects.create(name='gerrit')
+        repo = Repository.objects.create(name='https://example.com/a', data_source=git)
+        view = RepositoryView.objects.create(repository=repo, params='--branch master --no-archive')
+        self.assertParams(view, {'branch': ['master'], 'no-archive': ['']})
+
+        view.params = '--branch=stable'
+        view.save()
+        self.assertParams(view, {'branch': ['stable']})
+
+        # In gerrit the params are the branch
+        repo.data_source = gerrit
+        repo.save()
+        self.assertParams(view, {'branch': ['--branch=stable']})
+
+        # The quoted values keep their spaces
+        repo.data_source = git
+        repo.save()
+        view.params = '--filter-raw="data.component:Foo Bar"'
+        view.save()
+        self.assertParams(view, {'filter-raw': ['data.component:Foo Bar']})
+        self.assertEqual(list(views_with_param('filter-raw', 'data.component:Foo Bar')), [view])
+
+        view.params = ''
+        view.save()
+        self.assertParams(view, {})
+
+    def test_reindex(self):
+        load_projects('projects/projects-release.json', "Test Org")
+
+        # Views added before the params were parsed
+        RepositoryView.objects.update(parsed_params='{}')
+        RepositoryViewParam.objects.all().delete()
+        self.assertFalse(views_with_param('tag', 'ovirt').exists())
+
+        # Only the views with params have something to parse
+        self.assertEqual(reindex_params(), RepositoryView.objects.exclude(params='').count())
+        self.assertEqual(views_with_param('tag', 'ovirt').count(), 1)
+        self.assertParams(RepositoryView.objects.get(params=GIT_PARAMS),
+                          {'filters-raw-prefix': ['data.files.file:grimoirelib_alch',
+                                                  'data.files.file:README.md']})
+        self.assertEqual(reindex_params(), 0)
+
+    def test_view(self):
+        load_projects('projects/projects-release.json', "Test Org")
+        client = Client()
+
+        self.assertEqual(client.get('/projects/repository_views_with_param').status_code, 400)
+
+        response = client.get('/projects/repository_views_with_param', {'key': 'tag', 'value': 'rdo'})
+        views = response.json()['repository_views']
+        self.assertEqual([(view['data_source'], view['params']) for view in views], [('stackexchange', 'rdo')])
@@ -6,8 +6,10 @@ urlpatterns = [
     url(r'^add_ecosystem$', views.add_ecosystem),
     url(r'^editor_select_ecosystem$', views.editor_select_ecosystem),
     url(r'^import/$', views.import_from_file),
+    url(r'^import/(?P<job_id>[0-9]+)$', views.import_progress),
     url(r'^export/ecosystem=(?P<ecosystem>[\w ]+)', views.export_to_file),
     url(r'^export/$', views.export_to_file),
+    url(r'^export_all/$', views.export_all),
     url(r'^update_ecosystem$', views.update_ecosystem),
     url(r'^remove_ecosystem$', views.remove_ecosystem),
     url(r'^add_project$', views.add_project),
@@ -21,6 +23,9 @@ urlpatterns = [
     url(r'^select_repository_view$', views.select_repository_view),
     url(r'^update_repository_view$', views.update_repository_view),
     url(r'^status/$', views.status),
+    url(r'^data_cache_stats$', views.data_cache_stats),
+    url(r'^counters$', views.counters),
+    url(r'^repository_views_with_param$', views.repository_views_with_param),
     url(r'^status_select_ecosystem$', views.status_select_ecosystem),
     url(r'^status_select_project$', views.status_select_project),
     url(r'^$', views.editor, name='index'),
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+#
+# Params of the repository views parsed into keys and values
+#
+# Copyright (C) 2017 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+import json
+
+from projects.datasource_codecs import parse_params
+from projects.models import RepositoryView, RepositoryViewParam
+
+# Keep it under the 999 variables limit of SQLite in the lookups
+BATCH_SIZE = 500
+
+
+# The params of a repository view are kept as they are in the projects
+# file, so they are exported back byte for byte. When they are written,
+# they are also parsed with the codec of their data source into the JSON
+# of parsed_params and into RepositoryViewParam rows, indexed by key and
+# value, so the views are looked up by their params with an index. The
+# signals do it for the views saved with the ORM, and the bulk imports
+# when they add the views.
+
+
+def param_pairs(data_source, params):
+    """ Unique (key, value) pairs of the params of a repository view, in order """
+
+    pairs = []
+    for pair in parse_params(data_source, params):
+        if pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+
+def parsed_params(data_source, params):
+    """ JSON with the list of values of each key of the params of a repository view """
+
+    values = {}
+    for (key, value) in parse_params(data_source, params):
+        values.setdefault(key, []).append(value)
+
+    return json.dumps(values, sort_keys=True)
+
+
+def param_rows(view_id, data_source, params):
+    """ (repository view id, key, value) of the RepositoryViewParam rows of a view """
+
+    return [(view_id, key, value) for (key, value) in param_pairs(data_source, params)]
+
+
+def replace_params(view_id, data_source, params):
+    """ Replace the RepositoryViewParam rows of a view with the ones of its params """
+
+    RepositoryViewParam.objects.filter(repository_view=view_id).delete()
+    RepositoryViewParam.objects.bulk_create([RepositoryViewParam(repository_view_id=view_id, key=key, value=value)
+                                             for (view_id, key, value) in param_rows(view_id, data_source, params)])
+
+
+def reindex_params(view_ids=None):
+    """ Parse again the params of some repository views, all by default
+
+    Only the views whose parsed params or rows are not the ones of their
+    params are changed, like the ones added before the params were parsed
+    or whose repository moved to another data source.
+
+    :return: the number of views changed
+    """
+
+    views = RepositoryView.objects.order_by('id')
+    if view_ids is not None:
+        views = views.filter(id__in=list(view_ids))
+    views = list(views.values_list('id', 'repository__data_source__name', 'params', 'parsed_params'))
+
+    nchanged = 0
+    for i in range(0, len(views), BATCH_SIZE):
+        batch = views[i:i + BATCH_SIZE]
+        rows = {}
+        for row in RepositoryViewParam.objects.filter(repository_view__in=[view[0] for view in batch]) \
+                .values_list('repository_view_id', 'key', 'value'):
+            rows.setdefault(row[0], set()).add(row)
+
+        for (view_id, data_source, params, current) in batch:
+            changed = False
+            expected = parsed_params(data_source, params)
+            if expected != current:
+                RepositoryView.objects.filter(id=view_id).update(parsed_params=expected)
+                changed = True
+            if set(param_rows(view_id, data_source, params)) != rows.get(view_id, set()):
+                replace_params(view_id, data_source, params)
+                changed = True
+            nchanged += changed
+
+    return nchanged
+
+
+def views_with_param(key, value=None, data_source=None):
+    """ Queryset with the repository views with a key in their params
+
+    For example, all the gerrit views for a branch:
+
+        views_with_param('branch', 'stable', 'gerrit')
+
+    :param key: key of the params, '' for the values without a key
+    :param value: value of the key, any value by default
+    :param data_source: name of the data source of the views, any by default
+    """
+
+    params = RepositoryViewParam.objects.filter(key=key)
+    if value is not None:
+        params = params.filter(value=value)
+
+    views = RepositoryView.objects.filter(id__in=params.values('repository_view_id'))
+    if data_source is not None:
+        views = views.filter(repository__data_source__name=data_source)
+
+    return views
@@ -1,25 +1,50 @@
+import concurrent.futures
 import functools
-import json
+import os
 
 from datetime import datetime
 from time import time
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.template import loader
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from django.views.decorators.http import condition
 
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 
-from projects.bestiary_export import fetch_projects
 
 from django import shortcuts
 from django.http import Http404
 
-from projects.bestiary_import import load_projects
-from projects.models import DataSource, Ecosystem, Project, Repository, RepositoryView
+from projects import bestiary_export_all
+from projects.import_jobs import job_progress, queue_import
+from projects.models import DataSource, Ecosystem, ImportJob, Project, Repository, RepositoryView
+from projects.single_flight import iter_single_flight
 
-from . import forms
 from . import data
+from . import data_cache
+from . import identity_map
+from . import export_cache
+from . import forms
+from . import view_params
+
+
+# Uploaded projects files waiting to be imported
+IMPORTS_SPOOL_DIR = '.import_jobs/'
+# Copies of the uploaded projects files
+IMPORTS_ARCHIVE_DIR = '.imported/'
+COMPRESSED_EXTENSIONS = ['.gz', '.bz2', '.xz']
+# Ecosystems exported at the same time by export_all
+EXPORT_WORKERS = 4
+# Content type and file name of each export format
+EXPORT_FORMATS = {
+    'json': ("application/json", "projects_%s.json"),
+    'ndjson': ("application/x-ndjson", "projects_%s.ndjson"),
+    'ndjson-views': ("application/x-ndjson", "repository_views_%s.ndjson"),
+    'tsv': ("text/tab-separated-values; charset=utf-8", "repository_views_%s.tsv")
+}
 
 
 class EditorState():
@@ -100,7 +125,7 @@ def select_project(request, template, context=None):
         if form.is_valid():
             project_name = form.cleaned_data['name']
             try:
-                project_orm = Project.objects.get(name=project_name)
+                project_orm = identity_map.get(Project, name=project_name)
             except Project.DoesNotExist:
                 # TODO: Show error
                 return shortcuts.render(request, template, build_forms_context())
@@ -132,16 +157,16 @@ def select_ecosystem(request, template, context=None):
                 return shortcuts.render(request, template, build_forms_context())
             # Select and ecosystem reset the state. Don't pass form=form
             try:
-                eco_orm = Ecosystem.objects.get(name=name)
+                eco_orm = identity_map.get(Ecosystem, name=name)
             except Ecosystem.DoesNotExist:
                 # TODO: Show error
                 return shortcuts.render(request, template, build_forms_context())
 
-            state = build_forms_context(EditorState(eco_name=name, eco_id=eco_orm.id))
+            forms_context = build_forms_context(EditorState(eco_name=name, eco_id=eco_orm.id))
             if context:
-                context.update(state)
+                context.update(forms_context)
             else:
-                context = build_forms_context(EditorState(eco_name=name, eco_id=eco_orm.id))
+                context = forms_context
             return shortcuts.render(request, template, context)
         else:
             # Ignore when the empty option is selected
@@ -208,6 +233,49 @@ def fetch_status_repository_views(state=None):
     return views_status
 
 
+def data_cache_stats(request):
+    """ Hits and misses of the data cache in the worker that answers """
+
+    return JsonResponse(data_cache.stats())
+
+
+def counters(request):
+    """ Projects of each ecosystem and repositories of each data source, the largest first
+
+    With an ecosystem, the repository views of each one of its projects too.
+    """
+
+    response = {
+        "ecosystems": list(Ecosystem.objects.order_by('-nprojects', 'name').values('name', 'nprojects')),
+        "data_sources": list(DataSource.objects.order_by('-nrepositories', 'name').values('name', 'nrepositories'))
+    }
+
+    ecosystem = request.GET.get('ecosystem')
+    if ecosystem:
+        projects = Project.objects.filter(ecosystem__name=ecosystem).order_by('-nrepository_views', 'name')
+        response["projects"] = list(projects.values('name', 'nrepository_views'))
+
+    return JsonResponse(response)
+
+
+def repository_views_with_param(request):
+    """ Repository views with a key, and optionally a value, in their params
+
+    The views could be limited to the ones of a data source too.
+    """
+
+    key = request.GET.get('key')
+    if key is None:
+        return HttpResponseBadRequest("A key of the params is needed")
+
+    views = view_params.views_with_param(key, request.GET.get('value'), request.GET.get('data_source'))
+    views = views.order_by('id').values_list('id', 'repository__data_source__name', 'repository__name', 'params')
+
+    return JsonResponse({"repository_views": [{"id": view_id, "data_source": data_source, "repository": repo,
+                                               "params": params}
+                                              for (view_id, data_source, repo, params) in views]})
+
+
 def status(request):
     # Get the repository views
     state = None
@@ -603,8 +671,8 @@ def find_project_repository_views(project):
     data = {"repository_views": []}
 
     try:
-        project_orm = Project.objects.get(name=project)
-        repository_views_orm = project_orm.repository_views.all()
+        project_orm = identity_map.get(Project, name=project)
+        repository_views_orm = project_orm.repository_views.select_related('repository__data_source')
         for view in repository_views_orm:
             data['repository_views'].append({
                 "id": view.id,
@@ -623,8 +691,8 @@ def find_project_data_sources(project):
     already_added_data_sources = []
 
     try:
-        project_orm = Project.objects.get(name=project)
-        repository_views = project_orm.repository_views.all()
+        project_orm = identity_map.get(Project, name=project)
+        repository_views = project_orm.repository_views.select_related('repository__data_source')
         for repository_view_orm in repository_views:
             if repository_view_orm.repository.data_source.id in already_added_data_sources:
                 continue
@@ -644,7 +712,7 @@ def find_projects(ecosystem=None):
 
     try:
         if ecosystem:
-            ecosystem_orm = Ecosystem.objects.get(name=ecosystem)
+            ecosystem_orm = identity_map.get(Ecosystem, name=ecosystem)
             projects_orm = ecosystem_orm.projects.all()
         else:
             projects_orm = Project.objects.all()
@@ -666,23 +734,95 @@ def import_from_file(request):
         ecosystem = request.POST["name"]
         cur_dt = datetime.now().strftime("%Y-%m-%d_%H%M%S")
         file_name = "%s_%s.json" % (ecosystem, cur_dt)
-        fpath = '.imported/' + file_name  # FIXME Define path where all these files must be saved
-        save_path = default_storage.save(fpath, ContentFile(myfile.read()))
+        # Compressed files are decompressed on the fly while importing them
+        if os.path.splitext(myfile.name)[1] in COMPRESSED_EXTENSIONS:
+            file_name += os.path.splitext(myfile.name)[1]
+        # The file is imported by a worker once the request is finished, and
+        # read again if the import is resumed or retried, so it is kept in
+        # the spool instead of parsed while it is uploaded. The big uploads,
+        # already in a temporary file, are moved to it, not copied
+        fpath = default_storage.save(IMPORTS_SPOOL_DIR + file_name, myfile)
+
+        archive_path = ''
+        if getattr(settings, 'BESTIARY_ARCHIVE_IMPORTS', True):
+            # FIXME Define path where all these files must be saved
+            archive_path = default_storage.path(default_storage.get_available_name(IMPORTS_ARCHIVE_DIR + file_name))
+
+        # The file is imported by a worker, bestiary_import_worker.py, not in the request
+        user = request.user if request.user.is_authenticated else None
+        job = queue_import(default_storage.path(fpath), ecosystem, user, remove_file=True, archive_path=archive_path)
+
+        if request.is_ajax():
+            return JsonResponse(job_progress(job), status=202)
 
-        task_init = time()
-        try:
-            (nprojects, nrepos) = load_projects(save_path, ecosystem)
-        except Exception:
-            error_msg = "File %s couldn't be imported." % myfile.name
-            return return_error(error_msg)
+    return editor_select_ecosystem(request)
 
-        print("Total loading time ... %.2f sec", time() - task_init)
-        print("Projects loaded", nprojects)
-        print("Repositories loaded", nrepos)
 
-    return editor_select_ecosystem(request)
+def import_progress(request, job_id):
+    """ Progress of an import queued with import_from_file """
+
+    job = shortcuts.get_object_or_404(ImportJob, id=job_id)
+
+    return JsonResponse(job_progress(job))
+
+
+def accepts_gzip(request):
+    """ Whether the Accept-Encoding of a request has gzip, or *, with a q-value above 0 """
 
+    qvalues = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        (name, _, params) = coding.partition(';')
+        qvalue = 1
+        for param in params.split(';'):
+            (key, _, value) = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0
+        qvalues[name.strip().lower()] = qvalue
 
+    return qvalues.get('gzip', qvalues.get('*', 0)) > 0
+
+
+def export_format(request):
+    """ Format of the projects file requested with the `format` param, json by default """
+
+    params = request.POST if request.method == "POST" else request.GET
+    return params.get("format") or 'json'
+
+
+def find_export_ecosystem(request, ecosystem=None):
+    """ Ecosystem to be exported in a request, None if it does not exist """
+
+    if request.method == "POST":
+        ecosystem = request.POST.get("name")
+
+    if not hasattr(request, 'export_ecosystem'):
+        request.export_ecosystem = Ecosystem.objects.filter(name=ecosystem).first() if ecosystem else None
+
+    return request.export_ecosystem
+
+
+def export_etag(request, ecosystem=None):
+    eco_orm = find_export_ecosystem(request, ecosystem)
+    if not eco_orm:
+        return None
+
+    # Each format and the gzipped file are different representations of the projects file
+    etag = export_cache.export_etag(eco_orm)
+    if export_format(request) != 'json':
+        etag += '-' + export_format(request)
+    return etag + '-gzip' if accepts_gzip(request) else etag
+
+
+def export_last_modified(request, ecosystem=None):
+    eco_orm = find_export_ecosystem(request, ecosystem)
+    return eco_orm.updated_at if eco_orm else None
+
+
+# The conditional requests are answered without reading the projects
+@condition(etag_func=export_etag, last_modified_func=export_last_modified)
 def export_to_file(request, ecosystem=None):
 
     if (request.method == "GET") and (not ecosystem):
@@ -691,11 +831,14 @@ def export_to_file(request, ecosystem=None):
     if request.method == "POST":
         ecosystem = request.POST["name"]
 
-    file_name = "projects_%s.json" % ecosystem
-    task_init = time()
-    try:
-        projects = fetch_projects(ecosystem)
-    except (Ecosystem.DoesNotExist, Exception):
+    fmt = export_format(request)
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponse("Unknown export format %s" % fmt, status=400)
+    (content_type, file_name) = EXPORT_FORMATS[fmt]
+    file_name = file_name % ecosystem
+
+    eco_orm = find_export_ecosystem(request, ecosystem)
+    if not eco_orm:
         error_msg = "Projects from ecosystem \"%s\" couldn't be exported." % ecosystem
         if request.method == "POST":
             # If request comes from web UI and fails, return error page
@@ -704,14 +847,55 @@ def export_to_file(request, ecosystem=None):
             # If request comes as a GET request, return HTTP 404: Not Found
             return HttpResponse(status=404)
 
-    print("Total loading time ... %.2f sec", time() - task_init)
-    if projects:
-        projects_json = json.dumps(projects, indent=True, sort_keys=True)
-        response = HttpResponse(projects_json, content_type="application/json")
-        response['Content-Disposition'] = 'attachment; filename=' + file_name
-        return response
-    else:
+    if not eco_orm.projects.exists():
         error_msg = "There are no projects to export"
         return return_error(error_msg)
 
-    return editor(request)
+    # The projects file is sent while it is built, one chunk at a time,
+    # unless it is already in the cache
+    chunks = export_cache.iter_cached_export(eco_orm, fmt)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename=' + file_name
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if accepts_gzip(request):
+        response.streaming_content = compress_sequence(response.streaming_content)
+        response['Content-Encoding'] = 'gzip'
+
+    return response
+
+
+def export_all(request):
+    """ Archive with the projects files of several ecosystems, all by default
+
+    The ecosystems are chosen with `ecosystem` params and the archive
+    format, zip or tar (gzipped), with the `format` one. The archive
+    includes a manifest with the counts and hashes of the files.
+    """
+
+    ecosystems = request.GET.getlist('ecosystem') or None
+    archive_format = request.GET.get('format', 'zip')
+    if archive_format not in bestiary_export_all.ARCHIVE_FORMATS:
+        return HttpResponse(status=400)
+
+    eco_orms = Ecosystem.objects.order_by('name')
+    if ecosystems:
+        eco_orms = eco_orms.filter(name__in=ecosystems)
+        if eco_orms.count() < len(set(ecosystems)):
+            return HttpResponse(status=404)
+
+    # Threads, as the web workers should not be forked
+    generate = functools.partial(bestiary_export_all.iter_archive, ecosystems, archive_format,
+                                 getattr(settings, 'BESTIARY_EXPORT_WORKERS', EXPORT_WORKERS),
+                                 concurrent.futures.ThreadPoolExecutor)
+    # The archive is built once for the requests of the same ecosystems at the same time
+    flight_key = 'bestiary:export_all:%s:%s:%s' % (archive_format, ecosystems,
+                                                   ','.join(export_cache.export_flight_key(eco_orm)
+                                                            for eco_orm in eco_orms))
+    chunks = iter_single_flight(flight_key, generate, export_cache.export_cache_timeout())
+
+    file_name = "projects.zip" if archive_format == 'zip' else "projects.tar.gz"
+    content_type = "application/zip" if archive_format == 'zip' else "application/gzip"
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename=' + file_name
+    return response
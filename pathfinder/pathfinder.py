@@ -35,6 +35,7 @@ import django
 os.environ['DJANGO_SETTINGS_MODULE'] = 'django_bestiary.settings'
 django.setup()
 
+from projects.datasource_codecs import parse_lines
 from projects.models import DataSource, Project, Repository, RepositoryView
 
 
@@ -114,30 +115,36 @@ if __name__ == '__main__':
             logger.error("The project must already exists in Beastiary")
             sys.exit(1)
 
-    for repo in repos.get_ids():
-        if not args.project:
+    repo_ids = list(repos.get_ids())
+
+    if not args.project:
+        for repo in repo_ids:
             print(repo)
-        else:
-            try:
-                ds_orm = DataSource.objects.get(name=args.data_source)
-            except DataSource.DoesNotExist:
-                logger.error("The data source %s does not exists in Bestiary", args.data_source)
-                sys.exit(1)
+    else:
+        try:
+            ds_orm = DataSource.objects.get(name=args.data_source)
+        except DataSource.DoesNotExist:
+            logger.error("The data source %s does not exists in Bestiary", args.data_source)
+            sys.exit(1)
+
+        for (repo, (repo_name, params)) in zip(repo_ids, parse_lines(args.data_source, repo_ids)):
+            if repo_name is None:
+                logger.error("Can not find repository for %s %s", args.data_source, repo)
+                continue
             try:
-                rep = Repository(name=repo, data_source=ds_orm)
+                rep = Repository(name=repo_name, data_source=ds_orm)
                 rep.save()
             except django.db.utils.IntegrityError:
-                logger.debug('Repository already exists %s', repo)
-                rep = Repository.objects.get(name=repo, data_source=ds_orm)
+                logger.debug('Repository already exists %s', repo_name)
+                rep = Repository.objects.get(name=repo_name, data_source=ds_orm)
             try:
-                # Don't support filters yet
-                rep_view = RepositoryView(rep=rep, filters='')
+                rep_view = RepositoryView(repository=rep, params=params)
                 rep_view.save()
             except django.db.utils.IntegrityError:
                 logger.debug('Repository View already exists %s', repo)
-                rep_view = RepositoryView.objects.get(rep=rep, filters='')
+                rep_view = RepositoryView.objects.get(repository=rep, params=params)
 
-            project_orm.rep_views.add(rep_view)
+            project_orm.repository_views.add(rep_view)
 
     if args.project:
         project_orm.save()